@@ -0,0 +1,438 @@
+# Synthetic Dynamixel bus traffic and decode throughput benchmarks.
+#
+# Builds timestamped byte streams for Protocol 1 and Protocol 2 packets at a
+# given baud rate and replays them through Hla.decode (see ReplayCapture.py),
+# timing every handler in processP1Packets/processP2Packets.
+#
+# Usage:
+#   python BusBenchmark.py                         run every scenario
+#   python BusBenchmark.py hexapod p2_sync_write   run some of them
+#   python BusBenchmark.py --save-baseline bench_baseline.json
+#   python BusBenchmark.py --baseline bench_baseline.json --tolerance 0.25
+#
+# With --baseline the run fails (exit code 1) when any scenario's ns/byte is
+# more than the tolerance slower than the saved value.
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+import ReplayCapture
+
+
+#================================================
+# Packet builders
+#================================================
+def _build_crc_table():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005) if (crc & 0x8000) else (crc << 1)
+        table.append(crc & 0xffff)
+    return table
+
+s_crc_table = _build_crc_table()
+
+
+def crc16(data):
+    crc = 0
+    for b in data:
+        crc = ((crc << 8) ^ s_crc_table[((crc >> 8) ^ b) & 0xff]) & 0xffff
+    return crc
+
+
+def stuff(params):
+    # Protocol 2 byte stuffing: FF FF FD is followed by an extra FD
+    out = bytearray()
+    for b in params:
+        out.append(b)
+        if b == 0xfd and out[-3:] == b'\xff\xff\xfd':
+            out.append(0xfd)
+    return bytes(out)
+
+
+def p1_packet(servo_id, inst, params=b''):
+    body = bytes((servo_id, len(params) + 2, inst)) + bytes(params)
+    return b'\xff\xff' + body + bytes(((~sum(body)) & 0xff,))
+
+
+def p2_packet(servo_id, inst, params=b''):
+    params = stuff(bytes(params))
+    length = len(params) + 3
+    packet = bytes((0xff, 0xff, 0xfd, 0x00, servo_id, length & 0xff, length >> 8, inst)) + params
+    crc = crc16(packet)
+    return packet + bytes((crc & 0xff, crc >> 8))
+
+
+def le(value, count):
+    return (value & ((1 << (8 * count)) - 1)).to_bytes(count, 'little')
+
+
+def servo_value(servo_id, cycle, count):
+    # Something that moves from cycle to cycle, like real positions
+    return le(2048 + ((servo_id * 37 + cycle * 11) % 1024) - 512, count)
+
+
+#================================================
+# Bus timing
+#================================================
+class BusWriter:
+    # Lays out packets on the wire with timestamps, 10 bits per character.
+    def __init__(self, baud, return_delay_us=20.0, packet_gap_us=20.0):
+        self.char_ns = int(round(10 * 1e9 / baud))
+        self.return_delay_ns = int(return_delay_us * 1000)
+        self.packet_gap_ns = int(packet_gap_us * 1000)
+        self.now_ns = 0
+        self.packets = []
+
+    def send(self, packet, reply=False):
+        self.now_ns += self.return_delay_ns if reply else self.packet_gap_ns
+        self.packets.append((self.now_ns, packet))
+        self.now_ns += len(packet) * self.char_ns
+
+    def wait_until(self, ns):
+        self.now_ns = max(self.now_ns, ns)
+
+    def records(self):
+        char_ns = self.char_ns
+        for start_ns, packet in self.packets:
+            for b in packet:
+                yield start_ns, start_ns + char_ns, b
+                start_ns += char_ns
+
+
+#================================================
+# Traffic scenarios
+#================================================
+# Each scenario fills a BusWriter with the packets of one or more control
+# cycles, replies included.
+
+X_GOAL, X_GVEL, X_PPOS, X_PTEMP = 116, 104, 132, 146
+AX_GOAL, AX_PPOS = 30, 36
+
+
+def p1_ping(bus, opts):
+    for servo_id in opts.ids:
+        bus.send(p1_packet(servo_id, 1))
+        bus.send(p1_packet(servo_id, 0), reply=True)
+
+
+def p1_read(bus, opts):
+    for servo_id in opts.ids:
+        bus.send(p1_packet(servo_id, 2, (AX_PPOS, opts.payload)))
+        bus.send(p1_packet(servo_id, 0, servo_value(servo_id, 0, opts.payload)), reply=True)
+
+
+def p1_write(bus, opts):
+    for cycle in range(opts.cycles):
+        for servo_id in opts.ids:
+            bus.send(p1_packet(servo_id, 3, bytes((AX_GOAL,)) + servo_value(servo_id, cycle, opts.payload)))
+
+
+def p1_sync_write(bus, opts):
+    for cycle in range(opts.cycles):
+        params = bytearray((AX_GOAL, opts.payload))
+        for servo_id in opts.ids:
+            params += bytes((servo_id,)) + servo_value(servo_id, cycle, opts.payload)
+        bus.send(p1_packet(0xfe, 0x83, params))
+        bus.wait_until(bus.packets[-1][0] + opts.period_ns)
+
+
+def p1_bulk_read(bus, opts):
+    for cycle in range(opts.cycles):
+        params = bytearray((0,))
+        for servo_id in opts.ids:
+            params += bytes((opts.payload, servo_id, AX_PPOS))
+        bus.send(p1_packet(0xfe, 0x92, params))
+        for servo_id in opts.ids:
+            bus.send(p1_packet(servo_id, 0, servo_value(servo_id, cycle, opts.payload)), reply=True)
+        bus.wait_until(bus.packets[-len(opts.ids) - 1][0] + opts.period_ns)
+
+
+def p2_ping(bus, opts):
+    for servo_id in opts.ids:
+        bus.send(p2_packet(servo_id, 1))
+        bus.send(p2_packet(servo_id, 0x55, b'\x00' + le(1060, 2) + b'\x2e'), reply=True)
+
+
+def p2_read(bus, opts):
+    for cycle in range(opts.cycles):
+        for servo_id in opts.ids:
+            bus.send(p2_packet(servo_id, 2, le(X_PPOS, 2) + le(opts.payload, 2)))
+            bus.send(p2_packet(servo_id, 0x55, b'\x00' + servo_value(servo_id, cycle, opts.payload)), reply=True)
+
+
+def p2_write(bus, opts):
+    for cycle in range(opts.cycles):
+        for servo_id in opts.ids:
+            bus.send(p2_packet(servo_id, 3, le(X_GOAL, 2) + servo_value(servo_id, cycle, opts.payload)))
+
+
+def p2_sync_write(bus, opts):
+    for cycle in range(opts.cycles):
+        params = bytearray(le(X_GOAL, 2) + le(opts.payload, 2))
+        for servo_id in opts.ids:
+            params += bytes((servo_id,)) + servo_value(servo_id, cycle, opts.payload)
+        bus.send(p2_packet(0xfe, 0x83, params))
+        bus.wait_until(bus.packets[-1][0] + opts.period_ns)
+
+
+def p2_sync_read(bus, opts):
+    for cycle in range(opts.cycles):
+        start = bus.now_ns
+        bus.send(p2_packet(0xfe, 0x82, le(X_PPOS, 2) + le(opts.payload, 2) + bytes(opts.ids)))
+        for servo_id in opts.ids:
+            bus.send(p2_packet(servo_id, 0x55, b'\x00' + servo_value(servo_id, cycle, opts.payload)), reply=True)
+        bus.wait_until(start + opts.period_ns)
+
+
+def p2_fast_sync_read(bus, opts):
+    for cycle in range(opts.cycles):
+        start = bus.now_ns
+        bus.send(p2_packet(0xfe, 0x8a, le(X_PPOS, 2) + le(opts.payload, 2) + bytes(opts.ids)))
+        # One status packet for all servos. Every servo's block ends with the
+        # CRC of the packet so far, the packet CRC closes the last block.
+        length = 3 + len(opts.ids) * (2 + opts.payload) + (len(opts.ids) - 1) * 2
+        packet = bytearray((0xff, 0xff, 0xfd, 0x00, 0xfe, length & 0xff, length >> 8, 0x55))
+        for servo_id in opts.ids:
+            packet += bytes((0, servo_id)) + servo_value(servo_id, cycle, opts.payload)
+            packet += le(crc16(packet), 2)
+        bus.send(bytes(packet), reply=True)
+        bus.wait_until(start + opts.period_ns)
+
+
+def p2_bulk_read(bus, opts):
+    for cycle in range(opts.cycles):
+        start = bus.now_ns
+        params = bytearray()
+        for servo_id in opts.ids:
+            params += bytes((servo_id,)) + le(X_PPOS, 2) + le(opts.payload, 2)
+        bus.send(p2_packet(0xfe, 0x92, params))
+        for servo_id in opts.ids:
+            bus.send(p2_packet(servo_id, 0x55, b'\x00' + servo_value(servo_id, cycle, opts.payload)), reply=True)
+        bus.wait_until(start + opts.period_ns)
+
+
+def p2_fast_bulk_read(bus, opts):
+    # PPOS of the odd IDs and PTEMP of the even ones, one status packet laid
+    # out like Fast Sync Read with each servo's own count
+    for cycle in range(opts.cycles):
+        start = bus.now_ns
+        reads = [(servo_id, X_PPOS, opts.payload) if servo_id & 1 else (servo_id, X_PTEMP, 1)
+                 for servo_id in opts.ids]
+        params = bytearray()
+        for servo_id, reg, count in reads:
+            params += bytes((servo_id,)) + le(reg, 2) + le(count, 2)
+        bus.send(p2_packet(0xfe, 0x9a, params))
+        length = 3 + sum([2 + count for servo_id, reg, count in reads]) + (len(reads) - 1) * 2
+        packet = bytearray((0xff, 0xff, 0xfd, 0x00, 0xfe, length & 0xff, length >> 8, 0x55))
+        for servo_id, reg, count in reads:
+            packet += bytes((0, servo_id)) + servo_value(servo_id, cycle, count)
+            packet += le(crc16(packet), 2)
+        bus.send(bytes(packet), reply=True)
+        bus.wait_until(start + opts.period_ns)
+
+
+def p2_bulk_write(bus, opts):
+    for cycle in range(opts.cycles):
+        params = bytearray()
+        for servo_id in opts.ids:
+            params += bytes((servo_id,)) + le(X_GOAL, 2) + le(opts.payload, 2) + servo_value(servo_id, cycle, opts.payload)
+        bus.send(p2_packet(0xfe, 0x93, params))
+        bus.wait_until(bus.packets[-1][0] + opts.period_ns)
+
+
+def hexapod(bus, opts):
+    # 100Hz loop: SyncWrite of GOAL and GVEL, then a BulkRead of PPOS and PTEMP
+    for cycle in range(opts.cycles):
+        start = bus.now_ns
+        params = bytearray(le(X_GVEL, 2) + le(16, 2))
+        for servo_id in opts.ids:
+            params += bytes((servo_id,)) + le(100, 4) + le(0, 4) + le(0, 4) + servo_value(servo_id, cycle, 4)
+        bus.send(p2_packet(0xfe, 0x83, params))
+        params = bytearray()
+        for servo_id in opts.ids:
+            params += bytes((servo_id,)) + le(X_PPOS, 2) + le(4, 2)
+        bus.send(p2_packet(0xfe, 0x92, params))
+        for servo_id in opts.ids:
+            bus.send(p2_packet(servo_id, 0x55, b'\x00' + servo_value(servo_id, cycle, 4)), reply=True)
+        bus.wait_until(start + opts.period_ns)
+
+
+class ScenarioOptions:
+    def __init__(self, servos, payload, cycles, rate_hz):
+        self.ids = list(range(1, servos + 1))
+        self.payload = payload
+        self.cycles = cycles
+        self.period_ns = int(1e9 / rate_hz)
+
+
+s_scenarios = {
+    # name: (builder, default bytes per servo)
+    'p1_ping': (p1_ping, 2),
+    'p1_read': (p1_read, 2),
+    'p1_write': (p1_write, 2),
+    'p1_sync_write': (p1_sync_write, 2),
+    'p1_bulk_read': (p1_bulk_read, 2),
+    'p2_ping': (p2_ping, 4),
+    'p2_read': (p2_read, 4),
+    'p2_write': (p2_write, 4),
+    'p2_sync_write': (p2_sync_write, 4),
+    'p2_sync_read': (p2_sync_read, 4),
+    'p2_fast_sync_read': (p2_fast_sync_read, 4),
+    'p2_bulk_read': (p2_bulk_read, 4),
+    'p2_fast_bulk_read': (p2_fast_bulk_read, 4),
+    'p2_bulk_write': (p2_bulk_write, 4),
+    'hexapod': (hexapod, 4),
+}
+
+
+def build_scenario(name, baud, servos, payload=None, cycles=100, rate_hz=100.0, return_delay_us=20.0):
+    builder, default_payload = s_scenarios[name]
+    opts = ScenarioOptions(servos, payload or default_payload, cycles, rate_hz)
+    bus = BusWriter(baud, return_delay_us)
+    builder(bus, opts)
+    return bus
+
+
+#================================================
+# Measurement
+#================================================
+class HandlerTimer:
+    # Wraps every packet handler of an Hla instance to collect call counts
+    # and cumulative time.
+    def __init__(self, hla):
+        self.stats = {}
+        for table_name in ('processP1Packets', 'processP2Packets'):
+            table = getattr(hla, table_name)
+            for cmd, handler in list(table.items()):
+                table[cmd] = self.wrap(handler)
+
+    def wrap(self, handler):
+        name = handler.__name__
+        entry = self.stats.setdefault(name, [0, 0])
+        perf_counter_ns = time.perf_counter_ns
+
+        def timed(*args):
+            t0 = perf_counter_ns()
+            try:
+                return handler(*args)
+            finally:
+                entry[0] += 1
+                entry[1] += perf_counter_ns() - t0
+        timed.__name__ = name
+        return timed
+
+
+def run_scenario(name, baud, servos, payload=None, cycles=100, repeat=3, settings=None, records_only=False):
+    bus = build_scenario(name, baud, servos, payload, cycles)
+    records = list(bus.records())
+    packets = len(bus.packets)
+    best = None
+    handlers = None
+    for _ in range(repeat):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            hla = ReplayCapture.create_analyzer(settings)
+            timer = HandlerTimer(hla)
+            stats = ReplayCapture.replay(hla, records, records_only=records_only)
+        if best is None or stats['elapsed'] < best['elapsed']:
+            best = stats
+            handlers = timer.stats
+    elapsed_ns = best['elapsed'] * 1e9
+    capture_ns = (records[-1][1] - records[0][0]) if records else 0
+    return {
+        'baud': baud,
+        'servos': servos,
+        'bytes': len(records),
+        'packets': packets,
+        'frames': best['frames'],
+        'ns_per_byte': elapsed_ns / max(1, len(records)),
+        'ns_per_packet': elapsed_ns / max(1, packets),
+        # > 1.0 means the decoder is slower than the bus
+        'load': elapsed_ns / capture_ns if capture_ns else 0.0,
+        'handlers': {name: {'calls': calls, 'ns_per_call': total / calls}
+                     for name, (calls, total) in handlers.items() if calls},
+    }
+
+
+def print_result(name, result):
+    print('%-18s %8d bytes %6d pkts %8.0f ns/byte %9.0f ns/pkt  load %.2f'
+          % (name, result['bytes'], result['packets'], result['ns_per_byte'], result['ns_per_packet'], result['load']))
+    for handler, info in sorted(result['handlers'].items()):
+        print('    %-28s %6d calls %9.0f ns/call' % (handler, info['calls'], info['ns_per_call']))
+
+
+def compare_baseline(results, baseline, tolerance):
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]['ns_per_byte']
+        new = result['ns_per_byte']
+        if new > old * (1.0 + tolerance):
+            failures.append('%s: %.0f ns/byte, baseline %.0f ns/byte (+%.0f%%)'
+                            % (name, new, old, 100.0 * (new / old - 1.0)))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Dynamixel HLA decode benchmarks')
+    parser.add_argument('scenarios', nargs='*', help='scenarios to run (default all): ' + ', '.join(s_scenarios))
+    parser.add_argument('--baud', type=int, default=1000000, help='bus baud rate, up to 4500000 (default 1000000)')
+    parser.add_argument('--servos', type=int, default=24, help='servos on the bus (default 24)')
+    parser.add_argument('--payload', type=int, default=None, help='bytes per servo for reads and writes')
+    parser.add_argument('--cycles', type=int, default=100, help='control cycles per scenario (default 100)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per scenario, the fastest is kept')
+    parser.add_argument('--setting', action='append', metavar='NAME=VALUE', help='HLA setting (may be repeated)')
+    parser.add_argument('--save-baseline', metavar='FILE', help='save the results as the new baseline')
+    parser.add_argument('--baseline', metavar='FILE', help='fail when slower than this baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline (default 0.25)')
+    parser.add_argument('--records-only', action='store_true',
+                        help='time decoding into packet records only, without rendering the frames Logic 2 gets '
+                             '(saved and compared as NAME/records)')
+    parser.add_argument('--write-capture', metavar='FILE', help='write the first scenario as a .dxlbin capture and exit')
+    args = parser.parse_args(argv)
+
+    names = args.scenarios or list(s_scenarios)
+    for name in names:
+        if name not in s_scenarios:
+            parser.error('unknown scenario ' + name)
+    settings = ReplayCapture.parse_settings(args.setting)
+
+    if args.write_capture:
+        bus = build_scenario(names[0], args.baud, args.servos, args.payload, args.cycles)
+        count = ReplayCapture.write_binary(bus.records(), args.write_capture)
+        print('Wrote %d records to %s' % (count, args.write_capture))
+        return 0
+
+    results = {}
+    for name in names:
+        # records only timings are kept apart from the full decode ones
+        key = name + '/records' if args.records_only else name
+        results[key] = run_scenario(name, args.baud, args.servos, args.payload, args.cycles, args.repeat, settings,
+                                    args.records_only)
+        print_result(key, results[key])
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print('Saved baseline to', args.save_baseline)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = compare_baseline(results, baseline, args.tolerance)
+        for failure in failures:
+            print('SLOWER', failure)
+        if failures:
+            return 1
+        print('No scenario slower than the baseline by more than %d%%' % (args.tolerance * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
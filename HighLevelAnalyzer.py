@@ -2,6 +2,1221 @@
 # For more information and documentation, please go to https://support.saleae.com/extensions/high-level-analyzer-extensions
 
 from saleae.analyzers import HighLevelAnalyzer, AnalyzerFrame, StringSetting, NumberSetting, ChoicesSetting
+from saleae.data import GraphTimeDelta
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from functools import wraps
+
+# Byte decode states, used as the index into Hla.decodeDispatch
+STATE_1ST_FF = 0
+STATE_2ND_FF = 1
+STATE_ID = 2
+STATE_LEN1 = 3
+STATE_P1_INST = 4
+STATE_P1_DATA = 5
+STATE_P1_CHKSUM = 6
+STATE_P2_ID = 7
+STATE_P2_LEN1 = 8
+STATE_P2_LEN2 = 9
+STATE_P2_INST = 10
+STATE_P2_DATA = 11
+STATE_P2_CRC1 = 12
+STATE_P2_CRC2 = 13
+STATE_NAMES = ('1ST_FF', '2ND_FF', 'ID', 'LEN1', 'P1_INST', 'P1_DATA', 'P1_CHKSUM',
+               'P2_ID', 'P2_LEN1', 'P2_LEN2', 'P2_INST', 'P2_DATA', 'P2_CRC1', 'P2_CRC2')
+
+
+#================================================
+# Control tables
+#================================================
+class ControlTable:
+    # A servo control table compiled into arrays indexed by register address,
+    # names[reg] is None and widths[reg] 0 where no register starts. Entries
+    # flagged "hex" (status and bit field registers) set bases[reg] to 16,
+    # the base the Auto display format shows them in.
+    __slots__ = ('name', 'size', 'names', 'widths', 'bases', 'registers', 'file_name')
+
+    def __init__(self, name, registers, file_name=None):
+        self.name = name
+        self.file_name = file_name # in control_tables/
+        self.size = max([reg + cb for reg, reg_name, cb, *flags in registers] or [0])
+        self.names = [None] * self.size
+        self.widths = bytearray(self.size)
+        self.bases = bytearray(self.size)
+        self.registers = {}  # name -> (reg, cb)
+        for reg, reg_name, cb, *flags in registers:
+            self.names[reg] = reg_name
+            self.widths[reg] = cb
+            self.bases[reg] = 16 if "hex" in flags else 10
+            self.registers[reg_name] = (reg, cb)
+
+    def reg_name(self, reg):
+        if reg < self.size:
+            name = self.names[reg]
+            if name is not None:
+                return name
+        return hex(reg)
+
+    def width(self, reg):
+        # addresses that do not start a register count as one byte
+        if reg < self.size and self.widths[reg]:
+            return self.widths[reg]
+        return 1
+
+    def auto_base(self, reg):
+        # bytes at addresses that do not start a register show as hex
+        if reg < self.size and self.bases[reg]:
+            return self.bases[reg]
+        return 16
+
+
+class ControlTableCache:
+    # Control tables from the JSON files in control_tables/, models.json maps
+    # each file to the Robotis model numbers using it. Files are only read
+    # the first time they are asked for and stay loaded for the life of the
+    # Python process, which outlives the analyzer instances Logic 2 creates
+    # on every settings change.
+    def __init__(self, directory):
+        self.directory = directory
+        self.models = None
+        self.tables = {}
+
+    def load(self, file_name):
+        table = self.tables.get(file_name)
+        if table is None:
+            with open(os.path.join(self.directory, file_name)) as f:
+                info = json.load(f)
+            table = self.tables[file_name] = ControlTable(info["name"], info["registers"], file_name)
+        return table
+
+    def for_model(self, model):
+        # None for models without a table
+        if self.models is None:
+            with open(os.path.join(self.directory, 'models.json')) as f:
+                self.models = {model: file_name for file_name, models in json.load(f).items()
+                               for model in models}
+        file_name = self.models.get(model)
+        if file_name is None:
+            return None
+        return self.load(file_name)
+
+control_tables = ControlTableCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'control_tables'))
+
+
+#================================================
+# Value formatting
+#================================================
+# Text of every byte value for Dec and Hex, a run of bytes becomes text with
+# one lookup per byte and a single join.
+byte_texts = {10: tuple([str(v) for v in range(256)]),
+              16: tuple([hex(v) for v in range(256)])}
+
+def byte_text(base):
+    # raw bytes (write data, servo IDs...) are in hex unless Dec is chosen
+    return byte_texts[10 if base == 10 else 16]
+
+def bytes_text(data, base):
+    # ' v1 v2 ...'
+    if not data:
+        return ''
+    return ' ' + ' '.join(map(byte_text(base).__getitem__, data))
+
+value_formatters = {}
+
+def value_formatter(width, base):
+    # text of one register value of width bytes in base 10 or 16
+    formatter = value_formatters.get((width, base))
+    if formatter is None:
+        if width == 1:
+            formatter = byte_texts[base].__getitem__
+        else:
+            formatter = str if base == 10 else hex
+        value_formatters[(width, base)] = formatter
+    return formatter
+
+
+#================================================
+# Register layouts
+#================================================
+class RegisterLayout:
+    # How a run of bytes starting at one register splits into the registers
+    # of a servo table. Fields are (offset, width, reg, is_word), where is_word
+    # tells the register is wider than one byte even when the run cut it short.
+    __slots__ = ('table', 'start_reg', 'byte_count', 'fields', 'unpack_from', 'formatters', 'formatter')
+
+    s_struct_codes = {1: 'B', 2: 'H', 4: 'I'}
+
+    def __init__(self, table, start_reg, byte_count, base):
+        self.table = table  # keeps the table alive while its id() is in a cache key
+        self.start_reg = start_reg
+        self.byte_count = byte_count
+        fields = []
+        offset = 0
+        reg = start_reg
+        while offset < byte_count:
+            cb_reg = table.width(reg)
+            fields.append((offset, min(cb_reg, byte_count - offset), reg, cb_reg > 1))
+            offset += cb_reg
+            reg += cb_reg
+        self.fields = tuple(fields)
+
+        codes = [self.s_struct_codes.get(width) for offset, width, reg, is_word in fields]
+        if None in codes:
+            self.unpack_from = None # odd width left at the end, do it by hand
+        else:
+            self.unpack_from = struct.Struct('<' + ''.join(codes)).unpack_from
+
+        # Auto (base 0) takes each register's base from the table
+        self.formatters = tuple([value_formatter(width, base or table.auto_base(reg))
+                                 for offset, width, reg, is_word in fields])
+        # the one formatter when all the values share it, the usual case
+        self.formatter = self.formatters[0] if len(set(self.formatters)) == 1 else None
+
+    def values(self, data, index):
+        if self.unpack_from is not None:
+            return self.unpack_from(data, index)
+        return tuple(int.from_bytes(data[index + offset:index + offset + width], 'little')
+                     for offset, width, reg, is_word in self.fields)
+
+    def format(self, data, index):
+        # ' v1 v2 ...'
+        if not self.fields:
+            return ''
+        if self.formatter is not None:
+            return ' ' + ' '.join(map(self.formatter, self.values(data, index)))
+        return ' ' + ' '.join([f(v) for f, v in zip(self.formatters, self.values(data, index))])
+
+
+class RegisterLayoutCache:
+    # Least recently used cache of compiled layouts, shared by all instances
+    # so it survives Logic 2 re-creating the analyzer.
+    max_entries = 512
+
+    def __init__(self):
+        self.layouts = OrderedDict()
+
+    def get(self, table, start_reg, byte_count, base):
+        key = (id(table), start_reg, byte_count, base)
+        layout = self.layouts.get(key)
+        if layout is None:
+            layout = RegisterLayout(table, start_reg, byte_count, base)
+            self.layouts[key] = layout
+            if len(self.layouts) > self.max_entries:
+                self.layouts.popitem(last=False)
+        else:
+            self.layouts.move_to_end(key)
+        return layout
+
+register_layouts = RegisterLayoutCache()
+
+
+#================================================
+# Register mirror
+#================================================
+class ServoRegisterMirror:
+    # Live image of every servo's control table, built from the writes that
+    # go out and the read replies that come back. Storage is dense: a list
+    # indexed by servo ID holding one bytearray per servo, plus a matching
+    # bytearray that marks which bytes have been seen.
+    #
+    # With keep_history every update is also logged per servo into arrays
+    # (time, start register, offset into a byte blob), which is what the
+    # "value at time t" queries walk back through.
+    def __init__(self, keep_history=False):
+        self.images = [None] * 256
+        self.known = [None] * 256
+        self.tables = [None] * 256
+        self.keep_history = keep_history
+        self.history = [None] * 256
+        self.pending = [None] * 256 # REG_WRITE data waiting for an Action
+        self.start_time = None
+
+    def image(self, servo_id, table, size):
+        image = self.images[servo_id]
+        if image is None:
+            size = max(size, table.size)
+            image = self.images[servo_id] = bytearray(size)
+            self.known[servo_id] = bytearray(size)
+            self.tables[servo_id] = table
+        elif len(image) < size:
+            image.extend(bytes(size - len(image)))
+            self.known[servo_id].extend(bytes(size - len(self.known[servo_id])))
+        return image
+
+    def update(self, servo_id, table, reg, data, time, start=0, count=None):
+        # data[start:start + count] was written to, or read from, reg at the
+        # given (analyzer frame) time
+        if count is None:
+            count = len(data) - start
+        if count <= 0 or servo_id >= 0xfe:
+            return
+        end = reg + count
+        image = self.image(servo_id, table, end)
+        image[reg:end] = data[start:start + count]
+        self.known[servo_id][reg:end] = b'\x01' * count
+        if self.keep_history:
+            history = self.history[servo_id]
+            if history is None:
+                history = self.history[servo_id] = (array('d'), array('H'), array('I'), bytearray())
+            times, regs, offsets, blob = history
+            if self.start_time is None:
+                self.start_time = time
+            times.append(float(time - self.start_time))
+            regs.append(reg)
+            offsets.append(len(blob))
+            blob += data[start:start + count]
+
+    def set_table(self, servo_id, table):
+        # The servo's model became known after some of its registers were
+        # seen. The bytes stay where they are, the registers are named and
+        # split by the new table from now on.
+        if self.images[servo_id] is not None:
+            self.tables[servo_id] = table
+            self.image(servo_id, table, table.size)
+
+    def hold(self, servo_id, table, reg, data, start=0):
+        # REG_WRITE, only takes effect on the next Action
+        if servo_id < 0xfe:
+            self.pending[servo_id] = (table, reg, bytes(data[start:]))
+
+    def action(self, servo_id, time):
+        ids = range(0xfe) if servo_id == 0xfe else (servo_id,)
+        for action_id in ids:
+            pending = self.pending[action_id]
+            if pending is not None:
+                self.pending[action_id] = None
+                table, reg, data = pending
+                self.update(action_id, table, reg, data, time)
+
+    def register(self, servo_id, name):
+        # (reg, cb) for a register name in the table used for this servo
+        table = self.tables[servo_id]
+        if table is None:
+            return None
+        return table.registers.get(name)
+
+    def value(self, servo_id, reg, cb=1):
+        # current value, None until every byte of it has been seen
+        known = self.known[servo_id]
+        if known is None or reg + cb > len(known) or known[reg:reg + cb].count(0):
+            return None
+        return int.from_bytes(self.images[servo_id][reg:reg + cb], 'little')
+
+    def value_at(self, servo_id, reg, cb, time):
+        # value as of the given (analyzer frame) time, needs keep_history
+        history = self.history[servo_id]
+        if history is None:
+            return None
+        times, regs, offsets, blob = history
+        time = float(time - self.start_time)
+        value = bytearray(cb)
+        missing = cb
+        seen = bytearray(cb)
+        i = bisect_right(times, time)
+        while i > 0 and missing:
+            i -= 1
+            start = regs[i]
+            end = len(blob) if i + 1 == len(offsets) else offsets[i + 1]
+            end = start + end - offsets[i]
+            for r in range(max(reg, start), min(reg + cb, end)):
+                if not seen[r - reg]:
+                    seen[r - reg] = 1
+                    value[r - reg] = blob[offsets[i] + r - start]
+                    missing -= 1
+        if missing:
+            return None
+        return int.from_bytes(value, 'little')
+
+    def snapshot(self, servo_id):
+        image = self.images[servo_id]
+        return bytes(image) if image is not None else None
+
+    def servo_ids(self):
+        return [servo_id for servo_id, image in enumerate(self.images) if image is not None]
+
+
+#================================================
+# Register export
+#================================================
+class RegisterExport:
+    # Register values of the writes that go out and the read replies that
+    # come back, one row per register in five .npy files (time, id, reg,
+    # value, direction) that numpy.load(..., mmap_mode='r') opens without
+    # any parsing. time is seconds from the first exported value. Rows
+    # are collected in small arrays and copied into the memory mapped files
+    # every chunk_rows. The files grow by doubling, and their headers always
+    # count the rows copied so far. Memory use stays flat however long the
+    # capture is. numpy is only imported when the export is on.
+    READ = 0
+    WRITE = 1
+
+    # name, array code, numpy dtype
+    s_columns = (('time', 'd', '<f8'), ('id', 'B', '|u1'), ('reg', 'H', '<u2'), ('value', 'q', '<i8'),
+                 ('direction', 'B', '|u1'))
+    s_header_bytes = 128
+    chunk_rows = 16384
+    initial_rows = 1 << 20
+
+    def __init__(self, directory):
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('Exporting register values needs numpy (pip install numpy)')
+        self.numpy = numpy
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, name + '.npy') for name, code, dtype in self.s_columns]
+        self.itemsizes = [numpy.dtype(dtype).itemsize for name, code, dtype in self.s_columns]
+        self.rows = [array(code) for name, code, dtype in self.s_columns]
+        self.count = 0 # rows in the files
+        self.capacity = 0
+        self.maps = None
+        self.time_ref = None
+        for path in self.paths:
+            open(path, 'wb').close()
+        self.grow(self.initial_rows)
+
+    def add(self, time, servo_id, table, reg, data, start, count, direction):
+        # data[start:start + count] was written to, or read from, reg
+        if count is None or count > len(data) - start:
+            count = len(data) - start
+        if count <= 0 or servo_id >= 0xfe:
+            return
+        if self.time_ref is None:
+            self.time_ref = time
+        layout = register_layouts.get(table, reg, count, 10)
+        values = layout.values(data, start)
+        n = len(values)
+        times, ids, regs, column_values, directions = self.rows
+        times.extend([float(time - self.time_ref)] * n)
+        ids.extend([servo_id] * n)
+        regs.extend([field[2] for field in layout.fields])
+        column_values.extend(values)
+        directions.extend([direction] * n)
+        if len(times) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        # copy the collected rows into the files
+        rows = len(self.rows[0])
+        if not rows:
+            return
+        if self.count + rows > self.capacity:
+            self.grow(max(2 * self.capacity, self.count + rows))
+        end = self.count + rows
+        for column_map, column_rows, (name, code, dtype) in zip(self.maps, self.rows, self.s_columns):
+            column_map[self.count:end] = self.numpy.frombuffer(column_rows, dtype=dtype)
+            del column_rows[:]
+        self.count = end
+        self.write_headers()
+
+    def grow(self, rows):
+        # room for rows in each file, left sparse until written
+        self.maps = None
+        maps = []
+        for path, itemsize, (name, code, dtype) in zip(self.paths, self.itemsizes, self.s_columns):
+            with open(path, 'r+b') as file:
+                file.truncate(self.s_header_bytes + rows * itemsize)
+            maps.append(self.numpy.memmap(path, dtype=dtype, mode='r+', offset=self.s_header_bytes,
+                                          shape=(rows,)))
+        self.maps = maps
+        self.capacity = rows
+        self.write_headers()
+
+    def write_headers(self):
+        # .npy version 1.0 headers, padded to the same size whatever the count
+        for path, (name, code, dtype) in zip(self.paths, self.s_columns):
+            header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (dtype, self.count)
+            header = header.ljust(self.s_header_bytes - 11) + '\n'
+            with open(path, 'r+b') as file:
+                file.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1'))
+
+    def close(self):
+        # the rest of the rows, and the files cut down to them
+        self.flush()
+        self.maps = None
+        for path, itemsize in zip(self.paths, self.itemsizes):
+            with open(path, 'r+b') as file:
+                file.truncate(self.s_header_bytes + self.count * itemsize)
+
+
+#================================================
+# Last register values
+#================================================
+class LastValueCache:
+    # Last value written to or read from each register of each servo, for
+    # showing only the values that changed. Storage is one flat bytearray
+    # indexed by (protocol, servo ID, register) plus a matching one marking
+    # the bytes seen, so an unchanged block costs a slice compare. Registers
+    # from s_stride on and broadcasts are not kept and always count as
+    # changed.
+    s_stride = 1024
+
+    def __init__(self):
+        self.values = bytearray(2 * 256 * self.s_stride)
+        self.seen = bytearray(len(self.values))
+
+    def changes(self, protocol, servo_id, table, reg, data, start, count, out):
+        # Store data[start:start + count] as the values from reg on and add
+        # an ID, reg word, count word and values block to out (the Bulk
+        # Write layout) for each run of registers that changed. Returns the
+        # number of blocks added.
+        end = reg + count
+        if (end > self.s_stride) or (servo_id >= 0xfe):
+            out += struct.pack('<BHH', servo_id, reg, count) + data[start:start + count]
+            return 1
+        base = ((protocol - 1) * 256 + servo_id) * self.s_stride
+        values = self.values
+        seen = self.seen
+        if (values[base + reg:base + end] == data[start:start + count]) and \
+                (seen.find(0, base + reg, base + end) < 0):
+            return 0
+        # (reg, first offset, end offset) of each run of changed registers
+        runs = []
+        for offset, width, field_reg, is_word in register_layouts.get(table, reg, count, 0).fields:
+            first = base + field_reg
+            new = data[start + offset:start + offset + width]
+            if (values[first:first + width] != new) or (seen.find(0, first, first + width) >= 0):
+                values[first:first + width] = new
+                seen[first:first + width] = b'\x01' * width
+                if runs and (runs[-1][2] == offset):
+                    runs[-1][2] = offset + width
+                else:
+                    runs.append([field_reg, offset, offset + width])
+        for run_reg, run_start, run_end in runs:
+            out += struct.pack('<BHH', servo_id, run_reg, run_end - run_start) + data[start + run_start:start + run_end]
+        return len(runs)
+
+
+#================================================
+# Packet records
+#================================================
+def data_part(table, reg, data, start, count, base):
+    # (layout, index) for count bytes of data from start, the rest of the
+    # data when count is 0, None when there is nothing left.
+    data_len = len(data)
+    end = start + count if count > 0 else data_len
+    if end > data_len:
+        end = data_len
+    if end <= start:
+        return None
+    return (register_layouts.get(table, reg, end - start, base), start)
+
+
+def bulk_read_blocks(protocol, data):
+    # [(servo ID, reg, count)] asked for by a Bulk Read or Fast Bulk Read,
+    # None when the parameters do not split into whole blocks. Protocol 1
+    # has a 0 byte then count, ID, reg, Protocol 2 ID, reg and count words.
+    if protocol == 1:
+        if (len(data) < 1) or ((len(data) - 1) % 3):
+            return None
+        return [(data[i + 1], data[i + 2], data[i]) for i in range(1, len(data), 3)]
+    if len(data) % 5:
+        return None
+    return [(data[i], data[i + 1] | (data[i + 2] << 8), data[i + 3] | (data[i + 4] << 8))
+            for i in range(0, len(data), 5)]
+
+
+class PacketRecord:
+    # A decoded packet kept as its raw fields and the parameter buffer, which
+    # is the packet's own (start_data makes a new one each packet). It looks
+    # enough like an AnalyzerFrame (type, start_time, end_time, data) for the
+    # grouping and replay code, but the strings of data are only built the
+    # first time data is asked for. render fills in
+    # the fields after the common ones, parts lists the register values as
+    # strings and (layout, index) pairs. table is the table the registers
+    # are named from, tables the one of each servo in a multi servo packet
+    # and blocks the (reg, count) of each servo in a Fast Bulk Read reply.
+    __slots__ = ('type', 'start_time', 'end_time', 'protocol', 'servo_id', 'cmd', 'check', 'payload',
+                 'base', 'table', 'tables', 'blocks', 'reg', 'reg_cnt', 'start', 'render', 'parts', '_data')
+
+    def __init__(self, frame_type, start_time, end_time, protocol, servo_id, cmd, check, payload, base,
+                 table, render=None, parts=None):
+        self.type = frame_type
+        self.start_time = start_time
+        self.end_time = end_time
+        self.protocol = protocol
+        self.servo_id = servo_id
+        self.cmd = cmd
+        self.check = check # None or (computed, read) checksum/CRC
+        self.payload = payload
+        self.base = base
+        self.table = table
+        self.tables = None
+        self.blocks = None
+        self.reg = None
+        self.reg_cnt = None
+        self.start = 0
+        self.render = render
+        self.parts = parts
+        self._data = None
+
+    @property
+    def data(self):
+        data = self._data
+        if data is None:
+            data = self._data = self.render_data()
+        return data
+
+    def frame(self):
+        return AnalyzerFrame(self.type, self.start_time, self.end_time, self.data)
+
+    def values(self):
+        # the register values of the packet, what grouping keeps min/max of
+        values = []
+        if self.parts is not None:
+            for part in self.parts(self):
+                if type(part) is tuple:
+                    values.extend(part[0].values(self.payload, part[1]))
+        return values
+
+    def join_parts(self):
+        payload = self.payload
+        return ''.join([part if type(part) is str else part[0].format(payload, part[1])
+                        for part in self.parts(self)])
+
+    def render_data(self):
+        data = {}
+        check = None
+        if self.check is not None:
+            check = hex(self.check[0]) + "!=" + hex(self.check[1])
+            if self.protocol == 2:
+                data["crc"] = check
+        data['id'] = str(self.servo_id)
+        data['protocol'] = str(self.protocol)
+        if (check is not None) and (self.protocol == 1):
+            data["chksum"] = check
+        cmd_name = Hla.s_cmd_names.get(self.cmd)
+        data['cmd'] = cmd_name if cmd_name is not None else '0x' + hex(self.cmd).upper()[2:]
+        if self.render is not None:
+            self.render(self, data)
+        return data
+
+    def reply_error(self, err):
+        if (err & 0x80) != 0:
+            return 'Alert'
+        return Hla.s_result_errors.get(err, err)
+
+    def p1_reply_error(self):
+        # Protocol 1 status packets have error bits in place of the instruction
+        if not self.cmd:
+            return ''
+        return ' '.join([name for bit, name in Hla.s_p1_errors if self.cmd & bit])
+
+    # render functions, fill in the fields of one kind of packet
+    def render_bytes(self, data):
+        data['data'] = bytes_text(self.payload, self.base)
+
+    def render_read(self, data):
+        data['reg'] = self.table.reg_name(self.reg)
+        data['cnt'] = hex(self.reg_cnt)
+
+    def render_write(self, data):
+        data['reg'] = self.table.reg_name(self.reg)
+        data['data'] = bytes_text(self.payload[self.start:], self.base)
+
+    def render_sync_write(self, data):
+        self.render_read(data)
+        data['data'] = self.join_parts()
+
+    def render_sync_read(self, data):
+        self.render_read(data)
+        data['data'] = 'IDs:' + bytes_text(self.payload[4:], self.base) if len(self.payload) > 4 else ''
+
+    def render_bulk_read(self, data):
+        data['data'] = ''.join([' ' + str(servo_id) + '(' + table.reg_name(reg) + ', ' + str(reg_cnt) + '):'
+                                for (servo_id, reg, reg_cnt), table
+                                in zip(bulk_read_blocks(self.protocol, self.payload), self.tables)])
+
+    def render_bulk_write(self, data):
+        data['data'] = self.join_parts()
+
+    def render_reply(self, data):
+        if self.protocol == 1:
+            data['cmd'] = 'Reply'
+            data['err'] = self.p1_reply_error()
+            if len(self.payload):
+                data['data'] = self.join_parts()
+        else:
+            data['err'] = self.reply_error(self.payload[0])
+            data['data'] = self.join_parts()
+
+    def render_ping_reply(self, data):
+        # 2 bytes model# and 1 byte firmware version
+        payload = self.payload
+        value_format = str if self.base == 10 else hex
+        data['err'] = self.reply_error(payload[0])
+        data['data'] = 'model:' + value_format(int.from_bytes(payload[1:3], 'little')) + \
+            ' Ver:' + value_format(payload[3])
+
+    def render_reply_error(self, data):
+        data['err'] = self.reply_error(self.payload[0])
+
+    # parts functions, the register values of one kind of packet
+    def parts_data(self):
+        part = data_part(self.table, self.reg, self.payload, self.start, 0, self.base)
+        return [part] if part is not None else []
+
+    def parts_sync_write(self):
+        payload = self.payload
+        data_len = len(payload)
+        id_text = byte_text(self.base)
+        reg_cnt = self.reg_cnt
+        parts = []
+        table = None
+        i = self.start
+        for servo_table in self.tables:
+            parts.append(' ' + id_text[payload[i]] + ':')
+            i += 1
+            if i + reg_cnt > data_len:
+                # last servo cut short
+                layout = register_layouts.get(servo_table, self.reg, data_len - i, self.base)
+            elif servo_table is not table:
+                layout = register_layouts.get(servo_table, self.reg, reg_cnt, self.base)
+                table = servo_table
+            parts.append((layout, i))
+            i += reg_cnt
+        return parts
+
+    def parts_fast_sync_reply(self):
+        return self.fast_reply_parts([(self.reg, self.reg_cnt)] * len(self.tables))
+
+    def parts_fast_bulk_reply(self):
+        return self.fast_reply_parts(self.blocks)
+
+    def fast_reply_parts(self, blocks):
+        # err, id, data and a CRC for each servo
+        payload = self.payload
+        parts = []
+        param_index = 0
+        for servo_table, (reg, reg_cnt) in zip(self.tables, blocks):
+            err = payload[param_index]
+            parts.append(' ' + str(payload[param_index + 1]) + ':')
+            part = data_part(servo_table, reg, payload, param_index + 2, reg_cnt, self.base)
+            if part is not None:
+                parts.append(part)
+            if err:
+                err_str = self.reply_error(err)
+                parts.append(' err: ' + (err_str if type(err_str) is str else hex(err_str)))
+            param_index += 4 + reg_cnt
+        return parts
+
+    def parts_bulk_write(self):
+        payload = self.payload
+        parts = []
+        param_index = 0
+        for servo_table in self.tables:
+            reg = int.from_bytes(payload[param_index + 1:param_index + 3], 'little')
+            reg_cnt = int.from_bytes(payload[param_index + 3:param_index + 5], 'little')
+            param_index += 5
+            parts.append(' ' + str(payload[param_index - 5]) + '(' + servo_table.reg_name(reg) + '):')
+            part = data_part(servo_table, reg, payload, param_index, reg_cnt, self.base)
+            if part is not None:
+                parts.append(part)
+            param_index += reg_cnt
+        return parts
+
+
+#================================================
+# Packet groups
+#================================================
+class PacketGroup:
+    # Run of packets of one kind (type, command, register and servo IDs)
+    # seen within a grouping window. Values are kept element wise so the
+    # min/max of a sync write are per servo and register.
+    __slots__ = ('first_frame', 'ids', 'reg', 'start_time', 'end_time', 'count', 'mins', 'maxs', 'last')
+
+    def __init__(self, first_frame, values, ids, reg):
+        self.first_frame = first_frame
+        self.ids = ids
+        self.reg = reg
+        self.start_time = first_frame.start_time
+        self.end_time = first_frame.end_time
+        self.count = 1
+        self.mins = list(values)
+        self.maxs = list(values)
+        self.last = values
+
+    def add(self, frame, values):
+        self.end_time = frame.end_time
+        self.count += 1
+        mins = self.mins
+        maxs = self.maxs
+        for i, value in enumerate(values):
+            if value < mins[i]:
+                mins[i] = value
+            elif value > maxs[i]:
+                maxs[i] = value
+        self.last = values
+
+    def frame(self, base):
+        # spans its first to last packet, one that never repeated keeps its
+        # own frame
+        if self.count == 1:
+            return self.first_frame
+        value_format = hex if base == 16 else str
+        data = self.first_frame.data
+        ids = data['id']
+        if self.ids:
+            ids = ','.join([str(servo_id) for servo_id in self.ids])
+        return AnalyzerFrame("DXL Group", self.start_time, self.end_time, {
+            'kind': self.first_frame.type[4:],
+            'cmd': data['cmd'],
+            'id': data['id'],
+            'ids': ids,
+            'reg': self.reg if self.reg is not None else '',
+            'count': str(self.count),
+            'last': ' '.join([value_format(v) for v in self.last]),
+            'min': ' '.join([value_format(v) for v in self.mins]),
+            'max': ' '.join([value_format(v) for v in self.maxs])})
+
+
+#================================================
+# Command periods
+#================================================
+class CommandStream:
+    # Requests of one kind (protocol, instruction, start register and servo
+    # IDs) and the time between them, kept as a running (Welford) mean and
+    # variance, min/max and a histogram of how far each period was from the
+    # mean, so each packet costs the same however long the capture is.
+    __slots__ = ('cmd', 'reg', 'ids', 'last_start', 'count', 'mean', 'm2', 'low', 'high', 'over',
+                 'histogram', 'since_summary')
+
+    def __init__(self, cmd, reg, ids, start_time, buckets):
+        self.cmd = cmd
+        self.reg = reg # name, '' when the packet has none
+        self.ids = ids # text
+        self.last_start = start_time
+        self.count = 0 # periods
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.low = None
+        self.high = None
+        self.over = 0 # periods past the jitter limit
+        self.histogram = array('L', [0]) * buckets
+        self.since_summary = 0
+
+    def add(self, period):
+        # returns how far period was from the mean before it
+        deviation = period - self.mean
+        self.count += 1
+        self.mean += deviation / self.count
+        self.m2 += deviation * (period - self.mean)
+        if self.low is None or period < self.low:
+            self.low = period
+        if self.high is None or period > self.high:
+            self.high = period
+        self.since_summary += 1
+        return deviation
+
+    def std(self):
+        return (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0.0
+
+    def summary(self):
+        return {'cmd': self.cmd, 'ids': self.ids, 'reg': self.reg, 'count': str(self.count),
+                'mean': '%.1f' % self.mean, 'std': '%.1f' % self.std(),
+                'min': '%.1f' % self.low, 'max': '%.1f' % self.high}
+
+
+#================================================
+# Decode profiling
+#================================================
+class DecodeProfiler:
+    # Call counts, perf_counter_ns time and allocated memory blocks (net,
+    # from sys.getallocatedblocks) per decode state, packet handler and
+    # record render function. The Hla swaps timed versions of its methods in
+    # when the Profile Decoding setting is on, so with it off none of this
+    # code runs.
+    def __init__(self):
+        self.counters = OrderedDict() # name -> [calls, ns, blocks]
+
+    def counter(self, name):
+        return self.counters.setdefault(name, [0, 0, 0])
+
+    def wrap(self, name, function):
+        counter = self.counter(name)
+        clock = time.perf_counter_ns
+        blocks = sys.getallocatedblocks
+
+        @wraps(function)
+        def timed(*args):
+            start_blocks = blocks()
+            start = clock()
+            result = function(*args)
+            counter[1] += clock() - start
+            counter[2] += blocks() - start_blocks
+            counter[0] += 1
+            return result
+        return timed
+
+    def wrap_handlers(self, prefix, handlers):
+        return {cmd: self.wrap(prefix + handler.__name__, handler) for cmd, handler in handlers.items()}
+
+    def wrap_states(self, hla, decode_char):
+        # time is charged to the state the character arrived in, which
+        # includes the packet handler for the last state of a packet. The
+        # characters a resync decodes again are part of the call that found
+        # the bad packet, only that outer call is timed.
+        counters = [self.counter('state ' + name) for name in STATE_NAMES]
+        clock = time.perf_counter_ns
+        blocks = sys.getallocatedblocks
+        active = [False]
+
+        @wraps(decode_char)
+        def timed(frame):
+            if active[0]:
+                return decode_char(frame)
+            counter = counters[hla.frame_state]
+            active[0] = True
+            start_blocks = blocks()
+            start = clock()
+            try:
+                result = decode_char(frame)
+            finally:
+                active[0] = False
+            counter[1] += clock() - start
+            counter[2] += blocks() - start_blocks
+            counter[0] += 1
+            return result
+        return timed
+
+    def wrap_records(self, packet_record):
+        # records get timed render and parts functions, so rendering is
+        # counted whenever it happens
+        timed = {}
+
+        def timed_function(function):
+            if function is None:
+                return None
+            result = timed.get(function)
+            if result is None:
+                result = timed[function] = self.wrap('render ' + function.__name__, function)
+            return result
+
+        @wraps(packet_record)
+        def timed_record(frame_type, frame, render=None, parts=None):
+            return packet_record(frame_type, frame, timed_function(render), timed_function(parts))
+        return timed_record
+
+    def report(self):
+        # busiest first, states include the handlers they called
+        lines = ['%-34s %10s %10s %9s %8s' % ('', 'calls', 'total ms', 'ns/call', 'blocks')]
+        for name, (calls, ns, blocks) in sorted(self.counters.items(), key=lambda item: -item[1][1]):
+            if calls:
+                lines.append('%-34s %10d %10.1f %9.0f %8d' % (name, calls, ns / 1e6, ns / calls, blocks))
+        return '\n'.join(lines)
+
+
+#================================================
+# Decode cache
+#================================================
+class DecodeCache:
+    # What decode returned for a capture, kept in a file so running the
+    # analyzer again over the same capture after a display only change
+    # (Display Format, register pairs, log level) just renders the packets
+    # again instead of parsing them.
+    #
+    # The file is picked by the settings that change what is decoded and a
+    # hash of the first probe_bytes characters. Each result is appended with
+    # the character count, a running hash of the character values and the
+    # end time of the character it came back for, and a later run replays
+    # it once its characters got there with the same hash and time. On a
+    # mismatch the characters since the last result are parsed again, at the
+    # end of the file parsing picks up from there and adds to it. Either way
+    # the decoder starts over as if the capture began there. Files are only
+    # appended to, the oldest are removed to keep the directory under
+    # max_bytes.
+    version = 2
+    probe_bytes = 256
+    max_bytes = 256 * 1024 * 1024
+
+    s_entry = struct.Struct('<QQdB')  # character count, hash, end time, frame count
+    # kind, start, end, type, protocol, id, cmd, checksum/CRC computed and read,
+    # reg, count, start index, render, parts, table, table count, block count,
+    # payload length
+    s_record = struct.Struct('<BddBBBBHHiiHBBHHHH')
+    s_frame = struct.Struct('<BddH')  # kind, start, end, JSON length
+    s_no_tables = 0xffff
+
+    # the kind byte of an encoded frame
+    RECORD = 0
+    RECORD_CHECK = 1
+    FRAME = 2
+
+    def __init__(self, hla, directory, key):
+        self.hla = hla
+        self.directory = directory
+        self.key = key
+        self.byte_count = 0
+        self.hash = 0xcbf29ce484222325
+        self.time_ref = None
+        self.pending = [] # encoded results until the file is picked
+        self.file = None
+        self.path = None
+        self.reading = False
+        self.budget = 0
+        self.next_entry = None
+        self.chars = [] # characters since the last result replayed
+        self.good_offset = 0
+        self.tables = [] # table index in the file -> ControlTable
+        self.table_ids = {}
+        self.record_types = tuple(Hla.result_types)
+        self.renders = (None, PacketRecord.render_bytes, PacketRecord.render_read, PacketRecord.render_write,
+                        PacketRecord.render_sync_write, PacketRecord.render_sync_read,
+                        PacketRecord.render_bulk_read, PacketRecord.render_bulk_write, PacketRecord.render_reply,
+                        PacketRecord.render_ping_reply, PacketRecord.render_reply_error)
+        self.parts = (None, PacketRecord.parts_data, PacketRecord.parts_sync_write,
+                      PacketRecord.parts_fast_sync_reply, PacketRecord.parts_bulk_write,
+                      PacketRecord.parts_fast_bulk_reply)
+
+    def decode(self, frame: AnalyzerFrame):
+        # Hla.decode_records while the cache is on
+        try:
+            value = frame.data['data'][0]
+        except:
+            return None
+        if self.time_ref is None:
+            self.time_ref = frame.start_time
+        self.byte_count += 1
+        self.hash = ((self.hash ^ value) * 0x100000001b3) & 0xffffffffffffffff
+        if self.reading:
+            if self.byte_count == self.next_entry[0]:
+                return self.replay(frame)
+            self.chars.append(frame)
+            return None
+        result = self.hla.decode_char(frame)
+        if (result is not None) and ((self.file is not None) or (self.pending is not None)):
+            self.save(frame, result)
+        if self.byte_count == self.probe_bytes:
+            self.open(frame)
+        return result
+
+    def time(self, offset):
+        return self.time_ref + GraphTimeDelta(second=offset)
+
+    #--------------------------------------------------------------------------
+    # cache files
+    #--------------------------------------------------------------------------
+    def open(self, frame: AnalyzerFrame):
+        key = '%d|%s|%x|%r' % (self.version, self.key, self.hash, float(frame.end_time - self.time_ref))
+        self.path = os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest()[:24] + '.dxlcache')
+        pending = self.pending
+        self.pending = None
+        try:
+            if os.path.exists(self.path):
+                os.utime(self.path)
+                self.file = open(self.path, 'rb')
+                # skip what was already decoded while probing
+                entry = self.read_entry()
+                while (entry is not None) and (entry[0] <= self.byte_count):
+                    entry = self.read_entry()
+                if entry is None:
+                    # nothing past the probe, still parsing anyway
+                    self.append(restart=False)
+                else:
+                    self.reading = True
+                    self.next_entry = entry
+            else:
+                os.makedirs(self.directory, exist_ok=True)
+                self.budget = self.make_room()
+                # unbuffered, whatever was decoded is in the file even if the
+                # analyzer is never closed
+                self.file = open(self.path, 'wb', buffering=0)
+                for data in pending:
+                    self.write(data)
+        except OSError as e:
+            if self.hla.log_errors:
+                print(">> Decode cache:", e)
+            self.file = None
+
+    def make_room(self):
+        # Remove the oldest files until the others take at most half of
+        # max_bytes, the new file may use the rest.
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.dxlcache'):
+                path = os.path.join(self.directory, name)
+                files.append((os.path.getmtime(path), os.path.getsize(path), path))
+        total = sum(size for mtime, size, path in files)
+        for mtime, size, path in sorted(files):
+            if total <= self.max_bytes // 2:
+                break
+            os.remove(path)
+            total -= size
+        return self.max_bytes - total
+
+    def append(self, restart=True):
+        # the file ran out, parse from here on and add to the end of it
+        # (dropping a last result cut short when a run was stopped).
+        self.file.close()
+        self.file = None
+        self.reading = False
+        if restart:
+            self.hla.restart_decode()
+        self.table_ids = {table: index for index, table in enumerate(self.tables)}
+        self.budget = self.max_bytes - self.good_offset
+        file = open(self.path, 'r+b', buffering=0)
+        file.truncate(self.good_offset)
+        file.seek(self.good_offset)
+        self.file = file
+
+    def write(self, data):
+        self.file.write(data)
+        self.budget -= len(data)
+        if self.budget < 0:
+            # full, stop adding to it
+            self.file.close()
+            self.file = None
+
+    #--------------------------------------------------------------------------
+    # saving results
+    #--------------------------------------------------------------------------
+    def save(self, frame: AnalyzerFrame, result):
+        frames = result if type(result) is list else [result]
+        parts = []
+        encoded = [self.encode(one_frame, parts) for one_frame in frames]
+        parts.append(b'E' + self.s_entry.pack(self.byte_count, self.hash,
+                                              float(frame.end_time - self.time_ref), len(frames)))
+        data = b''.join(parts + encoded)
+        if self.file is None:
+            self.pending.append(data)
+        else:
+            try:
+                self.write(data)
+            except OSError as e:
+                if self.hla.log_errors:
+                    print(">> Decode cache:", e)
+                self.file = None
+
+    def encode(self, frame, parts):
+        # parts gets the definition of any table not in the file yet
+        start = float(frame.start_time - self.time_ref)
+        end = float(frame.end_time - self.time_ref)
+        if type(frame) is not PacketRecord:
+            data = json.dumps([frame.type, frame.data]).encode()
+            return self.s_frame.pack(self.FRAME, start, end, len(data)) + data
+        check = frame.check or (0, 0)
+        tables = frame.tables
+        head = self.s_record.pack(
+            self.RECORD if frame.check is None else self.RECORD_CHECK, start, end,
+            self.record_types.index(frame.type), frame.protocol, frame.servo_id, frame.cmd, check[0], check[1],
+            -1 if frame.reg is None else frame.reg, -1 if frame.reg_cnt is None else frame.reg_cnt,
+            frame.start, self.renders.index(getattr(frame.render, '__wrapped__', frame.render)),
+            self.parts.index(getattr(frame.parts, '__wrapped__', frame.parts)),
+            self.table_index(frame.table, parts), self.s_no_tables if tables is None else len(tables),
+            0 if frame.blocks is None else len(frame.blocks), len(frame.payload))
+        if tables:
+            head += struct.pack('<%dH' % len(tables), *[self.table_index(table, parts) for table in tables])
+        if frame.blocks:
+            head += struct.pack('<%dH' % (2 * len(frame.blocks)), *[n for block in frame.blocks for n in block])
+        return head + bytes(frame.payload)
+
+    def table_index(self, table, parts):
+        index = self.table_ids.get(table)
+        if index is None:
+            index = self.table_ids[table] = len(self.table_ids)
+            name = table.file_name.encode()
+            parts.append(b'T' + struct.pack('<H', len(name)) + name)
+        return index
+
+    #--------------------------------------------------------------------------
+    # replaying results
+    #--------------------------------------------------------------------------
+    def replay(self, frame: AnalyzerFrame):
+        count, entry_hash, end, frames = self.next_entry
+        if (entry_hash != self.hash) or (float(frame.end_time - self.time_ref) != end):
+            # not the capture the file was written from after all
+            if self.hla.log_errors:
+                print(">> Decode cache does not match the capture, parsing from here")
+            self.file.close()
+            self.file = None
+            self.reading = False
+            self.hla.restart_decode()
+            frames = []
+            for result in [self.hla.decode_char(char) for char in self.chars + [frame]]:
+                if type(result) is list:
+                    frames += result
+                elif result is not None:
+                    frames.append(result)
+            self.chars = None
+            if not frames:
+                return None
+            return frames if len(frames) > 1 else frames[0]
+        self.chars = []
+        self.next_entry = self.read_entry()
+        if self.next_entry is None:
+            try:
+                self.append()
+            except OSError as e:
+                if self.hla.log_errors:
+                    print(">> Decode cache:", e)
+                self.file = None
+        if not frames:
+            return []
+        return frames if len(frames) > 1 else frames[0]
+
+    def read_entry(self):
+        # (count, hash, end time, frames) of the next result, None at the end
+        # of the file or where a run stopped writing part way.
+        file = self.file
+        while True:
+            tag = file.read(1)
+            if tag == b'T':
+                size = file.read(2)
+                name = file.read(struct.unpack('<H', size)[0]) if len(size) == 2 else b''
+                if not name:
+                    return None
+                self.tables.append(control_tables.load(name.decode()))
+            elif tag == b'E':
+                head = file.read(self.s_entry.size)
+                if len(head) < self.s_entry.size:
+                    return None
+                count, entry_hash, end, frame_count = self.s_entry.unpack(head)
+                try:
+                    frames = [self.read_frame() for i in range(frame_count)]
+                except (struct.error, ValueError, IndexError):
+                    return None
+                self.good_offset = file.tell()
+                return (count, entry_hash, end, frames)
+            else:
+                return None
+
+    def read_frame(self):
+        file = self.file
+        kind = file.read(1)[0]
+        if kind == self.FRAME:
+            kind, start, end, size = self.s_frame.unpack(bytes([kind]) + file.read(self.s_frame.size - 1))
+            frame_type, data = json.loads(file.read(size).decode())
+            return AnalyzerFrame(frame_type, self.time(start), self.time(end), data)
+        (kind, start, end, type_index, protocol, servo_id, cmd, check0, check1, reg, reg_cnt, data_start,
+         render, parts, table, table_count, block_count, payload_len) = \
+            self.s_record.unpack(bytes([kind]) + file.read(self.s_record.size - 1))
+        tables = None
+        if table_count != self.s_no_tables:
+            tables = [self.tables[index] for index in
+                      struct.unpack('<%dH' % table_count, file.read(2 * table_count))]
+        blocks = None
+        if block_count:
+            values = struct.unpack('<%dH' % (2 * block_count), file.read(4 * block_count))
+            blocks = list(zip(values[::2], values[1::2]))
+        payload = file.read(payload_len)
+        if len(payload) < payload_len:
+            raise ValueError('cut short')
+        record = PacketRecord(self.record_types[type_index], self.time(start), self.time(end), protocol,
+                              servo_id, cmd, (check0, check1) if kind == self.RECORD_CHECK else None, payload,
+                              self.hla.base, self.tables[table], self.renders[render], self.parts[parts])
+        record.reg = None if reg < 0 else reg
+        record.reg_cnt = None if reg_cnt < 0 else reg_cnt
+        record.start = data_start
+        record.tables = tables
+        record.blocks = blocks
+        return record
 
 
 # High level analyzers must subclass the HighLevelAnalyzer class.
@@ -18,7 +1233,7 @@ class Hla(HighLevelAnalyzer):
     )
     ChooseServoTypes2 = ChoicesSetting(
         label='Protocol 2 Servo Type',
-        choices=('X Servos (default)', 'MX Servos')
+        choices=('X Servos (default)', 'MX Servos', 'XL320 Servos', 'P Servos (PRO+)')
     )
 
     ChooseServoController = ChoicesSetting(
@@ -29,6 +1244,72 @@ class Hla(HighLevelAnalyzer):
         label='Show Register Pairs as a word',
         choices=('yes', 'no')
     )
+    LogLevel = ChoicesSetting(
+        label='Console Log Level',
+        choices=('Errors (default)', 'Off', 'Packets', 'Bytes')
+    )
+    RegisterMirror = ChoicesSetting(
+        label='Register Mirror',
+        choices=('Off (default)', 'Current values', 'Current values and history')
+    )
+    ReplyLateUs = NumberSetting(
+        label='Reply late after DELAY (500us unless mirrored) + N us (0 = off)',
+        min_value=0,
+        max_value=1000000
+    )
+    BaudRate = NumberSetting(
+        label='Baud rate (0 = time the first characters)',
+        min_value=0,
+        max_value=10000000
+    )
+    PacketTimeoutUs = NumberSetting(
+        label='Packet timeout us (0 = 100 characters)',
+        min_value=0,
+        max_value=1000000
+    )
+    StatsWindowMs = NumberSetting(
+        label='Bus statistics every N ms (0 = off)',
+        min_value=0,
+        max_value=3600000
+    )
+    GroupWindowMs = NumberSetting(
+        label='Group repeated packets over N ms (0 = off)',
+        min_value=0,
+        max_value=3600000
+    )
+    GroupCount = NumberSetting(
+        label='Group at most N repeated packets (0 = no limit)',
+        min_value=0,
+        max_value=1000000
+    )
+    CacheDirectory = StringSetting(
+        label='Decode cache directory (empty = off)'
+    )
+    PeriodJitterUs = NumberSetting(
+        label='Flag command period jitter over N us (0 = off)',
+        min_value=0,
+        max_value=10000000
+    )
+    ExportDirectory = StringSetting(
+        label='Export register values as .npy files to (empty = off)'
+    )
+    FilterIds = StringSetting(
+        label='Show servo IDs, e.g. 1,3-5 (empty = all)'
+    )
+    FilterInstructions = StringSetting(
+        label='Show instructions, e.g. Read,SWrite,Reply (empty = all)'
+    )
+    FilterRegisters = StringSetting(
+        label='Show registers, e.g. 30-36 (empty = all)'
+    )
+    ProfileDecode = ChoicesSetting(
+        label='Profile decoding',
+        choices=('Off (default)', 'On')
+    )
+    ChangesOnly = ChoicesSetting(
+        label='Register values shown',
+        choices=('Every packet (default)', 'Only changes')
+    )
 
 
     #--------------------------------------------------------------------------
@@ -40,222 +1321,22 @@ class Hla(HighLevelAnalyzer):
         0x55:"Reply", 0x82:"SRead", 0x83:"SWrite", 0x8a:"FSRead", 
         0x92:"BulkRead", 0x93:"BulkWrite", 0x9A:"FBulkRead" }
 
-    s_result_errors = {
-        0:"", 1:"Result", 2:"Instruct", 3:"CRC", 4:"Range",
-        5:"Length", 6:"Limit", 7:"Access" }    
-
-    # AX Servos
-    s_ax_register_names = {
-        0:{"name":"MODEL","cb":2},
-        2:{"name":"VER","cb":1},
-        3:{"name":"ID","cb":1},
-        4:{"name":"BAUD","cb":1},
-        5:{"name":"DELAY","cb":1},
-        6:{"name":"CWL","cb":2},
-        8:{"name":"CCWL","cb":2},
-        11:{"name":"LTEMP","cb":1},
-        12:{"name":"LVOLTD","cb":1},
-        13:{"name":"LVOLTU","cb":1},
-        14:{"name":"MTORQUE","cb":2},
-        16:{"name":"RLEVEL","cb":1},
-        17:{"name":"ALED","cb":1},
-        18:{"name":"ASHUT","cb":1},
-        24:{"name":"TENABLE","cb":1},
-        25:{"name":"LED","cb":1},
-        26:{"name":"CWMAR","cb":1},
-        27:{"name":"CCWMAR","cb":1},
-        28:{"name":"CWSLOPE","cb":1},
-        29:{"name":"CCWSLOPE","cb":1},
-        30:{"name":"GOAL","cb":2},
-        32:{"name":"GSPEED","cb":2},
-        34:{"name":"TLIMIT","cb":2},
-        36:{"name":"PPOS","cb":2},
-        38:{"name":"PSPEED","cb":2},
-        40:{"name":"PLOAD","cb":2},
-        42:{"name":"PVOLT","cb":1},
-        43:{"name":"PTEMP","cb":1},
-        44:{"name":"RINST","cb":1},
-        46:{"name":"MOVING","cb":1},
-        47:{"name":"LOCK","cb":1},
-        48:{"name":"PUNCH","cb":2}
+    # Model number whose control table (see control_tables/) each servo type
+    # setting uses
+    s_servo_type_models = {
+        'AX Servos (default)': 12, 'MX Servos': 29, 'XL320 Servos': 350,
+        'X Servos': 1020, 'X Servos (default)': 1020, 'P Servos (PRO+)': 2020,
     }
 
-    # MX Servos
-    s_mx_register_names = {
-        0:{"name":"MODEL","cb":2},
-        2:{"name":"VER","cb":1},
-        3:{"name":"ID","cb":1},
-        4:{"name":"BAUD","cb":1},
-        5:{"name":"DELAY","cb":1},
-        6:{"name":"CWL","cb":2},
-        8:{"name":"CCWL","cb":2},
-        11:{"name":"LTEMP","cb":1},
-        12:{"name":"LVOLTD","cb":1},
-        13:{"name":"LVOLTU","cb":1},
-        14:{"name":"MTORQUE","cb":2},
-        16:{"name":"RLEVEL","cb":1},
-        17:{"name":"ALED","cb":1},
-        18:{"name":"ASHUT","cb":1},
-        20:{"name":"MTOFSET","cb":2},
-        22:{"name":"RESD","cb":1},
-
-        24:{"name":"TENABLE","cb":1},
-        25:{"name":"LED","cb":1},
-        26:{"name":"DGAIN","cb":1},
-        27:{"name":"IGAIN","cb":1},
-        28:{"name":"PGAIN","cb":1},
-        30:{"name":"GOAL","cb":2},
-        32:{"name":"GSPEED","cb":2},
-        34:{"name":"TLIMIT","cb":2},
-        36:{"name":"PPOS","cb":2},
-        38:{"name":"PSPEED","cb":2},
-        40:{"name":"PLOAD","cb":2},
-        42:{"name":"PVOLT","cb":1},
-        43:{"name":"PTEMP","cb":1},
-        44:{"name":"RINST","cb":1},
-        46:{"name":"MOVING","cb":1},
-        47:{"name":"LOCK","cb":1},
-        48:{"name":"PUNCH","cb":2},
-        50:{"name":"RTIXK","cb":2},
-        73:{"name":"gACCEL","cb":1}
-        }
+    s_cm730_model = 0x7300
 
-    # XL Servos
-    s_xl320_register_names = {
-        0:{"name":"MODEL","cb":2},
-        2:{"name":"VER","cb":1},
-        3:{"name":"ID","cb":1},
-        4:{"name":"BAUD","cb":1},
-        5:{"name":"DELAY","cb":1},
-        6:{"name":"CWL","cb":2},
-        8:{"name":"CCWL","cb":2},
-        11:{"name":"CMODE","cb":1},
-        12:{"name":"LTEMP","cb":1},
-        13:{"name":"LVOLTD","cb":1},
-        14:{"name":"LVOLTU","cb":1},
-        15:{"name":"MTORQUE","cb":2},
-        17:{"name":"RLEVEL","cb":1},
-        18:{"name":"ASHUT","cb":1},
-        24:{"name":"TENABLE","cb":1},
-        25:{"name":"LED","cb":1},
-        27:{"name":"DGAIN","cb":1},
-        28:{"name":"IGAIN","cb":1},
-        29:{"name":"PGAIN","cb":1},
-        30:{"name":"GOAL","cb":2},
-        32:{"name":"MSPEED","cb":2},
-        35:{"name":"TLIMIT","cb":2},
-        37:{"name":"PPOS","cb":2},
-        39:{"name":"PSPEED","cb":2},
-        41:{"name":"PLOAD","cb":2},
-        45:{"name":"PVOLT","cb":1},
-        46:{"name":"PTEMP","cb":1},
-        47:{"name":"RINST","cb":1},
-        49:{"name":"MOVING","cb":1},
-        50:{"name":"HSTAT","cb":1},
-        52:{"name":"PUNCH","cb":2}
-    }
- 
-    s_x_register_names = {
-        0:{"name":"MODE#", "cb":2},
-        2:{"name":"MODEL", "cb":4},
-        6:{"name":"VER", "cb":1},
-        7:{"name":"ID", "cb":1},
-        8:{"name":"BAUD", "cb":1},
-        9:{"name":"DELAY", "cb":1},
-        10:{"name":"DMODE", "cb":1},
-        11:{"name":"OMODE", "cb":1},
-        12:{"name":"S-ID", "cb":1},
-        13:{"name":"PROT", "cb":1},
-        20:{"name":"HOFF", "cb":4},
-        24:{"name":"MOVT", "cb":4},
-        31:{"name":"TLIMIT", "cb":1},
-        32:{"name":"VMAX", "cb":2},
-        34:{"name":"VMIN", "cb":2},
-        36:{"name":"PWML", "cb":2},
-        40:{"name":"ACCLL", "cb":4},
-        44:{"name":"VLMT", "cb":4},
-        48:{"name":"MXPOS", "cb":4},
-        52:{"name":"MNPOS", "cb":4},
-        60:{"name":"SCONFIG", "cb":1},
-        63:{"name":"SHUTDN", "cb":1},
-
-        64:{"name":"TENABLE", "cb":1},
-        65:{"name":"LED", "cb":1},
-        68:{"name":"RETL", "cb":1},
-        69:{"name":"RINST", "cb":1},
-        70:{"name":"HERR", "cb":1},
-        76:{"name":"VIGAIN", "cb":2},
-        78:{"name":"VPGAIN", "cb":2},
-        80:{"name":"POSDG", "cb":2},
-        82:{"name":"POSIG", "cb":2},
-        84:{"name":"POSPG", "cb":2},
-        88:{"name":"FF2G", "cb":2},
-        90:{"name":"FF1G", "cb":2},
-        98:{"name":"BWATCH", "cb":1},
-        100:{"name":"GPWM", "cb":2},
-        104:{"name":"GVEL", "cb":4},
-        108:{"name":"GACCL", "cb":4},
-        112:{"name":"PVEL", "cb":4},
-        116:{"name":"GOAL", "cb":4},
-        120:{"name":"RTICK", "cb":2},
-        122:{"name":"MOVING", "cb":1},
-        123:{"name":"MSTATUS", "cb":1},
-        124:{"name":"PPWM", "cb":2},
-        126:{"name":"PLOAD", "cb":2},
-        128:{"name":"PVEL", "cb":4},
-        132:{"name":"PPOS", "cb":4},
-        136:{"name":"VELT", "cb":4},
-        140:{"name":"POST", "cb":4},
-        144:{"name":"PVOLT", "cb":2},
-        146:{"name":"PTEMP" , "cb":1},
-        147:{"name":"BACKRDY" , "cb":1}
-    }
+    s_result_errors = {
+        0:"", 1:"Result", 2:"Instruct", 3:"CRC", 4:"Range",
+        5:"Length", 6:"Limit", 7:"Access" }    
 
-    #USB2AX - probably not needed as does not forward messages on normal AX BUSS
-    #CM730(ish) controllers. 
-    s_cm730_register_names = {
-        0:{"name":"MODEL", "cb":2},
-        2:{"name":"VER", "cb":1},
-        3:{"name":"ID", "cb":1},
-        4:{"name":"BAUD", "cb":1},
-        5:{"name":"DELAY", "cb":1},
-        12:{"name":"LVOLTD", "cb":1},
-        13:{"name":"LVOLTU", "cb":1},
-        16:{"name":"RLEVEL", "cb":1},
-        24:{"name":"POWER", "cb":1},
-        25:{"name":"LPANNEL", "cb":1},
-        26:{"name":"LHEAD", "cb":2},
-        28:{"name":"LEYE", "cb":2},
-        30:{"name":"BUTTON", "cb":1},
-        32:{"name":"D1", "cb":1},
-        33:{"name":"D2", "cb":1},
-        34:{"name":"D3", "cb":1},
-        35:{"name":"D4", "cb":1},
-        36:{"name":"D5", "cb":1},
-        37:{"name":"D6", "cb":1},
-        38:{"name":"GYROZ", "cb":2},
-        40:{"name":"GYROY", "cb":2},
-        42:{"name":"GYROX", "cb":2},
-        44:{"name":"ACCX", "cb":2},
-        46:{"name":"ACCY", "cb":2},
-        48:{"name":"ACCZ", "cb":2},
-        50:{"name":"ADC0", "cb":1},
-        51:{"name":"ADC1", "cb":2},
-        53:{"name":"ADC2", "cb":2},
-        55:{"name":"ADC3", "cb":2},
-        57:{"name":"ADC4", "cb":2},
-        59:{"name":"ADC5", "cb":2},
-        61:{"name":"ADC6", "cb":2},
-        63:{"name":"ADC7", "cb":2},
-        65:{"name":"ADC8", "cb":2},
-        67:{"name":"ADC9", "cb":2},
-        69:{"name":"ADC10", "cb":2},
-        71:{"name":"ADC11", "cb":2},
-        73:{"name":"ADC12", "cb":1},
-        75:{"name":"ADC13", "cb":1},
-        77:{"name":"ADC14", "cb":1},
-        79:{"name":"ADC15", "cb":1},
-    }
+    # Protocol 1 status packet error bits
+    s_p1_errors = ((0x01, "Volt"), (0x02, "Angle"), (0x04, "Temp"), (0x08, "Range"),
+                   (0x10, "Checksum"), (0x20, "Overload"), (0x40, "Instruct"))
 
     # An optional list of types this analyzer produces, providing a way to customize the way frames are displayed in Logic 2.
     result_types = {
@@ -275,8 +1356,63 @@ class Hla(HighLevelAnalyzer):
         'DXL ReplyDE': {'format': '{{data.cmd}} ID:{{data.id}} Err:{{data.err}} = {{data.data}}'},
         'DXL BulkW': { 'format': 'ID:{{data.id}} {{data.cmd}} {{data.data}}' },
         'DXL BulkR': { 'format': 'ID:{{data.id}} {{data.cmd}} {{data.data}}' },
-        'dxl ???': { 'format': 'ID:{{data.id}} {{data.cmd}} {{data.data}}' }
+        'dxl ???': { 'format': 'ID:{{data.id}} {{data.cmd}} {{data.data}}' },
+        'DXL Late': { 'format': 'Late ID:{{data.id}} {{data.latency}}us > {{data.expected}}us' },
+        'DXL NoReply': { 'format': 'No reply {{data.cmd}} ID:{{data.id}}' },
+        'DXL Stats': { 'format': 'Bus {{data.busy}} {{data.pkt_rate}} pkt/s {{data.byte_rate}} B/s {{data.mix}}' },
+        'DXL Group': { 'format': '{{data.kind}} x{{data.count}} ID:{{data.ids}} R:{{data.reg}} = {{data.last}}' },
+        'DXL Changes': { 'format': '{{data.cmd}} ID:{{data.id}} {{data.data}}' },
+        'DXL Jitter': { 'format': 'Jitter {{data.cmd}} ID:{{data.ids}} {{data.period}}us avg {{data.mean}}us' },
+        'DXL Period': { 'format': '{{data.cmd}} ID:{{data.ids}} R:{{data.reg}} x{{data.count}} '
+                                  '{{data.mean}}us sd {{data.std}} min {{data.min}} max {{data.max}}' }
+    }
+
+    # Frame types that may be folded into a DXL Group, anything else (errors,
+    # bad checksums, unknown commands, reset, reboot...) always shows up alone.
+    s_group_types = {'DXL Ping', 'DXL Action', 'DXL Write', 'DXL SWrite', 'DXL SRead', 'DXL FSRead',
+                     'DXL Read', 'DXL Reply', 'DXL ReplyD', 'DXL BulkW', 'DXL BulkR'}
+
+    # Longest believable Protocol 2 LENGTH field per instruction, a corrupt
+    # length bigger than this is dropped right away instead of swallowing
+    # up to 64K of good packets. Protocol 1 has no such table as the status
+    # packets carry the error bits where the instruction would be, and its
+    # one byte length can not run far anyway. Writes, SyncWrite, BulkWrite
+    # and status packets carry register data of any length (253 servos of up
+    # to 64K each), only the 16 bit field bounds them. The limit for unknown
+    # instructions is a guess.
+    s_max_p2_length = {
+        0x01: 3, 0x02: 7, 0x05: 3, 0x06: 4, 0x08: 3, 0x10: 8, 0x20: 8,
+        0x82: 7 + 253, 0x8a: 7 + 253, 0x92: 3 + 5 * 253, 0x9a: 3 + 5 * 253,
+        0x03: 0xffff, 0x04: 0xffff, 0x55: 0xffff, 0x83: 0xffff, 0x93: 0xffff,
     }
+    s_max_p2_length_other = 4096
+
+    # Settings that change what is decoded rather than how it is shown, a
+    # decode cache file is only used with the same values. The register
+    # mirror, reply timing and command periods turn the cache off.
+    s_cache_settings = ('ChooseServoTypes1', 'ChooseServoTypes2', 'ChooseServoController', 'BaudRate',
+                        'PacketTimeoutUs', 'StatsWindowMs', 'GroupWindowMs', 'GroupCount', 'FilterIds',
+                        'FilterInstructions', 'FilterRegisters', 'ChangesOnly')
+
+    # packet starts timed to find the character time without a Baud rate
+    s_char_samples = 4
+
+    # Reply latency histograms, fixed buckets with the last one for overflow
+    s_latency_bucket_us = 10
+    s_latency_buckets = 100
+
+    # Return Delay Time a servo ships with (2us units), taken for replies
+    # while the register mirror has not seen the real one
+    s_default_return_delay = 250
+
+    # Command periods: histogram of the distance from the mean period, the
+    # middle bucket is on time and the end ones take everything further
+    # out. Jitter is only flagged once a stream has s_period_warmup periods,
+    # a DXL Period summary goes out every s_period_summary periods.
+    s_jitter_bucket_us = 50
+    s_jitter_buckets = 41
+    s_period_warmup = 8
+    s_period_summary = 100
 
 
     #--------------------------------------------------------------------------
@@ -284,12 +1420,18 @@ class Hla(HighLevelAnalyzer):
     #--------------------------------------------------------------------------
     def __init__(self):
 
-        self.base = 0 # commands choose. 
+        self.base = 0 # Auto, each register's base comes from its control table
         if self.DisplayFormat == 'Hex':
             self.base = 16
         elif self.DisplayFormat == 'Dec':
             self.base = 10
 
+        # Each level includes the ones before it. Handlers test these flags
+        # before building any message, so disabled levels cost nothing.
+        self.log_errors = self.LogLevel != 'Off'
+        self.log_packets = self.LogLevel in ('Packets', 'Bytes')
+        self.log_bytes = self.LogLevel == 'Bytes'
+
         '''
         Initialize HLA.
         Settings can be accessed using the same name used above.
@@ -298,6 +1440,17 @@ class Hla(HighLevelAnalyzer):
         self.frame_second_time = None
         self.last_char_end_time = 0
         self.packet_timeout_char_count = 100
+        # The character time and packet timeout are worked out once, from the
+        # Baud rate (10 bits a character) or by timing the first characters,
+        # so the gap check per character is a single GraphTimeDelta compare.
+        self.packet_timeout_us = self.PacketTimeoutUs or 0
+        self.packet_timeout = GraphTimeDelta(second=0)
+        self.char_time = 0.0
+        self.char_samples = 0
+        if self.BaudRate:
+            self.set_char_time(10.0 / self.BaudRate)
+            self.char_samples = self.s_char_samples
+        self.byte_count = 0
         self.frame_end_time = None
         self.servo_id = None
         self.frame_protocol = 1
@@ -307,35 +1460,145 @@ class Hla(HighLevelAnalyzer):
         self.crcFirstByte = 0
         self.frame_cmd = None
         self.data_packet_save = None
+        self.data_index = 0
+        self.data_count = 0
         self.last_cmd = None
         self.last_cmd_reg = 999
         self.last_cmd_reg_cnt = None
         self.bulk_read_info = None;
+        self.p1_reply_ids = () # servos a Protocol 1 request asked to reply, in order
+        self.p1_request = None # (ID, instruction, parameters) of the last Protocol 1 request
         self.ServoNameTable = None
-        self.frame_state = '1stFF'
-        self.frame_data = {}
+        # indexed by protocol number
+        self.protocol_models = [None, self.s_servo_type_models.get(self.ChooseServoTypes1, 12),
+                                self.s_servo_type_models.get(self.ChooseServoTypes2, 1020)]
+        self.protocol_tables = [None, None, None]
+        # tables learned per servo ID, from Ping replies and MODEL reads
+        self.id_tables = [None, [None] * 256, [None] * 256]
+        if self.ChooseServoController == 'CM730ish(0xC8)':
+            self.id_tables[1][0xc8] = control_tables.for_model(self.s_cm730_model)
+        self.frame_state = STATE_1ST_FF
+        self.packet_ok = True
+        self.packet_check = None # (computed, read) when packet_ok is False
+        # characters of the packet being decoded starting with its first FF,
+        # rescanned for the next header when the packet turns out bad.
+        self.raw_frames = []
+
+        # Request/reply pairing. Requests that expect a reply mark the servo
+        # ID pending, the reply clears it and goes into the ID's histogram.
+        self.reply_late_us = int(self.ReplyLateUs or 0)
+        self.reply_pending = [None] * 256 # command waiting for a reply
+        self.pending_reply_ids = []
+        self.last_packet_end_time = None
+        self.latency_histograms = [None] * 256
+        self.latency_stats = [None] * 256 # [count, total us, min us, max us]
+
+        # Bus statistics, counted per packet and reported once per window
+        self.stats_window_s = (self.StatsWindowMs or 0) / 1000.0
+        self.stats_window = GraphTimeDelta(second=self.stats_window_s)
+        self.stats_window_start = None
+        self.stats_window_end = None
+        self.stats_start_byte = 0
+        self.stats_packets = 0
+        self.stats_errors = 0
+        self.stats_cmds = array('L', [0]) * 256
+
+        # Grouping of repeated packets, frame_ids collects the servo IDs of
+        # the packet while it is processed.
+        self.group_window_s = (self.GroupWindowMs or 0) / 1000.0
+        self.group_window = GraphTimeDelta(second=self.group_window_s)
+        self.group_count = int(self.GroupCount or 0)
+        self.grouping = bool(self.group_window_s or self.group_count)
+        self.groups = {}
+        self.group_window_end = None
+        self.frame_ids = None
+
+        # Periods of repeated requests, see track_period
+        self.period_jitter_us = float(self.PeriodJitterUs or 0)
+        self.period_streams = {}
+        self.period_gap_start = None # end of the last packet
+        self.collect_ids = self.grouping or bool(self.period_jitter_us)
+
+        # Image of each servo's registers, queried with register_value()
+        self.mirror = None
+        if self.RegisterMirror == 'Current values':
+            self.mirror = ServoRegisterMirror()
+        elif self.RegisterMirror == 'Current values and history':
+            self.mirror = ServoRegisterMirror(keep_history=True)
+
+        # Register values exported to .npy columns, see RegisterExport
+        self.export = None
+        if self.ExportDirectory:
+            self.export = RegisterExport(self.ExportDirectory)
+        # Only register changes, see changed_record
+        self.last_values = None
+        if self.ChangesOnly == 'Only changes':
+            self.last_values = LastValueCache()
+        self.value_changes = bytearray()
+        self.change_tables = []
+        # the handlers pass values on when any of them is on
+        self.track_values = (self.mirror is not None) or (self.export is not None) or (self.last_values is not None)
+
+        # Packet filters, checked on the header before any packet handler
+        # runs. Broadcasts always pass the ID filter.
+        self.show_ids = None
+        self.show_cmds = None
+        self.show_regs = None
+        if self.FilterIds:
+            self.show_ids = frozenset([servo_id for low, high in self.parse_ranges(self.FilterIds)
+                                       for servo_id in range(low, high + 1)] + [0xfe])
+        if self.FilterInstructions:
+            self.show_cmds = self.parse_instructions(self.FilterInstructions)
+        if self.FilterRegisters:
+            self.show_regs = self.parse_ranges(self.FilterRegisters)
+        self.filtering = (self.show_ids is not None) or (self.show_cmds is not None) or (self.show_regs is not None)
+
+        # Profiling swaps timed versions of decode_char, packet_record and the
+        # packet handlers in, leaving the methods alone when it is off
+        self.profiler = None
+        if self.ProfileDecode == 'On':
+            self.profiler = DecodeProfiler()
+            self.decode_char = self.profiler.wrap_states(self, self.decode_char)
+            self.packet_record = self.profiler.wrap_records(self.packet_record)
+
+        # decode_records is decode_char itself unless the decode cache is on
+        self.decode_records = self.decode_char
+        # Packets replayed from the cache never reach the register mirror,
+        # the register export (which starts its files over each run), the
+        # reply histograms or the command periods, so with any of them on
+        # everything is decoded.
+        self.decode_cache = None
+        if self.CacheDirectory and ((self.mirror is not None) or (self.export is not None) or self.reply_late_us
+                                    or self.period_jitter_us):
+            if self.log_errors:
+                print(">> Decode cache is not used with the register mirror, register export, reply timing "
+                      "or command periods")
+        elif self.CacheDirectory:
+            self.decode_cache = DecodeCache(self, self.CacheDirectory, self.cache_key())
+            self.decode_records = self.decode_cache.decode
 
         #--------------------------------------------------------------------------
         # Define dispatch tables for processing differnt packets.
         #--------------------------------------------------------------------------
-        self.decodeDispatch = {
-            '1stFF': self.decode1stFF,
-            '2ndFF': self.decode2ndFF,
-            'id': self.decocodeID,
-            'len1': self.decodeLen1,
+        # indexed by the STATE_ values
+        self.decodeDispatch = [
+            self.decode1stFF,
+            self.decode2ndFF,
+            self.decocodeID,
+            self.decodeLen1,
             # start Protocol 1 specific
-            'p1_inst': self.decodeP1_Inst,
-            'p1_data': self.decodeP1_data,
-            'p1_chksum': self.decodeP1_chksum,
+            self.decodeP1_Inst,
+            self.decodeP1_data,
+            self.decodeP1_chksum,
             # start Protocol 2 specific
-            'p2_id': self.decodeP2_ID,
-            'p2_len1': self.decodeP2_Len1,
-            'p2_len2': self.decodeP2_Len2,
-            'p2_inst': self.decodeP2_Inst,
-            'p2_data': self.decodeP2_data,
-            'p2_crc1': self.decodeP2_crc1,
-            'p2_crc2': self.decodeP2_crc2
-        }
+            self.decodeP2_ID,
+            self.decodeP2_Len1,
+            self.decodeP2_Len2,
+            self.decodeP2_Inst,
+            self.decodeP2_data,
+            self.decodeP2_crc1,
+            self.decodeP2_crc2
+        ]
 
         self.processP1Packets = {
             0: self.ProcessProt1_Response,
@@ -366,302 +1629,665 @@ class Hla(HighLevelAnalyzer):
             0x8A: self.ProcessProt2_FastSyncRead,
             0x92: self.ProcessProt2_BulkRead,
             0x93: self.ProcessProt2_BulkWrite,
-            #0x9A: self.ProcessProt2_FastBulkRead,
+            0x9A: self.ProcessProt2_FastBulkRead,
         }
 
-        print("Settings:", self.ChooseServoTypes1, self.ChooseServoTypes2,
-              self.ChooseRegisterPairs, self.ChooseServoController)
+        if self.profiler is not None:
+            self.processP1Packets = self.profiler.wrap_handlers('P1 ', self.processP1Packets)
+            self.processP2Packets = self.profiler.wrap_handlers('P2 ', self.processP2Packets)
+            # the catch all handlers are called outside the tables
+            self.ProcessProt1_unknown = self.profiler.wrap('P1 ProcessProt1_unknown', self.ProcessProt1_unknown)
+            self.ProcessProt2_unknown = self.profiler.wrap('P2 ProcessProt2_unknown', self.ProcessProt2_unknown)
+
+        if self.log_packets:
+            print("Settings:", self.ChooseServoTypes1, self.ChooseServoTypes2,
+                  self.ChooseRegisterPairs, self.ChooseServoController)
+
+    def restart_decode(self):
+        # Forget the traffic decoded so far, as if the capture started with
+        # the next character. Tables learned per ID and the register mirror
+        # stay, they still hold for the servos.
+        self.frame_state = STATE_1ST_FF
+        self.raw_frames = []
+        self.last_cmd = None
+        self.p1_reply_ids = ()
+        self.p1_request = None
+        self.reply_pending = [None] * 256
+        self.pending_reply_ids = []
+        self.last_packet_end_time = None
+        self.stats_window_end = None
+        self.stats_packets = 0
+        self.stats_errors = 0
+        self.stats_cmds = array('L', [0]) * 256
+        self.groups = {}
+        self.group_window_end = None
+        self.period_gap_start = None
+        for stream in self.period_streams.values():
+            stream.last_start = None
+        if self.last_values is not None:
+            self.last_values = LastValueCache()
+
+    def cache_key(self):
+        # Group frames hold formatted values, grouping makes the display
+        # format one of the settings the cache depends on
+        names = self.s_cache_settings + (('DisplayFormat',) if self.grouping else ())
+        return '|'.join(['%s=%s' % (name, getattr(self, name)) for name in names])
 
     def UpdateServoNamesTable(self): 
-        if self.frame_protocol == 1:
-            if self.ChooseServoTypes1 == 'MX Servos':
-               self.ServoNameTable = self.s_mx_register_names
-            elif self.ChooseServoTypes1 == 'XL320 Servos':
-                self.ServoNameTable = self.s_xl320_register_names
-            else:
-                self.ServoNameTable = self.s_ax_register_names
-        else:
-            if self.ChooseServoTypes2 == 'MX Servos':
-                self.ServoNameTable = self.s_mx_register_names
-            elif self.ChooseServoTypes2 == 'XL320 Servos':
-                self.ServoNameTable = s_xl320_register_names
-            else:
-                self.ServoNameTable = self.s_x_register_names
-
-    def generate_data_string(self, start_index, reg_count):
-        reg =  self.last_cmd_reg
+        self.ServoNameTable = self.servo_table(self.servo_id[0])
+
+    def servo_table(self, servo_id):
+        # The table learned for the ID, otherwise the one for the servo type
+        # setting, which is only looked up once a packet of that protocol
+        # shows up.
+        table = self.id_tables[self.frame_protocol][servo_id]
+        if table is None:
+            table = self.protocol_tables[self.frame_protocol]
+            if table is None:
+                table = control_tables.for_model(self.protocol_models[self.frame_protocol])
+                self.protocol_tables[self.frame_protocol] = table
+        return table
+
+    def learn_model_read(self, start):
+        # read reply data from start, MODEL is the word at register 0 in every table
+        if (self.last_cmd_reg == 0) and (len(self.data_packet_save) >= start + 2) and self.packet_ok:
+            self.learn_model(self.servo_id[0], int.from_bytes(self.data_packet_save[start:start + 2], 'little'))
+
+    def learn_model(self, servo_id, model):
+        # A Ping reply or MODEL read told us what the servo is. Models without
+        # a table keep the one from the settings.
+        table = control_tables.for_model(model)
+        if (table is not None) and (servo_id < 0xfe):
+            if self.id_tables[self.frame_protocol][servo_id] is not table:
+                if self.log_packets:
+                    print("  ID:", servo_id, " Model:", model, " Table:", table.name)
+                if self.mirror is not None:
+                    self.mirror.set_table(servo_id, table)
+            self.id_tables[self.frame_protocol][servo_id] = table
+
+    def mirror_update(self, servo_id, reg, start, count=None, direction=RegisterExport.READ):
+        # record parameter bytes of a good packet in the register mirror and
+        # the register export
+        if self.packet_ok:
+            if self.mirror is not None:
+                self.mirror.update(servo_id, self.servo_table(servo_id), reg, self.data_packet_save,
+                                   self.frame_start_time, start, count)
+            if self.export is not None:
+                self.export.add(self.frame_start_time, servo_id, self.servo_table(servo_id), reg,
+                                self.data_packet_save, start, count, direction)
+            if self.last_values is not None:
+                count = len(self.data_packet_save) - start if count is None else \
+                    min(count, len(self.data_packet_save) - start)
+                if count > 0:
+                    table = self.servo_table(servo_id)
+                    blocks = self.last_values.changes(self.frame_protocol, servo_id, table, reg,
+                                                      self.data_packet_save, start, count, self.value_changes)
+                    self.change_tables.extend([table] * blocks)
+
+    def mirror_sync_write(self, start_index, reg, cnt_per_servo):
+        # blocks of servo ID followed by cnt_per_servo bytes
+        data_len = len(self.data_packet_save)
         i = start_index
-        data_str = ''
-        if reg_count > 0:
-            reg_end = start_index + reg_count
-            if reg_end > len(self.data_packet_save):
-                reg_end = len(self.data_packet_save)
-        else:    
-            reg_end = len(self.data_packet_save)
-        while i < reg_end:
-            cb_reg = 1
-
-            if reg in self.ServoNameTable:
-                reg_info = self.ServoNameTable[reg]
-                #frame_data['reg'] = reg_info["name"]
-                cb_reg = reg_info["cb"]
-
-            if cb_reg > 1:
-                val = int.from_bytes(self.data_packet_save[i:i+cb_reg],'little')
-                if self.base == 16:
-                    data_str +=' ' + hex(val)
-                else:
-                    data_str +=' ' + str(val)
-            else:
-                if self.base == 10:
-                    data_str +=' ' + str(self.data_packet_save[i])
-                else:
-                    data_str +=' ' + hex(self.data_packet_save[i])
-            i += cb_reg
-            reg += cb_reg
-        return data_str
+        while i + 1 + cnt_per_servo <= data_len:
+            self.mirror_update(self.data_packet_save[i], reg, i + 1, cnt_per_servo, RegisterExport.WRITE)
+            i += 1 + cnt_per_servo
 
-    def generate_sw_data_string(self, start_index, cnt_per_servo):
+    def mirror_write(self, cmd, reg, start):
+        # Write lands right away, REG_WRITE waits for an Action
+        if not self.packet_ok:
+            return
+        if cmd == 4:
+            if self.mirror is not None:
+                self.mirror.hold(self.servo_id[0], self.ServoNameTable, reg, self.data_packet_save, start)
+            if self.export is not None:
+                # exported as sent
+                self.export.add(self.frame_start_time, self.servo_id[0], self.ServoNameTable, reg,
+                                self.data_packet_save, start, None, RegisterExport.WRITE)
+        else:
+            self.mirror_update(self.servo_id[0], reg, start, None, RegisterExport.WRITE)
+
+    def changed_record(self, frame, record):
+        # Only register changes: a good packet that wrote or read register
+        # values gives a DXL Changes record, laid out like a Bulk Write, of
+        # the registers that changed since they were last written or read.
+        # When none did it is an empty list, the packet shows nothing but
+        # the decode cache still keeps a result for it.
+        if (self.last_values is None) or (not self.packet_ok):
+            return record
+        if not self.change_tables:
+            return []
+        changes = self.packet_record("DXL Changes", frame, PacketRecord.render_bulk_write,
+                                     PacketRecord.parts_bulk_write)
+        changes.payload = bytes(self.value_changes)
+        changes.tables = self.change_tables
+        return changes
+
+    def close_export(self):
+        # end of an offline run, writes out the rows the export still holds
+        if self.export is not None:
+            self.export.close()
+
+    def register_value(self, servo_id, name, time=None):
+        # Value of a named register for a servo from the register mirror,
+        # the current one or the one at an analyzer frame time. None when the
+        # mirror is off or the register has not been seen yet.
+        if self.mirror is None:
+            return None
+        reg_cb = self.mirror.register(servo_id, name)
+        if reg_cb is None:
+            return None
+        if time is None:
+            return self.mirror.value(servo_id, reg_cb[0], reg_cb[1])
+        return self.mirror.value_at(servo_id, reg_cb[0], reg_cb[1], time)
+
+    def packet_record(self, frame_type, frame, render=None, parts=None):
+        # record of the packet just decoded, ending with frame
+        return PacketRecord(frame_type, self.frame_start_time, frame.end_time, self.frame_protocol,
+                            self.servo_id[0], self.frame_cmd[0], self.packet_check,
+                            self.data_packet_save, self.base, self.ServoNameTable, render, parts)
+
+    def log_record(self, record):
+        # only logging renders the strings of every packet
+        if self.log_packets:
+            data = record.data
+            fields = [label + data[key] for key, label in (('reg', '  Reg: '), ('cnt', '  Cnt: '), ('data', '  Data:'))
+                      if key in data]
+            print("DXL ", data['cmd'], " ID:", data['id'] + ''.join(fields))
+        return record
+
+    def sync_write_record(self, frame, start_index, reg, reg_cnt):
+        # blocks of servo ID followed by reg_cnt bytes from start_index
+        self.last_cmd_reg = reg
+        self.last_cmd_reg_cnt = reg_cnt
+        data = self.data_packet_save
+        tables = []
         i = start_index
-        data_str = ''
-        while i < len(self.data_packet_save):
-            #get the servo ID
-            if self.base == 10:
-                data_str +=' ' + str(self.data_packet_save[i]) + ':'
-            else:
-                data_str +=' ' + hex(self.data_packet_save[i]) + ':'
+        while i < len(data):
+            if self.frame_ids is not None:
+                self.frame_ids.append(data[i])
+            # mixed buses, each servo's values split by its own table
+            tables.append(self.servo_table(data[i]))
+            i += 1 + reg_cnt
+        if tables:
+            # broadcast, name the register from the first servo's table
+            self.ServoNameTable = tables[0]
+        if self.track_values:
+            self.mirror_sync_write(start_index, reg, reg_cnt)
+        record = self.packet_record("DXL SWrite", frame, PacketRecord.render_sync_write,
+                                    PacketRecord.parts_sync_write)
+        record.reg = reg
+        record.reg_cnt = reg_cnt
+        record.start = start_index
+        record.tables = tables
+        return self.changed_record(frame, self.log_record(record))
+
+    def bulk_read_record(self, frame):
+        # Bulk Read and Fast Bulk Read of both protocols, bulk_read_info
+        # keeps what each servo was asked for to decode the replies with
+        blocks = bulk_read_blocks(self.frame_protocol, self.data_packet_save)
+        self.bulk_read_info = {}
+        if blocks is None:
+            return self.packet_record("DXL Error", frame)
+        tables = []
+        for servo_id, reg, reg_cnt in blocks:
+            if self.frame_ids is not None:
+                self.frame_ids.append(servo_id)
+            tables.append(self.servo_table(servo_id))
+            self.bulk_read_info[servo_id] = {"reg":reg, "#":reg_cnt}
+            self.last_cmd_reg = reg
+            self.last_cmd_reg_cnt = reg_cnt
+        record = self.packet_record("DXL BulkR", frame, PacketRecord.render_bulk_read)
+        record.tables = tables
+        return self.log_record(record)
 
-            i += 1
-            servo_byte_index = 0
-            reg =  self.last_cmd_reg
-            while (i < len(self.data_packet_save)) and (servo_byte_index < cnt_per_servo):
-                cb_reg = 1
-
-                if reg in self.ServoNameTable:
-                    reg_info = self.ServoNameTable[reg]
-                    #frame_data['reg'] = reg_info["name"]
-                    cb_reg = reg_info["cb"]
-
-                if cb_reg > 1:
-                    val = int.from_bytes(self.data_packet_save[i:i+cb_reg],'little')
-                    if self.base == 16:
-                        data_str +=' ' + hex(val)
-                    else:
-                        data_str +=' ' + str(val)
-                else:
-                    if self.base == 10:
-                        data_str +=' ' + str(self.data_packet_save[i])
+    def profile_report(self):
+        # table of the decode profile so far, None while profiling is off
+        if self.profiler is None:
+            return None
+        return self.profiler.report()
+
+#================================================
+# Request/reply timing
+#================================================
+    def p1_pending_reply(self, servo_id, cmd):
+        # A packet whose error bits look like an instruction is the status
+        # packet a request asked for when it comes from a servo that was
+        # asked, holds as many parameters as the request wants back and is
+        # not that request sent again (a retry).
+        if servo_id not in self.p1_reply_ids:
+            return False
+        if self.last_cmd == 0x92:
+            bri = self.bulk_read_info.get(servo_id)
+            count = bri['#'] if bri is not None else None
+        elif self.last_cmd == 2:
+            count = self.last_cmd_reg_cnt
+        else:
+            count = 0
+        if len(self.data_packet_save) != count:
+            return False
+        return self.p1_request != (servo_id, cmd, self.data_packet_save)
+
+    def reply_expected_ids(self, cmd):
+        # IDs expected to answer the packet just decoded
+        servo_id = self.servo_id[0]
+        if cmd in (1, 2):
+            return (servo_id,) if servo_id != 0xfe else ()
+        if cmd == 0x92 and self.bulk_read_info:
+            return tuple(self.bulk_read_info)
+        if self.frame_protocol == 2:
+            if cmd == 0x82:
+                return self.data_packet_save[4:]
+            if cmd in (0x8a, 0x9a):
+                return (0xfe,) # one combined status packet
+        return ()
+
+    def track_reply_timing(self, frame, cmd, is_reply, new_frame):
+        frames = [new_frame]
+        servo_id = self.servo_id[0]
+        if is_reply:
+            if (self.reply_pending[servo_id] is not None) and (self.last_packet_end_time is not None):
+                self.reply_pending[servo_id] = None
+                self.pending_reply_ids.remove(servo_id)
+                latency = float(self.frame_start_time - self.last_packet_end_time) * 1e6
+                self.record_latency(servo_id, latency)
+                delay = self.register_value(servo_id, "DELAY")
+                if delay is None:
+                    delay = self.s_default_return_delay
+                expected = self.reply_late_us + 2 * delay # return delay is in 2us units
+                if (latency > expected) and (new_frame is not None):
+                    frames.insert(0, AnalyzerFrame("DXL Late", self.last_packet_end_time, self.frame_start_time,
+                        {'id': str(servo_id), 'latency': '%.1f' % latency, 'expected': str(expected)}))
+        elif self.packet_ok:
+            if self.pending_reply_ids:
+                # the controller moved on, whoever has not answered never will
+                missing = self.pending_reply_ids
+                frames.insert(0, AnalyzerFrame("DXL NoReply", self.last_packet_end_time, self.frame_start_time,
+                    {'id': ' '.join(str(i) for i in missing),
+                     'cmd': self.s_cmd_names.get(self.reply_pending[missing[0]], hex(self.reply_pending[missing[0]]))}))
+                for missing_id in missing:
+                    self.reply_pending[missing_id] = None
+                self.pending_reply_ids = []
+            for expected_id in self.reply_expected_ids(cmd):
+                if self.reply_pending[expected_id] is None:
+                    self.reply_pending[expected_id] = cmd
+                    self.pending_reply_ids.append(expected_id)
+        self.last_packet_end_time = frame.end_time
+        if len(frames) == 1:
+            return new_frame
+        if (new_frame is None) or (new_frame == []):
+            # left out by the packet filters or showing only changes
+            del frames[-1]
+        return frames
+
+    def record_latency(self, servo_id, latency):
+        histogram = self.latency_histograms[servo_id]
+        if histogram is None:
+            histogram = self.latency_histograms[servo_id] = array('L', [0]) * self.s_latency_buckets
+            self.latency_stats[servo_id] = [0, 0.0, latency, latency]
+        bucket = int(latency // self.s_latency_bucket_us)
+        if bucket >= self.s_latency_buckets:
+            bucket = self.s_latency_buckets - 1
+        elif bucket < 0:
+            bucket = 0
+        histogram[bucket] += 1
+        stats = self.latency_stats[servo_id]
+        stats[0] += 1
+        stats[1] += latency
+        if latency < stats[2]:
+            stats[2] = latency
+        if latency > stats[3]:
+            stats[3] = latency
+
+    def latency_report(self):
+        # one line per servo: count, min/avg/max and the non empty buckets
+        lines = []
+        width = self.s_latency_bucket_us
+        for servo_id, stats in enumerate(self.latency_stats):
+            if stats is None:
+                continue
+            count, total, low, high = stats
+            lines.append('ID %3d: %6d replies  min %.1fus  avg %.1fus  max %.1fus'
+                         % (servo_id, count, low, total / count, high))
+            histogram = self.latency_histograms[servo_id]
+            buckets = ['%d-%dus:%d' % (i * width, (i + 1) * width, n) for i, n in enumerate(histogram) if n]
+            if histogram[-1]:
+                buckets[-1] = '>=%dus:%d' % ((len(histogram) - 1) * width, histogram[-1])
+            lines.append('        ' + ' '.join(buckets))
+        return '\n'.join(lines)
+
+#================================================
+# Command periods
+#================================================
+    def track_period(self, frame, cmd, is_reply, new_frame):
+        # Time between good requests of the same kind. A period further from
+        # the stream's mean than the limit gets a DXL Jitter frame, and every
+        # s_period_summary periods a DXL Period frame sums the stream up.
+        # Both go in the gap before the packet.
+        gap_start = self.period_gap_start
+        self.period_gap_start = frame.end_time
+        if is_reply or (not self.packet_ok):
+            return new_frame
+        reg_cnt = self.packet_registers(cmd, False)
+        reg = reg_cnt[0] if reg_cnt is not None else None
+        key = (self.frame_protocol, cmd, reg, self.servo_id[0], tuple(self.frame_ids))
+        stream = self.period_streams.get(key)
+        if stream is None:
+            ids = ','.join([str(servo_id) for servo_id in self.frame_ids]) or str(self.servo_id[0])
+            self.period_streams[key] = CommandStream(self.s_cmd_names.get(cmd, hex(cmd)),
+                                                     self.ServoNameTable.reg_name(reg) if reg is not None else '',
+                                                     ids, self.frame_start_time, self.s_jitter_buckets)
+            return new_frame
+        if stream.last_start is None:
+            stream.last_start = self.frame_start_time
+            return new_frame
+        period = float(self.frame_start_time - stream.last_start) * 1e6
+        stream.last_start = self.frame_start_time
+        warmed_up = stream.count >= self.s_period_warmup
+        deviation = stream.add(period)
+        if stream.count > 1:
+            # the first period has no mean to be off from
+            bucket = self.s_jitter_buckets // 2 + int(round(deviation / self.s_jitter_bucket_us))
+            stream.histogram[min(max(bucket, 0), self.s_jitter_buckets - 1)] += 1
+        info = None
+        if warmed_up and abs(deviation) > self.period_jitter_us:
+            stream.over += 1
+            info = AnalyzerFrame("DXL Jitter", gap_start or self.frame_start_time, self.frame_start_time, {
+                'cmd': stream.cmd, 'ids': stream.ids, 'reg': stream.reg, 'period': '%.1f' % period,
+                'mean': '%.1f' % (period - deviation),
+                'deviation': '%.1f' % deviation})
+        elif stream.since_summary >= self.s_period_summary:
+            stream.since_summary = 0
+            info = AnalyzerFrame("DXL Period", gap_start or self.frame_start_time, self.frame_start_time,
+                                 stream.summary())
+        if info is None:
+            return new_frame
+        if new_frame is None:
+            return info
+        if isinstance(new_frame, list):
+            # reply timing frames are in the same gap
+            return [info] + new_frame
+        return [info, new_frame]
+
+    def period_report(self):
+        # one line per stream seen more than once: periods, mean, sd, min/max,
+        # count past the jitter limit and the non empty histogram buckets
+        lines = []
+        width = self.s_jitter_bucket_us
+        half = self.s_jitter_buckets // 2
+        for stream in self.period_streams.values():
+            if not stream.count:
+                continue
+            lines.append('%s ID:%s R:%s  %d periods  avg %.1fus  sd %.1fus  min %.1fus  max %.1fus  %d over %gus'
+                         % (stream.cmd, stream.ids, stream.reg, stream.count, stream.mean, stream.std(),
+                            stream.low, stream.high, stream.over, self.period_jitter_us))
+            buckets = []
+            for i, n in enumerate(stream.histogram):
+                if n:
+                    offset = (i - half) * width
+                    if i == 0:
+                        buckets.append('<=%+dus:%d' % (offset, n))
+                    elif i == self.s_jitter_buckets - 1:
+                        buckets.append('>=%+dus:%d' % (offset, n))
                     else:
-                        data_str +=' ' + hex(self.data_packet_save[i])
-                i += cb_reg
-                reg += cb_reg
-                servo_byte_index += cb_reg
-        return data_str
+                        buckets.append('%+dus:%d' % (offset, n))
+            lines.append('        ' + ' '.join(buckets))
+        return '\n'.join(lines)
+
+#================================================
+# Bus statistics
+#================================================
+    def count_packet(self, cmd):
+        if self.stats_window_end is None:
+            self.stats_window_start = self.frame_start_time
+            self.stats_window_end = self.frame_start_time + self.stats_window
+            self.stats_start_byte = self.byte_count - self.frame_length - (7 if self.frame_protocol == 2 else 4)
+        self.stats_packets += 1
+        self.stats_cmds[cmd] += 1
+        if not self.packet_ok:
+            self.stats_errors += 1
+
+    def close_stats_window(self, frame: AnalyzerFrame):
+        # The summary frame sits in the idle gap where the window closed, the
+        # current character already belongs to the next window.
+        window_s = self.stats_window_s
+        byte_count = self.byte_count - 1 - self.stats_start_byte
+        mix = {}
+        for cmd, count in enumerate(self.stats_cmds):
+            if count:
+                name = self.s_cmd_names.get(cmd, hex(cmd))
+                mix[name] = mix.get(name, 0) + count
+        stats_frame = AnalyzerFrame("DXL Stats", self.last_char_end_time, frame.start_time, {
+            'busy': '%.1f%%' % (100.0 * byte_count * self.char_time / window_s),
+            'pkt_rate': '%.0f' % (self.stats_packets / window_s),
+            'byte_rate': '%.0f' % (byte_count / window_s),
+            'errors': str(self.stats_errors),
+            'mix': ' '.join('%s:%d' % (name, count) for name, count in mix.items())})
+
+        # next window, skipping over any that had no traffic at all
+        start = self.stats_window_end
+        skip = int(float(frame.start_time - start) / window_s)
+        if skip:
+            start = start + GraphTimeDelta(second=skip * window_s)
+        self.stats_window_start = start
+        self.stats_window_end = start + self.stats_window
+        self.stats_start_byte = self.byte_count - 1
+        self.stats_packets = 0
+        self.stats_errors = 0
+        self.stats_cmds = array('L', [0]) * 256
+        return stats_frame
+
+#================================================
+# Grouping of repeated packets
+#================================================
+    def group_frames(self, cmd, is_reply, new_frame):
+        # Fold the frames of a good packet into the group of packets of the
+        # same kind, flushing all open groups first when the window is over
+        # or a frame that has to show on its own comes along. A group that
+        # reaches the count closes on its own.
+        if new_frame is None:
+            return None
+        frames = new_frame if isinstance(new_frame, list) else [new_frame]
+        out = []
+        if (self.group_window_end is not None) and (self.frame_start_time >= self.group_window_end):
+            out = self.flush_groups()
+        for one_frame in frames:
+            if (not self.packet_ok) or (one_frame.type not in self.s_group_types):
+                if self.groups:
+                    out += self.flush_groups()
+                out.append(one_frame)
+                continue
+            # replies are told apart by what was asked for
+            reg = one_frame.reg
+            values = one_frame.values()
+            key = (one_frame.type, self.frame_protocol, self.last_cmd if is_reply else cmd,
+                   self.servo_id[0], reg, len(values), tuple(self.frame_ids))
+            group = self.groups.get(key)
+            if group is None:
+                if (not self.groups) and self.group_window_s:
+                    self.group_window_end = self.frame_start_time + self.group_window
+                if reg is not None:
+                    reg = one_frame.table.reg_name(reg)
+                group = self.groups[key] = PacketGroup(one_frame, values, self.frame_ids, reg)
+            else:
+                group.add(one_frame, values)
+            if group.count == self.group_count:
+                out.append(self.flush_group(key))
+        if not out:
+            return None
+        return out if len(out) > 1 else out[0]
+
+    def end_capture(self):
+        # End of an offline run, the frames still held back: the groups left
+        # open. None when there are none.
+        if not self.groups:
+            return None
+        frames = self.flush_groups()
+        return frames if len(frames) > 1 else frames[0]
+
+    def flush_group(self, key):
+        # the last open group closing ends the window, the next packet starts one
+        group = self.groups.pop(key)
+        if not self.groups:
+            self.group_window_end = None
+        return group.frame(self.base)
+
+    def flush_groups(self):
+        # one frame per group, in the order they started
+        groups = self.groups.values()
+        self.groups = {}
+        self.group_window_end = None
+        return [group.frame(self.base) for group in groups]
 
 #================================================
 # dispatch Process Protocol 1 Messages 
 #================================================
     def ProcessProt1_unknown(self, frame: AnalyzerFrame, cmd):
-        data_str = ''
-        for i in range(len(self.data_packet_save)):
-            if self.base == 10:
-                data_str +=' ' + str(self.data_packet_save[i])
-            else:
-                data_str +=' ' + hex(self.data_packet_save[i])
-        self.frame_data['data'] = data_str
-        return AnalyzerFrame("dxl ???", self.frame_start_time, frame.end_time, self.frame_data)
+        return self.log_record(self.packet_record("dxl ???", frame, PacketRecord.render_bytes))
 
 
     def ProcessProt1_Response(self, frame: AnalyzerFrame, cmd):
-        err_str = ''
-        if cmd == 0:
-            self.frame_data['err'] = ''
-        else:
-            if (err & 0x01) != 0:
-                err_str += 'Volt '
-            if (err & 0x02) != 0:
-                err_str += 'Angle '
-            if (err & 0x04) != 0:
-                err_str += 'Temp '
-            if (err & 0x08) != 0:
-                err_str += 'Range '
-            if (err & 0x010) != 0:
-                err_str += 'Checksum '
-            if (err & 0x020) != 0:
-                err_str += 'Overload '
-            if (err & 0x040) != 0:
-                err_str += 'Checksum '
-            self.frame_data['err'] = 'Alert'
+        # cmd holds the error bits, rendered by PacketRecord.p1_reply_error
+        if (self.last_cmd == 0x92) and self.bulk_read_info and (self.servo_id[0] in self.bulk_read_info):
+            # each servo of a bulk read replies on its own
+            bri = self.bulk_read_info[self.servo_id[0]]
+            self.last_cmd_reg = bri['reg']
+            self.last_cmd_reg_cnt = bri['#']
+        if self.last_cmd in (2, 0x92):
+            if self.track_values:
+                self.mirror_update(self.servo_id[0], self.last_cmd_reg, 0)
+            self.learn_model_read(0)
         if (len(self.data_packet_save) == 0):
-            if err_str == '':
-                print("  DXL Reply ID:", self.frame_data['id'])
-                new_frame = AnalyzerFrame("DXL Reply", self.frame_start_time, frame.end_time, self.frame_data)
-            else:
-                print("  DXL Reply ID:", self.frame_data['id'], " Err:", self.frame_data['err'])
-                new_frame = AnalyzerFrame("DXL ReplyE", self.frame_start_time, frame.end_time, self.frame_data)
+            frame_type = "DXL Reply" if cmd == 0 else "DXL ReplyE"
         else:
-            data_str = self.generate_data_string(0, -1)
-            self.frame_data['data'] = data_str
-            if err_str == '':
-                print("  DXL Reply ID:", self.frame_data['id'], " Data:", data_str)
-                new_frame = AnalyzerFrame("DXL ReplyD", self.frame_start_time, frame.end_time, self.frame_data)
-            else:    
-                print("  DXL Reply ID:", self.frame_data['id'], " Err:", self.frame_data['err'], " Data:", data_str)
-                new_frame = AnalyzerFrame("DXL ReplyDE", self.frame_start_time, frame.end_time, self.frame_data)
-        return new_frame
+            frame_type = "DXL ReplyD" if cmd == 0 else "DXL ReplyDE"
+        record = self.packet_record(frame_type, frame, PacketRecord.render_reply, PacketRecord.parts_data)
+        record.reg = self.last_cmd_reg
+        if self.log_packets:
+            data = record.data
+            print("  DXL Reply ID:", data['id'], " Err:", data['err'], " Data:", data.get('data', ''))
+        if (frame_type == "DXL ReplyD") and (self.last_cmd in (2, 0x92)):
+            return self.changed_record(frame, record)
+        return record
 
     def ProcessProt1_Ping(self, frame: AnalyzerFrame, cmd):
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id']) 
-        return AnalyzerFrame("DXL Ping", self.frame_start_time, frame.end_time, self.frame_data)
+        return self.log_record(self.packet_record("DXL Ping", frame))
 
     def ProcessProt1_Read(self, frame: AnalyzerFrame, cmd):
         if len(self.data_packet_save) < 2:
-            return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
+            return self.packet_record("DXL Error", frame)
 
-        reg = self.data_packet_save[0]
-        reg_cnt = self.data_packet_save[1]
-        self.last_cmd_reg = reg
-        self.last_cmd_reg_cnt = reg_cnt
-        if reg in self.ServoNameTable:
-            reg_info = self.ServoNameTable[reg]
-            self.frame_data['reg'] = reg_info["name"]
-            cb = reg_info["cb"]
-        else:                 
-            self.frame_data['reg'] = hex(reg)
-
-        self.frame_data['cnt'] = hex(reg_cnt)    
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id'], " Reg:", self.frame_data['reg'], 
-            " Cnt:", self.frame_data['cnt'])
-        return AnalyzerFrame("DXL Read", self.frame_start_time, frame.end_time, self.frame_data)
+        record = self.packet_record("DXL Read", frame, PacketRecord.render_read)
+        record.reg = self.last_cmd_reg = self.data_packet_save[0]
+        record.reg_cnt = self.last_cmd_reg_cnt = self.data_packet_save[1]
+        return self.log_record(record)
 
     def ProcessProt1_Write(self, frame: AnalyzerFrame, cmd):
         # simple write/reg swrite
         if len(self.data_packet_save) < 1:
-            return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
+            return self.packet_record("DXL Error", frame)
         reg = self.data_packet_save[0]
         data_index = 1
+        if self.track_values:
+            self.mirror_write(cmd, reg, data_index)
 
-        if reg in self.ServoNameTable:
-            reg_info = self.ServoNameTable[reg]
-            self.frame_data['reg'] = reg_info["name"]
-            cb = reg_info["cb"]
-        else:                 
-            self.frame_data['reg'] = hex(reg)
-        #still want to split into chunks    
-        data_str = ''
-        for i in range(data_index,len(self.data_packet_save)):
-            if self.base == 10:
-                data_str +=' ' + str(self.data_packet_save[i])
-            else:
-                data_str +=' ' + hex(self.data_packet_save[i])
-        self.frame_data['data'] = data_str
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id'], " Reg:", self.frame_data['reg'], 
-            " Data:", data_str)
-        return AnalyzerFrame("DXL Write", self.frame_start_time, frame.end_time, self.frame_data)
+        record = self.packet_record("DXL Write", frame, PacketRecord.render_write)
+        record.reg = reg
+        record.start = data_index
+        if cmd == 4:
+            return self.log_record(record)
+        return self.changed_record(frame, self.log_record(record))
 
     def ProcessProt1_RegWrite(self, frame: AnalyzerFrame, cmd):
         return self.ProcessProt1_Write(frame, cmd)
 
     def ProcessProt1_Action(self, frame: AnalyzerFrame, cmd):
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id']) 
-        return AnalyzerFrame("DXL Action", self.frame_start_time, frame.end_time, self.frame_data)
+        if (self.mirror is not None) and self.packet_ok:
+            self.mirror.action(self.servo_id[0], self.frame_start_time)
+        return self.log_record(self.packet_record("DXL Action", frame))
 
     def ProcessProt1_FactoryReset(self, frame: AnalyzerFrame, cmd):
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id']) 
-        return AnalyzerFrame("DXL Reset", self.frame_start_time, frame.end_time, self.frame_data)
+        return self.log_record(self.packet_record("DXL Reset", frame))
 
     def ProcessProt1_Reboot(self, frame: AnalyzerFrame, cmd):
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id']) 
-        return AnalyzerFrame("DXL Reboot", self.frame_start_time, frame.end_time, self.frame_data)
+        return self.log_record(self.packet_record("DXL Reboot", frame))
 
     def ProcessProt1_SyncWrite(self, frame: AnalyzerFrame, cmd):
         if len(self.data_packet_save) < 2:
-            return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
-        reg = self.data_packet_save[0]
-        reg_cnt = self.data_packet_save[1]
-        self.last_cmd_reg = reg
-        self.last_cmd_reg_cnt = reg_cnt
-
-        if reg in self.ServoNameTable:
-            reg_info = self.ServoNameTable[reg]
-            self.frame_data['reg'] = reg_info["name"]
-        else:                 
-            self.frame_data['reg'] = hex(reg)
-        self.frame_data['cnt'] = hex(reg_cnt)    
-        data_str = self.generate_sw_data_string(2, reg_cnt)
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id'], " Reg:", self.frame_data['reg'], 
-            " Cnt:", self.frame_data['cnt'])
-        print("\tData: ", data_str)
-        self.frame_data['data'] = data_str
-        return AnalyzerFrame("DXL SWrite", self.frame_start_time, frame.end_time, self.frame_data)
+            return self.packet_record("DXL Error", frame)
+        return self.sync_write_record(frame, 2, self.data_packet_save[0], self.data_packet_save[1])
 
     def ProcessProt1_BulkRead(self, frame: AnalyzerFrame, cmd):
-        return self.ProcessProt1_unknown(frame, cmd)
+        return self.bulk_read_record(frame)
 #================================================
 # dispatch Process Protocol 2 Messages 
 #================================================
     def ProcessProt2_unknown(self, frame: AnalyzerFrame, cmd):
-        data_str = ''
-        for i in range(len(self.data_packet_save)):
-            if self.base == 10:
-                data_str +=' ' + str(self.data_packet_save[i])
-            else:
-                data_str +=' ' + hex(self.data_packet_save[i])
-        self.frame_data['data'] = data_str
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id']) 
-        return AnalyzerFrame("dxl ???", self.frame_start_time, frame.end_time, self.frame_data)
+        return self.log_record(self.packet_record("dxl ???", frame, PacketRecord.render_bytes))
 
     def ProcessProt2_Response(self, frame: AnalyzerFrame, cmd):
         #reply
         if len(self.data_packet_save) < 1:
-            return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
+            return self.packet_record("DXL Error", frame)
         err = self.data_packet_save[0]
-        if (err & 0x80) != 0:
-            self.frame_data['err'] = 'Alert'
-        elif err in self.s_result_errors:
-            self.frame_data['err'] = self.s_result_errors[err]
-        else:    
-            self.frame_data['err'] = self.data_packet_save[0]
+        render = PacketRecord.render_reply
+        parts = PacketRecord.parts_data
+        tables = None
+        blocks = None
 
         #special case Ping commands
-        data_str = ''
         if (self.last_cmd == 1) and (len(self.data_packet_save) >= 4):
             # returns 2 bytes model# and 1 byte firmware version
-            model_num = int.from_bytes(self.data_packet_save[1:3],'little')
-            firmware_ver = self.data_packet_save[3]
-            if self.base == 10:
-                data_str = 'model:' + str(model_num) + ' Ver:' + str(firmware_ver)
-            else:
-                data_str = 'model:' + hex(model_num) + ' Ver:' + hex(firmware_ver)
+            render = PacketRecord.render_ping_reply
+            parts = None
+            if self.packet_ok:
+                self.learn_model(self.servo_id[0], int.from_bytes(self.data_packet_save[1:3], 'little'))
+            if self.track_values:
+                self.mirror_update(self.servo_id[0], 0, 1, 2)
+                ver = self.ServoNameTable.registers.get("VER")
+                if ver is not None:
+                    self.mirror_update(self.servo_id[0], ver[0], 3, 1)
         elif self.last_cmd == 0x8a:
-            # Fast Sync Read
+            # Fast Sync Read, err, id, data and a CRC for each servo
+            parts = PacketRecord.parts_fast_sync_reply
+            tables = []
             param_index = 0
             data_len = len(self.data_packet_save)
-            print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id'], " Reg:")
-            data_str = ''
-            #print("$$$ DL:", str(data_len), " pc:", str(self.last_cmd_reg_cnt))
             while param_index < data_len:
                 # make sure we have enough bytes to get the initial data for servo
-                #print("$$$ PI:", str(param_index))
                 if (data_len - param_index) < (2 + self.last_cmd_reg_cnt):
-                    return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
-                err = self.data_packet_save[param_index]
-                err_str = ''
-                if err:
-                    err_str = ' err: '
-                    if (err & 0x80) != 0:
-                        error_str += 'Alert'
-                    elif err in self.s_result_errors:
-                        error_str += self.s_result_errors[err]
-                    else:    
-                        error_str += hex(err)
-
+                    return self.packet_record("DXL Error", frame, PacketRecord.render_reply_error)
                 servo_id = self.data_packet_save[param_index+1]
-                servo_data_str = self.generate_data_string(param_index+2, self.last_cmd_reg_cnt)
+                if self.frame_ids is not None:
+                    self.frame_ids.append(servo_id)
+                tables.append(self.servo_table(servo_id))
+                if self.track_values:
+                    self.mirror_update(servo_id, self.last_cmd_reg, param_index+2, self.last_cmd_reg_cnt)
                 param_index += (4 + self.last_cmd_reg_cnt) # we used up those bytes
 
-                print("\tID:", str(servo_id)," Data: ", servo_data_str, err_str)
-                data_str += ' ' + str(servo_id) + ':' + servo_data_str + err_str
+        elif self.last_cmd == 0x9a:
+            # Fast Bulk Read, laid out like Fast Sync Read with the register
+            # and count each servo was asked for
+            parts = PacketRecord.parts_fast_bulk_reply
+            tables = []
+            blocks = []
+            data = self.data_packet_save
+            param_index = 0
+            data_len = len(data)
+            while param_index < data_len:
+                # make sure we have the err and id, then the data that servo was asked for
+                if (data_len - param_index) < 2:
+                    return self.packet_record("DXL Error", frame, PacketRecord.render_reply_error)
+                servo_id = data[param_index+1]
+                bri = self.bulk_read_info.get(servo_id)
+                if (bri is None) or ((data_len - param_index) < (2 + bri['#'])):
+                    return self.packet_record("DXL Error", frame, PacketRecord.render_reply_error)
+                if self.frame_ids is not None:
+                    self.frame_ids.append(servo_id)
+                tables.append(self.servo_table(servo_id))
+                blocks.append((bri['reg'], bri['#']))
+                if self.track_values:
+                    self.mirror_update(servo_id, bri['reg'], param_index+2, bri['#'])
+                param_index += (4 + bri['#'])
 
         elif self.last_cmd == 0x92:
             # bulk read response
@@ -669,205 +2295,128 @@ class Hla(HighLevelAnalyzer):
                 bri = self.bulk_read_info[self.servo_id[0]]
                 self.last_cmd_reg = bri['reg']
                 self.last_cmd_reg_cnt = bri['#']
-            data_str = self.generate_data_string(1, -1)                    
+            if self.track_values:
+                self.mirror_update(self.servo_id[0], self.last_cmd_reg, 1)
+            self.learn_model_read(1)
         else:
-            data_str = self.generate_data_string(1, -1)
-        
-        self.frame_data['data'] = data_str
-        if (data_str == ''):
-            if err == 0:
-                print("  DXL Reply ID:", self.frame_data['id'])
-                new_frame = AnalyzerFrame("DXL Reply", self.frame_start_time, frame.end_time, self.frame_data)
-            else:
-                print("  DXL Reply ID:", self.frame_data['id'], " Err:", self.frame_data['err'])
-                new_frame = AnalyzerFrame("DXL ReplyE", self.frame_start_time, frame.end_time, self.frame_data)
+            if self.track_values and (self.last_cmd in (2, 0x82)):
+                self.mirror_update(self.servo_id[0], self.last_cmd_reg, 1)
+            if self.last_cmd in (2, 0x82):
+                self.learn_model_read(1)
+
+        # every kind of reply has data once there is more than the error byte
+        if len(self.data_packet_save) == 1:
+            frame_type = "DXL Reply" if err == 0 else "DXL ReplyE"
         else:
-            if err == 0:
-                print("  DXL Reply ID:", self.frame_data['id'], " Data:", data_str)
-                new_frame = AnalyzerFrame("DXL ReplyD", self.frame_start_time, frame.end_time, self.frame_data)
-            else:    
-                print("  DXL Reply ID:", self.frame_data['id'], " Err:", self.frame_data['err'], " Data:", data_str)
-                new_frame = AnalyzerFrame("DXL ReplyDE", self.frame_start_time, frame.end_time, self.frame_data)
-        return new_frame
+            frame_type = "DXL ReplyD" if err == 0 else "DXL ReplyDE"
+        record = self.packet_record(frame_type, frame, render, parts)
+        record.reg = self.last_cmd_reg
+        record.reg_cnt = self.last_cmd_reg_cnt
+        record.start = 1
+        record.tables = tables
+        record.blocks = blocks
+        if self.log_packets:
+            data = record.data
+            print("  DXL Reply ID:", data['id'], " Err:", data['err'], " Data:", data['data'])
+        if (frame_type == "DXL ReplyD") and (self.last_cmd in (2, 0x82, 0x8a, 0x92, 0x9a)):
+            return self.changed_record(frame, record)
+        return record
 
     def ProcessProt2_Ping(self, frame: AnalyzerFrame, cmd):
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id']) 
-        return AnalyzerFrame("DXL Ping", self.frame_start_time, frame.end_time, self.frame_data)
+        return self.log_record(self.packet_record("DXL Ping", frame))
 
     def ProcessProt2_Read(self, frame: AnalyzerFrame, cmd):
         if len(self.data_packet_save) < 4:
-            return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
-        reg = int.from_bytes(self.data_packet_save[:2],'little')
-        reg_cnt = int.from_bytes(self.data_packet_save[2:4],'little')
-        self.last_cmd_reg = reg
-        self.last_cmd_reg_cnt = reg_cnt
-        if reg in self.ServoNameTable:
-            reg_info = self.ServoNameTable[reg]
-            self.frame_data['reg'] = reg_info["name"]
-            cb = reg_info["cb"]
-        else:                 
-            self.frame_data['reg'] = hex(reg)
-
-        self.frame_data['cnt'] = hex(reg_cnt)    
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id'], " Reg:", self.frame_data['reg'], 
-            " Cnt:", self.frame_data['cnt'])
-        return AnalyzerFrame("DXL Read", self.frame_start_time, frame.end_time, self.frame_data)
+            return self.packet_record("DXL Error", frame)
+        record = self.packet_record("DXL Read", frame, PacketRecord.render_read)
+        record.reg = self.last_cmd_reg = int.from_bytes(self.data_packet_save[:2],'little')
+        record.reg_cnt = self.last_cmd_reg_cnt = int.from_bytes(self.data_packet_save[2:4],'little')
+        return self.log_record(record)
 
     def ProcessProt2_Write(self, frame: AnalyzerFrame, cmd):
         # simple write/reg swrite
         if len(self.data_packet_save) < 2:
-            return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
+            return self.packet_record("DXL Error", frame)
         reg = int.from_bytes(self.data_packet_save[:2],'little')
         data_index = 2
+        if self.track_values:
+            self.mirror_write(cmd, reg, data_index)
 
-        if reg in self.ServoNameTable:
-            reg_info = self.ServoNameTable[reg]
-            self.frame_data['reg'] = reg_info["name"]
-            cb = reg_info["cb"]
-        else:                 
-            self.frame_data['reg'] = hex(reg)
-        #still want to split into chunks    
-        data_str = ''
-        for i in range(data_index,len(self.data_packet_save)):
-            if self.base == 10:
-                data_str +=' ' + str(self.data_packet_save[i])
-            else:
-                data_str +=' ' + hex(self.data_packet_save[i])
-        self.frame_data['data'] = data_str
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id'], " Reg:", self.frame_data['reg'], 
-            " Data:", data_str)
-        return AnalyzerFrame("DXL Write", self.frame_start_time, frame.end_time, self.frame_data)
+        record = self.packet_record("DXL Write", frame, PacketRecord.render_write)
+        record.reg = reg
+        record.start = data_index
+        if cmd == 4:
+            return self.log_record(record)
+        return self.changed_record(frame, self.log_record(record))
 
     def ProcessProt2_RegWrite(self, frame: AnalyzerFrame, cmd):
         return self.ProcessProt2_Write(frame, cmd)
 
     def ProcessProt2_Action(self, frame: AnalyzerFrame, cmd):
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id']) 
-        return AnalyzerFrame("DXL Action", self.frame_start_time, frame.end_time, self.frame_data)
+        if (self.mirror is not None) and self.packet_ok:
+            self.mirror.action(self.servo_id[0], self.frame_start_time)
+        return self.log_record(self.packet_record("DXL Action", frame))
 
     def ProcessProt2_FactoryReset(self, frame: AnalyzerFrame, cmd):
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id']) 
-        return AnalyzerFrame("DXL Reset", self.frame_start_time, frame.end_time, self.frame_data)
+        return self.log_record(self.packet_record("DXL Reset", frame))
 
     def ProcessProt2_Reboot(self, frame: AnalyzerFrame, cmd):
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id']) 
-        return AnalyzerFrame("DXL Reboot", self.frame_start_time, frame.end_time, self.frame_data)
+        return self.log_record(self.packet_record("DXL Reboot", frame))
 
     def ProcessProt2_SyncWrite(self, frame: AnalyzerFrame, cmd):
         if len(self.data_packet_save) < 4:
-            return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
-        reg = int.from_bytes(self.data_packet_save[:2],'little')
-        reg_cnt = int.from_bytes(self.data_packet_save[2:4],'little')
-        self.last_cmd_reg = reg
-        self.last_cmd_reg_cnt = reg_cnt
-
-        if reg in self.ServoNameTable:
-            reg_info = self.ServoNameTable[reg]
-            self.frame_data['reg'] = reg_info["name"]
-        else:                 
-            self.frame_data['reg'] = hex(reg)
-        self.frame_data['cnt'] = hex(reg_cnt)    
-        data_str = self.generate_sw_data_string(4, reg_cnt)
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id'], " Reg:", self.frame_data['reg'], 
-            " Cnt:", self.frame_data['cnt'])
-        print("\tData: ", data_str)
-        self.frame_data['data'] = data_str
-        return AnalyzerFrame("DXL SWrite", self.frame_start_time, frame.end_time, self.frame_data)
+            return self.packet_record("DXL Error", frame)
+        return self.sync_write_record(frame, 4, int.from_bytes(self.data_packet_save[:2],'little'),
+                                      int.from_bytes(self.data_packet_save[2:4],'little'))
 
     def ProcessProt2_SyncRead(self, frame: AnalyzerFrame, cmd):
-        if len(self.data_packet_save) < 4:
-            return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
-        reg = int.from_bytes(self.data_packet_save[:2],'little')
-        reg_cnt = int.from_bytes(self.data_packet_save[2:4],'little')
-        self.last_cmd_reg = reg
-        self.last_cmd_reg_cnt = reg_cnt
-
-        if reg in self.ServoNameTable:
-            reg_info = self.ServoNameTable[reg]
-            self.frame_data['reg'] = reg_info["name"]
-        else:                 
-            self.frame_data['reg'] = hex(reg)
-        self.frame_data['cnt'] = hex(reg_cnt)    
-        data_str = ''
-        if len(self.data_packet_save) > 4:
-            data_str = 'IDs:'
-            for i in range(4, len(self.data_packet_save)):
-                if self.base == 10:
-                    data_str +=' ' + str(self.data_packet_save[i])
-                else:
-                    data_str +=' ' + hex(self.data_packet_save[i])
-        self.frame_data['data'] = data_str
         # handle both sync read and fast sync read
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id'], " Reg:", self.frame_data['reg'], 
-            " Cnt:", self.frame_data['cnt'], data_str)
-        if cmd == 0x82:
-            return AnalyzerFrame("DXL SRead", self.frame_start_time, frame.end_time, self.frame_data)
-        else:    
-            return AnalyzerFrame("DXL FSRead", self.frame_start_time, frame.end_time, self.frame_data)
+        if len(self.data_packet_save) < 4:
+            return self.packet_record("DXL Error", frame)
+        record = self.packet_record("DXL SRead" if cmd == 0x82 else "DXL FSRead", frame,
+                                    PacketRecord.render_sync_read)
+        record.reg = self.last_cmd_reg = int.from_bytes(self.data_packet_save[:2],'little')
+        record.reg_cnt = self.last_cmd_reg_cnt = int.from_bytes(self.data_packet_save[2:4],'little')
+        if self.frame_ids is not None:
+            self.frame_ids.extend(self.data_packet_save[4:])
+        return self.log_record(record)
 
 
     def ProcessProt2_FastSyncRead(self, frame: AnalyzerFrame, cmd):
         return self.ProcessProt2_SyncRead(frame, cmd)
 
     def ProcessProt2_BulkRead(self, frame: AnalyzerFrame, cmd):
-        param_index = 0
-        data_len = len(self.data_packet_save)
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id'], " Reg:")
-        complete_data_str = ''
-        self.bulk_read_info = {}
-        while param_index < data_len:
-            # make sure we have enough bytes to get the initial data for servo
-            if (data_len - param_index) < 5:
-                return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
-            servo_id = self.data_packet_save[param_index]
-            reg = int.from_bytes(self.data_packet_save[param_index+1:param_index+3],'little')
-            reg_cnt = int.from_bytes(self.data_packet_save[param_index+3:param_index+5],'little')
-            self.last_cmd_reg = reg
-            self.last_cmd_reg_cnt = reg_cnt
-            param_index += 5 # we used up those bytes
+        return self.bulk_read_record(frame)
 
-            if reg in self.ServoNameTable:
-                reg_info = self.ServoNameTable[reg]
-                reg_str = reg_info["name"]
-            else:                 
-                reg_str = hex(reg)
-
-            print("\tID:", str(servo_id),' Reg:',reg_str, " Cnt: ",str(reg_cnt))
-            complete_data_str += ' ' + str(servo_id) + '(' + reg_str + ', ' + str(reg_cnt) + '):'
-            self.bulk_read_info[servo_id] = {"reg":reg, "#":reg_cnt}
-        self.frame_data['data'] = complete_data_str
-        return AnalyzerFrame("DXL BulkR", self.frame_start_time, frame.end_time, self.frame_data)
+    def ProcessProt2_FastBulkRead(self, frame: AnalyzerFrame, cmd):
+        return self.bulk_read_record(frame)
 
     def ProcessProt2_BulkWrite(self, frame: AnalyzerFrame, cmd):
         param_index = 0
         data_len = len(self.data_packet_save)
-        print("DXL ", self.frame_data['cmd'], " ID:", self.frame_data['id'], " Reg:")
-        complete_data_str = ''
+        tables = []
         while param_index < data_len:
             # make sure we have enough bytes to get the initial data for servo
             if (data_len - param_index) < 5:
-                return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
+                return self.packet_record("DXL Error", frame)
             servo_id = self.data_packet_save[param_index]
+            if self.frame_ids is not None:
+                self.frame_ids.append(servo_id)
             reg = int.from_bytes(self.data_packet_save[param_index+1:param_index+3],'little')
             reg_cnt = int.from_bytes(self.data_packet_save[param_index+3:param_index+5],'little')
             self.last_cmd_reg = reg
             self.last_cmd_reg_cnt = reg_cnt
             param_index += 5 # we used up those bytes
             if (data_len - param_index) < reg_cnt:
-                return AnalyzerFrame("DXL Error", self.frame_start_time, frame.end_time, self.frame_data)
-
-            if reg in self.ServoNameTable:
-                reg_info = self.ServoNameTable[reg]
-                reg_str = reg_info["name"]
-            else:                 
-                reg_str = hex(reg)
-            data_str = self.generate_data_string(param_index, reg_cnt)
-    
-            print("\tID:", str(servo_id),' Reg:',reg_str, " Data: ",data_str)
-            complete_data_str += ' ' + str(servo_id) + '(' + reg_str + '):' + data_str
+                return self.packet_record("DXL Error", frame)
+            tables.append(self.servo_table(servo_id))
+            if self.track_values:
+                self.mirror_update(servo_id, reg, param_index, reg_cnt, RegisterExport.WRITE)
             param_index += reg_cnt
-        self.frame_data['data'] = complete_data_str
-        return AnalyzerFrame("DXL BulkW", self.frame_start_time, frame.end_time, self.frame_data)
+        record = self.packet_record("DXL BulkW", frame, PacketRecord.render_bulk_write,
+                                    PacketRecord.parts_bulk_write)
+        record.tables = tables
+        return self.changed_record(frame, self.log_record(record))
 
 
     def ProcessProt2_Clear(self, frame: AnalyzerFrame, cmd):
@@ -876,24 +2425,155 @@ class Hla(HighLevelAnalyzer):
     def ProcessProt2_Backup(self, frame: AnalyzerFrame, cmd):
         return self.ProcessProt2_unknown(frame, cmd)
 
+#================================================
+# Packet filters
+#================================================
+    def parse_ranges(self, text):
+        # '1,3-5,0x10' -> [(1, 1), (3, 5), (16, 16)]
+        ranges = []
+        for item in text.replace(' ', '').split(','):
+            if item:
+                low, _, high = item.partition('-')
+                low = int(low, 0)
+                ranges.append((low, int(high, 0) if high else low))
+        return ranges
+
+    def parse_instructions(self, text):
+        # names as shown in the cmd field (Reply matches both protocols) or numbers
+        names = {}
+        for cmd, name in self.s_cmd_names.items():
+            names.setdefault(name.lower(), []).append(cmd)
+        cmds = []
+        for item in text.replace(' ', '').split(','):
+            if item.lower() in names:
+                cmds += names[item.lower()]
+            elif item:
+                try:
+                    cmds.append(int(item, 0))
+                except ValueError:
+                    raise ValueError('Unknown instruction in filter: ' + item)
+        return frozenset(cmds)
+
+    def packet_shown(self, cmd, is_reply):
+        if (self.show_ids is not None) and (self.servo_id[0] not in self.show_ids):
+            return False
+        if (self.show_cmds is not None) and (cmd not in self.show_cmds):
+            return False
+        if self.show_regs is not None:
+            # packets without a register are left to the other filters
+            reg_cnt = self.packet_registers(cmd, is_reply)
+            if reg_cnt is not None:
+                low = reg_cnt[0]
+                high = low + max(reg_cnt[1], 1) - 1
+                for show_low, show_high in self.show_regs:
+                    if (low <= show_high) and (high >= show_low):
+                        return True
+                return False
+        return True
+
+    def packet_registers(self, cmd, is_reply):
+        # (reg, count) a request touches or a reply answers, None for the
+        # ones with no single register range (Ping, Action, bulk requests...)
+        if is_reply:
+            if (self.last_cmd == 0x92) and self.bulk_read_info and (self.servo_id[0] in self.bulk_read_info):
+                bri = self.bulk_read_info[self.servo_id[0]]
+                return (bri['reg'], bri['#'])
+            if self.last_cmd in (2, 0x82, 0x8a, 0x92):
+                return (self.last_cmd_reg, self.last_cmd_reg_cnt)
+            return None
+        data = self.data_packet_save
+        width = self.frame_protocol # bytes in the reg and count fields
+        if (cmd in (2, 0x82, 0x83, 0x8a)) and (len(data) >= 2 * width):
+            return (int.from_bytes(data[:width], 'little'), int.from_bytes(data[width:2 * width], 'little'))
+        if (cmd in (3, 4)) and (len(data) >= width):
+            return (int.from_bytes(data[:width], 'little'), len(data) - width)
+        return None
+
+    def filtered_packet(self, cmd, is_reply):
+        # Nothing is shown, only what the replies after the packet are
+        # decoded with is kept (last_cmd is set by the caller)
+        if is_reply:
+            return None
+        if cmd in (2, 0x82, 0x8a):
+            reg_cnt = self.packet_registers(cmd, False)
+            if reg_cnt is not None:
+                self.last_cmd_reg, self.last_cmd_reg_cnt = reg_cnt
+        elif (cmd == 0x92) or ((cmd == 0x9a) and (self.frame_protocol == 2)):
+            self.bulk_read_info = {}
+            for servo_id, reg, reg_cnt in bulk_read_blocks(self.frame_protocol, self.data_packet_save) or ():
+                self.bulk_read_info[servo_id] = {"reg":reg, "#":reg_cnt}
+                self.last_cmd_reg = reg
+                self.last_cmd_reg_cnt = reg_cnt
+        return None
+
+#================================================
+# Resynchronize after a bad packet
+#================================================
+    def resync_index(self):
+        # Where the next header could start in the characters of the bad
+        # packet, past its own first FF. A lone FF at the end may still be
+        # the start of one.
+        raw = bytes([raw_frame.data['data'][0] for raw_frame in self.raw_frames])
+        index = raw.find(b'\xff\xff', 1)
+        if index < 0:
+            index = len(raw) - 1 if raw.endswith(b'\xff') else len(raw)
+        return max(index, 1)
+
+    def resync(self, index, new_frame, frame=None):
+        # Run the characters from index on through decode again, they may hold
+        # good packets the bad one swallowed. Frames come back in time order
+        # after whatever the bad packet produced. frame is the character that
+        # ended a packet by timeout, it was not added to the packet.
+        replay = self.raw_frames[index:]
+        if frame is not None:
+            replay.append(frame)
+        self.last_char_end_time = self.raw_frames[index - 1].end_time
+        self.raw_frames = []
+        self.frame_state = STATE_1ST_FF
+        self.byte_count -= len(replay)
+        frames = []
+        for result in [new_frame] + [self.decode_char(raw_frame) for raw_frame in replay]:
+            if isinstance(result, list):
+                frames += result
+            elif result is not None:
+                frames.append(result)
+        if not frames:
+            return None
+        return frames if len(frames) > 1 else frames[0]
+
 #================================================
 # dispatch decode functions 
 #================================================
     def decode1stFF(self, frame: AnalyzerFrame, ch):
         if ch == b'\xff':
             self.frame_start_time = frame.start_time
-            self.frame_state = '2ndFF'
-            self.crc = 0
+            self.frame_state = STATE_2ND_FF
+            self.raw_frames = [frame]
             self.crcFirstByte = 0
-            self.update_crc(ch)
+            if self.char_samples < self.s_char_samples:
+                self.time_character(frame)
+
+    def time_character(self, frame: AnalyzerFrame):
+        # No Baud rate given, the shortest of the first few packet starts
+        # gives the character time.
+        char_time = float(frame.end_time - frame.start_time)
+        if (self.char_samples == 0) or (char_time < self.char_time):
+            self.set_char_time(char_time)
+        self.char_samples += 1
+
+    def set_char_time(self, char_time):
+        self.char_time = char_time
+        if self.packet_timeout_us:
+            self.packet_timeout = GraphTimeDelta(microsecond=self.packet_timeout_us)
+        else:
+            self.packet_timeout = GraphTimeDelta(second=self.packet_timeout_char_count * char_time)
 
     def decode2ndFF(self, frame: AnalyzerFrame, ch):
         if ch == b'\xff':
-            self.update_crc(ch)
             self.frame_second_time = frame.start_time
-            self.frame_state = 'id'
+            self.frame_state = STATE_ID
         else:
-            self.frame_state = '1stFF' # not a packet                
+            self.frame_state = STATE_1ST_FF # not a packet                
 
     def decocodeID(self, frame: AnalyzerFrame, ch):
         if ch == b'\xff': # can not be 3 in a row...
@@ -901,135 +2581,231 @@ class Hla(HighLevelAnalyzer):
             self.frame_second_time = frame.start_time
         else:
             self.servo_id = ch
-            self.frame_state = 'len1'                 
+            self.frame_state = STATE_LEN1
             self.checksum = ch[0]
-            self.update_crc(ch)
 
     def decodeLen1(self, frame: AnalyzerFrame, ch):
         self.checksum += ch[0]
         if (ch == b'\x00') and (self.servo_id == b'\xfd'):
             self.frame_protocol = 2
-            self.frame_state = 'p2_id'
-            self.update_crc(ch)
+            self.frame_state = STATE_P2_ID
         else:
             self.frame_protocol = 1
             self.frame_length = ch[0]
-            self.frame_state = 'p1_inst'
+            self.frame_state = STATE_P1_INST
 
     def decodeP1_Inst(self, frame: AnalyzerFrame, ch):
         self.frame_cmd = ch
-        self.data_packet_save = bytearray()
         self.checksum += ch[0]
+        self.start_data(self.frame_length - 2)
         if self.frame_length == 2:
-            self.frame_state = 'p1_chksum' # There is no data...
+            self.frame_state = STATE_P1_CHKSUM # There is no data...
+        elif self.frame_length < 2:
+            # not a valid length
+            if self.log_errors:
+                print(">> Bad length:", self.frame_length)
+            return self.resync(self.resync_index(), None)
         else:    
-            self.frame_state = 'p1_data' # now for the data
+            self.frame_state = STATE_P1_DATA # now for the data
 
+    def start_data(self, count):
+        # the parameter bytes go into a buffer sized up front, decode fills
+        # it in directly without going through decodeDispatch.
+        self.data_packet_save = bytearray(max(count, 0))
+        self.data_index = 0
+        self.data_count = count
+        self.stuffed_at = None
 
     def decodeP1_data(self, frame: AnalyzerFrame, ch):
-        self.data_packet_save.extend(ch)
-        self.checksum += ch[0]
-        if ((len(self.data_packet_save)) == (self.frame_length - 2)):
-            self.frame_state = 'p1_chksum'
+        self.data_packet_save[self.data_index] = ch[0]
+        self.data_index += 1
+        if self.data_index == self.data_count:
+            self.frame_state = STATE_P1_CHKSUM
 
     def decodeP1_chksum(self, frame: AnalyzerFrame, ch):
         # completed protocol 1
-        self.frame_state = '1stFF'
+        self.frame_state = STATE_1ST_FF
         new_frame = None
         
         self.UpdateServoNamesTable()
         cmd = self.frame_cmd[0]
-        self.frame_data = {}
-        self.frame_data['id'] = str(self.servo_id[0])
-        self.frame_data['protocol'] = '1'
+        servo_id = self.servo_id[0]
+        # Status packets carry error bits where the instruction goes. Bits
+        # that are no instruction are a reply, ones that look like one only
+        # when the servo was just asked to reply (see p1_pending_reply).
+        # Replies go to the handler for 0 with the error bits as cmd.
+        is_reply = (cmd == 0) or ((cmd < 0x80) and ((cmd not in self.processP1Packets)
+                                                    or self.p1_pending_reply(servo_id, cmd)))
+        handler_cmd = 0 if is_reply else cmd
+        if self.collect_ids:
+            self.frame_ids = []
+        if self.last_values is not None:
+            self.value_changes = bytearray()
+            self.change_tables = []
 
         # check for checksum errors
+        self.checksum += sum(self.data_packet_save)
         computed_checksum = (~(self.checksum & 0xff)) & 0xff
-        if computed_checksum != ch[0]:
-            print(">> Checksum error Computed:", hex(computed_checksum), " Read:", hex(ch[0]))
-            self.frame_data["chksum"] = hex(computed_checksum) + "!=" + hex(ch[0])
-
-        if cmd in self.s_cmd_names:
-            self.frame_data['cmd'] = self.s_cmd_names[cmd]
-        else:
-            self.frame_data['cmd'] = ''.join([ '0x', hex(cmd).upper()[2:] ])
-
-        if cmd in self.processP1Packets:
-            new_frame = self.processP1Packets[cmd](frame, cmd)
+        self.packet_ok = computed_checksum == ch[0]
+        self.packet_check = None
+        resync = None
+        if not self.packet_ok:
+            if self.log_errors:
+                print(">> Checksum error Computed:", hex(computed_checksum), " Read:", hex(ch[0]))
+            self.packet_check = (computed_checksum, ch[0])
+            # the bad packet's frame stops short of any header found inside it
+            resync = self.resync_index()
+            if resync < len(self.raw_frames):
+                frame = self.raw_frames[resync - 1]
+
+        if self.filtering and self.packet_ok and not self.packet_shown(handler_cmd, is_reply):
+            new_frame = self.filtered_packet(handler_cmd, is_reply)
+        elif handler_cmd in self.processP1Packets:
+            new_frame = self.processP1Packets[handler_cmd](frame, cmd)
         else:
              new_frame = self.ProcessProt1_unknown(frame, cmd)
 
-        if cmd != 0:
+        if self.reply_late_us:
+            new_frame = self.track_reply_timing(frame, handler_cmd, is_reply, new_frame)
+        if self.period_jitter_us:
+            new_frame = self.track_period(frame, handler_cmd, is_reply, new_frame)
+        if self.stats_window_s:
+            self.count_packet(handler_cmd)
+        if self.grouping:
+            new_frame = self.group_frames(handler_cmd, is_reply, new_frame)
+
+        if is_reply:
+            if servo_id in self.p1_reply_ids:
+                # bulk read replies come in the order asked for
+                self.p1_reply_ids = self.p1_reply_ids[self.p1_reply_ids.index(servo_id) + 1:]
+        else:
             self.last_cmd = cmd
+            self.p1_reply_ids = self.reply_expected_ids(cmd) if self.packet_ok else ()
+            self.p1_request = (servo_id, cmd, self.data_packet_save)
+        if resync is not None:
+            return self.resync(resync, new_frame)
         return new_frame
     #
     # Protocol 2
     #
     def decodeP2_ID(self, frame: AnalyzerFrame, ch):
         self.servo_id = ch
-        self.frame_state = 'p2_len1'                 
-        self.update_crc(ch)
+        self.frame_state = STATE_P2_LEN1
 
     def decodeP2_Len1(self, frame: AnalyzerFrame, ch):
         self.frame_length = ch[0]
-        self.frame_state = 'p2_len2'
-        self.update_crc(ch)
+        self.frame_state = STATE_P2_LEN2
 
     def decodeP2_Len2(self, frame: AnalyzerFrame, ch):
         self.frame_length += ch[0] * 256
-        self.frame_state = 'p2_inst'
-        self.update_crc(ch)
+        self.frame_state = STATE_P2_INST
 
     def decodeP2_Inst(self, frame: AnalyzerFrame, ch):
         self.frame_cmd = ch
         if self.frame_length == 3:
-            self.frame_state = 'p2_crc1' # There is no data...
+            self.frame_state = STATE_P2_CRC1 # There is no data...
+        elif (self.frame_length < 3) or \
+                (self.frame_length > self.s_max_p2_length.get(ch[0], self.s_max_p2_length_other)):
+            # not a valid length for this instruction
+            if self.log_errors:
+                print(">> Bad length:", self.frame_length, " Inst:", hex(ch[0]))
+            return self.resync(self.resync_index(), None)
         else:    
-            self.frame_state = 'p2_data' # now for the data
-        self.data_packet_save = bytearray()
-        self.update_crc(ch)
+            self.frame_state = STATE_P2_DATA # now for the data
+        self.start_data(self.frame_length - 3)
 
     def decodeP2_data(self, frame: AnalyzerFrame, ch):
-        self.data_packet_save.extend(ch)
-        if ((len(self.data_packet_save)) == (self.frame_length - 3)):
-            self.frame_state = 'p2_crc1'
-        self.update_crc(ch)
+        index = self.data_index
+        if (ch[0] == 0xfd) and self.is_stuffing(index):
+            self.drop_stuffing(index)
+        else:
+            self.data_packet_save[index] = ch[0]
+            self.data_index = index + 1
+        if self.data_index == self.data_count:
+            self.frame_state = STATE_P2_CRC1
+
+    def is_stuffing(self, index):
+        # An FD following FF FF FD was added by the sender so the parameters
+        # never look like a header. The check is against the bytes already
+        # kept, so the FD right after a dropped one is real data.
+        data = self.data_packet_save
+        return (index >= 3) and (data[index - 1] == 0xfd) and (data[index - 2] == 0xff) and \
+            (data[index - 3] == 0xff) and ((self.stuffed_at is None) or (self.stuffed_at[-1] != index))
+
+    def drop_stuffing(self, index):
+        # LENGTH counted the stuffing byte, the buffer is trimmed at the CRC
+        if self.stuffed_at is None:
+            self.stuffed_at = []
+        self.stuffed_at.append(index)
+        self.data_count -= 1
 
     def decodeP2_crc1(self, frame: AnalyzerFrame, ch):
         self.crcFirstByte = ch[0]
-        self.frame_state = 'p2_crc2'
+        self.frame_state = STATE_P2_CRC2
 
     def decodeP2_crc2(self, frame: AnalyzerFrame, ch):
         # completed protocol 2
-        self.frame_state = '1stFF'
+        self.frame_state = STATE_1ST_FF
         #now lets try to dispatch the processing here
                 # use dispatch table to run the decoding of the packets.
         new_frame = None
         self.UpdateServoNamesTable()
         cmd = self.frame_cmd[0]
-        self.frame_data = {}
-
-        read_crc = ((ch[0] << 8) | self.crcFirstByte) & 0xffff
-        if self.crc != read_crc:           
-            print(">> CRC error Computed:", hex(self.crc), " Read:", hex(read_crc))
-            self.frame_data["crc"] = hex(self.crc) + "!=" + hex(read_crc)
-
-        self.frame_data['id'] = str(self.servo_id[0])
-        self.frame_data['protocol'] = '2'
-
-        if cmd in self.s_cmd_names:
-            self.frame_data['cmd'] = self.s_cmd_names[cmd]
+        if self.collect_ids:
+            self.frame_ids = []
+        if self.last_values is not None:
+            self.value_changes = bytearray()
+            self.change_tables = []
+
+        # CRC covers the header from the first FF through the parameters as
+        # they were sent, so the dropped stuffing bytes go back in for it.
+        header = bytes((0xff, 0xff, 0xfd, 0x00, self.servo_id[0],
+                        self.frame_length & 0xff, self.frame_length >> 8, cmd))
+        if self.stuffed_at is None:
+            self.crc = self.crc16(self.data_packet_save, self.crc16(header))
         else:
-            self.frame_data['cmd'] = ''.join([ '0x', hex(cmd).upper()[2:] ])
-
-        if cmd in self.processP2Packets:
+            del self.data_packet_save[self.data_count:]
+            crc = self.crc16(header)
+            with memoryview(self.data_packet_save) as data:
+                start = 0
+                for index in self.stuffed_at:
+                    crc = self.crc16(b'\xfd', self.crc16(data[start:index], crc))
+                    start = index
+                self.crc = self.crc16(data[start:], crc)
+        read_crc = ((ch[0] << 8) | self.crcFirstByte) & 0xffff
+        self.packet_ok = self.crc == read_crc
+        self.packet_check = None
+        resync = None
+        if not self.packet_ok:
+            if self.log_errors:
+                print(">> CRC error Computed:", hex(self.crc), " Read:", hex(read_crc))
+            self.packet_check = (self.crc, read_crc)
+            # the bad packet's frame stops short of any header found inside it
+            resync = self.resync_index()
+            if resync < len(self.raw_frames):
+                frame = self.raw_frames[resync - 1]
+
+        if self.filtering and self.packet_ok and not self.packet_shown(cmd, cmd == 0x55):
+            new_frame = self.filtered_packet(cmd, cmd == 0x55)
+        elif cmd in self.processP2Packets:
             new_frame = self.processP2Packets[cmd](frame, cmd)
         else:
              new_frame = self.ProcessProt2_unknown(frame, cmd)
 
+        if self.reply_late_us:
+            new_frame = self.track_reply_timing(frame, cmd, cmd == 0x55, new_frame)
+        if self.period_jitter_us:
+            new_frame = self.track_period(frame, cmd, cmd == 0x55, new_frame)
+        if self.stats_window_s:
+            self.count_packet(cmd)
+        if self.grouping:
+            new_frame = self.group_frames(cmd, cmd == 0x55, new_frame)
+
         # Don't update last command if reply as may be many if for example ping
         if cmd != 0x55:
             self.last_cmd = cmd
+        if resync is not None:
+            return self.resync(resync, new_frame)
         return new_frame     
 
 #==========================================================================================
@@ -1069,35 +2845,104 @@ class Hla(HighLevelAnalyzer):
         0x8213, 0x0216, 0x021C, 0x8219, 0x0208, 0x820D, 0x8207, 0x0202
     ]
 
-    def update_crc(self, ch):
-        i = ((self.crc >> 8) ^ ch[0]) & 0xFF
-        self.crc = ((self.crc << 8) ^ self.crc_table[i]) & 0xffff
+    # Slicing by 2 table, entry v is the CRC register after feeding two bytes
+    # into a register holding v. Built on first use and shared by all instances.
+    crc_table16 = None
+
+    @classmethod
+    def build_crc_table16(cls):
+        table = cls.crc_table
+        table16 = []
+        for v in range(0x10000):
+            crc = ((v << 8) & 0xffff) ^ table[v >> 8]
+            table16.append(((crc << 8) & 0xffff) ^ table[crc >> 8])
+        cls.crc_table16 = table16
+        return table16
+
+    def crc16(self, data, crc=0):
+        # CRC of a whole block, two bytes per table lookup, the per byte
+        # table only handles an odd trailing byte.
+        table16 = self.crc_table16 or self.build_crc_table16()
+        word_count = len(data) >> 1
+        if word_count:
+            for word in struct.unpack_from('>%dH' % word_count, data):
+                crc = table16[crc ^ word]
+        if len(data) & 1:
+            crc = ((crc << 8) ^ self.crc_table[((crc >> 8) ^ data[-1]) & 0xff]) & 0xffff
+        return crc
 
 
 #================================================
 #  Main decode function
 #================================================
     def decode(self, frame: AnalyzerFrame):
+        # Logic 2 wants AnalyzerFrames, packet records are rendered into them
+        # here. ReplayCapture calls decode_records and only renders the
+        # records it writes out. Most characters finish no packet, those
+        # return without the render call.
+        result = self.decode_records(frame)
+        if result is None:
+            return None
+        return self.render_frames(result)
+
+    def render_frames(self, result):
+        # what decode_records (or end_capture) returned, as AnalyzerFrames
+        if result is None:
+            return None
+        if type(result) is list:
+            return [out.frame() if type(out) is PacketRecord else out for out in result]
+        if type(result) is PacketRecord:
+            return result.frame()
+        return result
+
+    def decode_char(self, frame: AnalyzerFrame):
         try:
             #ch = frame.data['data'].decode('ascii')
             ch = frame.data['data']
             #ch_val = ch[0]
-            #print("FS:", self.frame_state, "FT: ", frame.type, " ch: ", ch, " ", hex(ch[0]))
         except:
             # Not an ASCII character
             return
+        if self.log_bytes:
+            print("FS:", self.frame_state, "FT: ", frame.type, " ch: ", ch, " ", hex(ch[0]))
+
+        self.byte_count += 1
 
         # lets add in a timeout if there is too much of a gap between characters
-        if self.frame_state != '1stFF':
-            char_time = float(frame.end_time - frame.start_time)
-            char_gap = float(frame.start_time - self.last_char_end_time)
-            if char_gap > (self.packet_timeout_char_count * char_time):
-                print("$$ packet timeout")
-                self.frame_state = '1stFF'
+        state = self.frame_state
+        if state != STATE_1ST_FF:
+            if frame.start_time - self.last_char_end_time > self.packet_timeout:
+                if self.log_errors:
+                    print("$$ packet timeout")
+                # look for packets in what the timed out one swallowed, then
+                # carry on with this character
+                return self.resync(self.resync_index(), None, frame)
+            else:
+                # bounded by the length checks, at most one packet long
+                self.raw_frames.append(frame)
+        elif (self.stats_window_end is not None) and (frame.start_time >= self.stats_window_end):
+            # between packets, report the bus statistics window that just ended
+            stats_frame = self.close_stats_window(frame)
+            self.last_char_end_time = frame.end_time
+            self.decode1stFF(frame, ch)
+            if self.groups:
+                return self.flush_groups() + [stats_frame]
+            return stats_frame
         self.last_char_end_time = frame.end_time  
 
+        # Parameter bytes are most of the traffic, store them straight into
+        # the buffer instead of going through the dispatch table.
+        if state == STATE_P2_DATA or state == STATE_P1_DATA:
+            index = self.data_index
+            if (ch[0] == 0xfd) and (state == STATE_P2_DATA) and self.is_stuffing(index):
+                self.drop_stuffing(index)
+            else:
+                self.data_packet_save[index] = ch[0]
+                index += 1
+                self.data_index = index
+            if index == self.data_count:
+                self.frame_state = STATE_P2_CRC1 if state == STATE_P2_DATA else STATE_P1_CHKSUM
+            return
+
         # use dispatch table to run the decoding of the packets.
-        if self.frame_state in self.decodeDispatch:
-            return self.decodeDispatch[self.frame_state](frame, ch)
-        else:
-            print("Unknown decode state: ", frame_state)
+        return self.decodeDispatch[state](frame, ch)
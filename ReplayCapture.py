@@ -0,0 +1,675 @@
+# Offline replay of Logic 2 async serial exports through the Dynamixel HLA.
+#
+# Logic 2 only runs HighLevelAnalyzer.Hla inside the application. This script
+# feeds an exported capture through the same Hla.decode byte by byte, so long
+# captures can be profiled and regression checked from the command line.
+#
+# Usage:
+#   python ReplayCapture.py capture.csv
+#   python ReplayCapture.py capture.csv --convert capture.dxlbin
+#   python ReplayCapture.py capture.dxlbin --frames frames.txt --profile
+#   python ReplayCapture.py capture.dxlbin --frames frames.txt --profile-decode
+#   python ReplayCapture.py capture.csv --setting DisplayFormat=Hex
+#   python ReplayCapture.py capture.dxlbin --frames frames.txt --jobs 8
+#
+# Input is streamed, so memory use does not grow with the size of the capture.
+
+import argparse
+import cProfile
+import csv
+import io
+import os
+import pstats
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+
+#================================================
+# Stand in for the saleae.analyzers module
+#================================================
+# Only installed when the real module is not importable, so running inside an
+# environment that has the Saleae package still uses the real classes.
+
+class GraphTimeDelta:
+    __slots__ = ('_ns',)
+
+    def __init__(self, second=0, millisecond=0, microsecond=0, nanosecond=0, picosecond=0):
+        self._ns = int(round(second * 1e9 + millisecond * 1e6 + microsecond * 1e3
+                             + nanosecond + picosecond / 1000))
+
+    @classmethod
+    def from_ns(cls, ns):
+        delta = cls.__new__(cls)
+        delta._ns = ns
+        return delta
+
+    def __float__(self):
+        return self._ns / 1e9
+
+    def __add__(self, other):
+        return GraphTimeDelta.from_ns(self._ns + other._ns)
+
+    def __sub__(self, other):
+        return GraphTimeDelta.from_ns(self._ns - other._ns)
+
+    def __mul__(self, scale):
+        return GraphTimeDelta.from_ns(int(self._ns * scale))
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        return isinstance(other, GraphTimeDelta) and self._ns == other._ns
+
+    def __lt__(self, other):
+        return self._ns < other._ns
+
+    def __le__(self, other):
+        return self._ns <= other._ns
+
+    def __gt__(self, other):
+        return self._ns > other._ns
+
+    def __ge__(self, other):
+        return self._ns >= other._ns
+
+    def __hash__(self):
+        return hash(self._ns)
+
+    def __repr__(self):
+        return 'GraphTimeDelta(%.9f)' % float(self)
+
+
+class GraphTime:
+    __slots__ = ('_ns',)
+
+    def __init__(self, ns=0):
+        self._ns = ns
+
+    def __sub__(self, other):
+        if isinstance(other, GraphTime):
+            return GraphTimeDelta.from_ns(self._ns - other._ns)
+        return GraphTime(self._ns - other._ns)
+
+    def __add__(self, other):
+        return GraphTime(self._ns + other._ns)
+
+    def __float__(self):
+        # seconds from the start of the capture, handy for reports
+        return self._ns / 1e9
+
+    def __eq__(self, other):
+        return isinstance(other, GraphTime) and self._ns == other._ns
+
+    def __lt__(self, other):
+        return self._ns < other._ns
+
+    def __le__(self, other):
+        return self._ns <= other._ns
+
+    def __gt__(self, other):
+        return self._ns > other._ns
+
+    def __ge__(self, other):
+        return self._ns >= other._ns
+
+    def __hash__(self):
+        return hash(self._ns)
+
+    def __repr__(self):
+        return 'GraphTime(%.9f)' % float(self)
+
+
+class AnalyzerFrame:
+    __slots__ = ('type', 'start_time', 'end_time', 'data')
+
+    def __init__(self, type, start_time, end_time, data=None):
+        self.type = type
+        self.start_time = start_time
+        self.end_time = end_time
+        self.data = data if data is not None else {}
+
+    def __repr__(self):
+        return 'AnalyzerFrame(%r, %r, %r, %r)' % (self.type, self.start_time, self.end_time, self.data)
+
+
+class HighLevelAnalyzer:
+    pass
+
+
+class StringSetting:
+    def __init__(self, label=None, **kwargs):
+        self.label = label
+        self.default = ''
+
+
+class NumberSetting:
+    def __init__(self, label=None, min_value=None, max_value=None, **kwargs):
+        self.label = label
+        self.min_value = min_value
+        self.max_value = max_value
+        self.default = min_value if min_value is not None else 0
+
+
+class ChoicesSetting:
+    def __init__(self, choices, label=None, **kwargs):
+        self.label = label
+        self.choices = tuple(choices)
+        self.default = self.choices[0]
+
+
+def install_saleae_standin():
+    try:
+        import saleae.analyzers  # noqa: F401
+        return False
+    except ImportError:
+        pass
+    saleae = types.ModuleType('saleae')
+    analyzers = types.ModuleType('saleae.analyzers')
+    data = types.ModuleType('saleae.data')
+    for cls in (HighLevelAnalyzer, AnalyzerFrame, StringSetting, NumberSetting, ChoicesSetting):
+        setattr(analyzers, cls.__name__, cls)
+    data.GraphTime = GraphTime
+    data.GraphTimeDelta = GraphTimeDelta
+    saleae.analyzers = analyzers
+    saleae.data = data
+    sys.modules['saleae'] = saleae
+    sys.modules['saleae.analyzers'] = analyzers
+    sys.modules['saleae.data'] = data
+    return True
+
+
+def create_analyzer(settings=None):
+    # Logic 2 assigns the setting values to the instance before calling
+    # __init__, do the same here. Unspecified settings get their default.
+    install_saleae_standin()
+    import HighLevelAnalyzer
+    from saleae.analyzers import StringSetting, NumberSetting, ChoicesSetting
+    settings = dict(settings or {})
+    cls = HighLevelAnalyzer.Hla
+    hla = cls.__new__(cls)
+    for name in dir(cls):
+        setting = getattr(cls, name)
+        if isinstance(setting, (StringSetting, NumberSetting, ChoicesSetting)):
+            value = settings.pop(name, getattr(setting, 'default', None))
+            if isinstance(setting, NumberSetting):
+                value = float(value)
+            elif isinstance(setting, ChoicesSetting) and value not in setting.choices:
+                raise ValueError('%s must be one of %s' % (name, ', '.join(setting.choices)))
+            setattr(hla, name, value)
+    if settings:
+        raise ValueError('Unknown settings: ' + ', '.join(settings))
+    hla.__init__()
+    return hla
+
+
+#================================================
+# Capture readers
+#================================================
+# Every reader yields (start_ns, end_ns, byte_value) tuples.
+
+BIN_MAGIC = b'DXLSER1\0'
+BIN_RECORD = struct.Struct('<QIB')  # start ns, duration ns, value
+BIN_BLOCK_RECORDS = 65536
+
+
+def parse_time_ns(text):
+    return int(round(float(text) * 1e9))
+
+
+s_escapes = {'\\r': 13, '\\n': 10, '\\t': 9, '\\0': 0, ' ': 32, '\\\\': 92}
+
+
+def parse_value(text):
+    text = text.strip() or text
+    if text.startswith(("'", '"')) and len(text) >= 2 and text[-1] == text[0]:
+        text = text[1:-1]
+    if text in s_escapes:
+        return s_escapes[text]
+    lower = text.lower()
+    if lower.startswith('0x'):
+        return int(lower, 16)
+    if lower.startswith('0b'):
+        return int(lower, 2)
+    if lower.startswith('\\x'):
+        return int(lower[2:], 16)
+    if text.isdigit():
+        return int(text)
+    if len(text) == 1:
+        return ord(text)
+    raise ValueError('Can not parse serial value: %r' % text)
+
+
+def read_csv(path, start_offset=0, end_offset=None):
+    # Handles both the Logic 2 data table export
+    #   name,type,start_time,duration,data,...
+    # and the serial analyzer export
+    #   Time [s],Value,Parity Error,Framing Error
+    with open(path, 'r', newline='') as f:
+        header = next(csv.reader([f.readline()]))
+        columns = [c.strip().lower() for c in header]
+        time_col = columns.index('start_time') if 'start_time' in columns else columns.index('time [s]')
+        dur_col = columns.index('duration') if 'duration' in columns else None
+        value_col = columns.index('data') if 'data' in columns else columns.index('value')
+        type_col = columns.index('type') if 'type' in columns else None
+        if start_offset:
+            f.seek(start_offset)
+            f.readline()  # realign to the next full line
+        prev = None
+        while True:
+            if end_offset is not None and f.tell() >= end_offset:
+                break
+            line = f.readline()
+            if not line:
+                break
+            row = next(csv.reader([line]))
+            if len(row) <= value_col or (type_col is not None and row[type_col] != 'data'):
+                continue
+            start_ns = parse_time_ns(row[time_col])
+            if dur_col is not None:
+                end_ns = start_ns + parse_time_ns(row[dur_col])
+            else:
+                end_ns = None
+            value = parse_value(row[value_col])
+            if dur_col is None:
+                # No duration column, close off the previous character at
+                # the start of this one (bounded by 1ms so gaps survive).
+                if prev is not None:
+                    yield prev[0], min(start_ns, prev[0] + 1000000), prev[1]
+                prev = (start_ns, value)
+            else:
+                yield start_ns, end_ns, value
+        if prev is not None:
+            yield prev[0], prev[0] + 1000, prev[1]
+
+
+def read_binary(path, start_offset=0, end_offset=None):
+    size = BIN_RECORD.size
+    with open(path, 'rb') as f:
+        if f.read(len(BIN_MAGIC)) != BIN_MAGIC:
+            raise ValueError(path + ' is not a DXL serial binary capture')
+        first = len(BIN_MAGIC)
+        if start_offset > first:
+            first += ((start_offset - first + size - 1) // size) * size
+        f.seek(first)
+        remaining = None
+        if end_offset is not None:
+            remaining = max(0, (end_offset - first + size - 1) // size)
+        while remaining is None or remaining > 0:
+            count = BIN_BLOCK_RECORDS if remaining is None else min(BIN_BLOCK_RECORDS, remaining)
+            block = f.read(count * size)
+            if not block:
+                break
+            block = block[:len(block) - (len(block) % size)]
+            for start_ns, dur_ns, value in BIN_RECORD.iter_unpack(block):
+                yield start_ns, start_ns + dur_ns, value
+            if remaining is not None:
+                remaining -= len(block) // size
+
+
+def is_binary_capture(path):
+    with open(path, 'rb') as f:
+        return f.read(len(BIN_MAGIC)) == BIN_MAGIC
+
+
+def read_capture(path, start_offset=0, end_offset=None):
+    if is_binary_capture(path):
+        return read_binary(path, start_offset, end_offset)
+    return read_csv(path, start_offset, end_offset)
+
+
+def write_binary(records, path):
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(BIN_MAGIC)
+        pack = BIN_RECORD.pack
+        buf = bytearray()
+        for start_ns, end_ns, value in records:
+            buf += pack(start_ns, end_ns - start_ns, value)
+            count += 1
+            if len(buf) >= BIN_BLOCK_RECORDS * BIN_RECORD.size:
+                f.write(buf)
+                buf.clear()
+        f.write(buf)
+    return count
+
+
+#================================================
+# Replay
+#================================================
+s_byte_values = [bytes((i,)) for i in range(256)]
+
+
+def iter_frames(result):
+    # decode may return nothing, one frame or a list of frames
+    if result is None:
+        return ()
+    if isinstance(result, (list, tuple)):
+        return result
+    return (result,)
+
+
+def format_frame(frame):
+    return '%.9f\t%.9f\t%s\t%s\n' % (float(frame.start_time), float(frame.end_time), frame.type,
+                                     ' '.join('%s=%s' % (k, v) for k, v in frame.data.items()))
+
+
+def replay(hla, records, frames_out=None, progress_every=0, records_only=False):
+    # Feed the records through hla.decode, returns a statistics dict. Like
+    # inside Logic 2 every packet is rendered into an AnalyzerFrame. With
+    # records_only it goes through hla.decode_records instead, packets come
+    # back as records and only the ones written to frames_out have their
+    # strings rendered.
+    from saleae.analyzers import AnalyzerFrame
+    from saleae.data import GraphTime
+    byte_values = s_byte_values
+    decode = hla.decode_records if records_only else hla.decode
+    frame_counts = {}
+    byte_count = 0
+    frame_total = 0
+    first_ns = None
+    last_ns = 0
+    t0 = time.perf_counter()
+    for start_ns, end_ns, value in records:
+        if first_ns is None:
+            first_ns = start_ns
+        last_ns = end_ns
+        result = decode(AnalyzerFrame('data', GraphTime(start_ns), GraphTime(end_ns), {'data': byte_values[value]}))
+        byte_count += 1
+        if result is not None:
+            for out in iter_frames(result):
+                frame_total += 1
+                frame_counts[out.type] = frame_counts.get(out.type, 0) + 1
+                if frames_out is not None:
+                    frames_out.write(format_frame(out))
+        if progress_every and (byte_count % progress_every) == 0:
+            print('  ... %d bytes, %d frames' % (byte_count, frame_total), file=sys.stderr)
+    final = hla.end_capture()
+    for out in iter_frames(final if records_only else hla.render_frames(final)):
+        frame_total += 1
+        frame_counts[out.type] = frame_counts.get(out.type, 0) + 1
+        if frames_out is not None:
+            frames_out.write(format_frame(out))
+    elapsed = time.perf_counter() - t0
+    return {
+        'first_ns': first_ns,
+        'last_ns': last_ns,
+        'bytes': byte_count,
+        'frames': frame_total,
+        'frame_types': frame_counts,
+        'elapsed': elapsed,
+        'capture_seconds': (last_ns - first_ns) / 1e9 if first_ns is not None else 0.0,
+        'bytes_per_sec': byte_count / elapsed if elapsed > 0 else 0.0,
+        'frames_per_sec': frame_total / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def print_stats(stats, out=sys.stdout):
+    print('Decoded %d bytes into %d frames in %.3fs (capture length %.3fs)'
+          % (stats['bytes'], stats['frames'], stats['elapsed'], stats['capture_seconds']), file=out)
+    print('  %.0f bytes/sec  %.0f frames/sec' % (stats['bytes_per_sec'], stats['frames_per_sec']), file=out)
+    for frame_type in sorted(stats['frame_types']):
+        print('  %-14s %d' % (frame_type, stats['frame_types'][frame_type]), file=out)
+
+
+def print_registers(hla, out=sys.stdout):
+    # final register mirror image of every servo seen
+    mirror = hla.mirror
+    for servo_id in mirror.servo_ids():
+        table = mirror.tables[servo_id]
+        values = []
+        for reg in range(table.size):
+            if table.widths[reg]:
+                value = mirror.value(servo_id, reg, table.widths[reg])
+                if value is not None:
+                    values.append('%s=%d' % (table.names[reg], value))
+        print('ID %3d: %s' % (servo_id, ' '.join(values)), file=out)
+
+
+#================================================
+# Parallel replay
+#================================================
+# A binary capture is cut into chunks at sync points, gaps longer than the
+# packet timeout followed by FF FF, and each chunk is decoded in its own
+# process. Before its chunk a worker decodes a few thousand of the records
+# ahead of it to rebuild the state replies depend on. The carried state is
+# compared with the state the previous chunk really ended with, and chunks
+# that started from a different state are decoded again from that one.
+
+CARRIED_STATE = ('last_cmd', 'last_cmd_reg', 'last_cmd_reg_cnt', 'bulk_read_info', 'p1_reply_ids', 'p1_request',
+                 'id_tables')
+WARM_UP_RECORDS = 4096
+
+
+def carried_state(hla):
+    return {name: getattr(hla, name) for name in CARRIED_STATE}
+
+
+def state_key(state):
+    # tables are compared by name, each process loads its own copies
+    id_tables = [None if tables is None else [t.name if t is not None else None for t in tables]
+                 for tables in state['id_tables']]
+    return (state['last_cmd'], state['last_cmd_reg'], state['last_cmd_reg_cnt'],
+            state['bulk_read_info'], state['p1_reply_ids'], state['p1_request'], id_tables)
+
+
+def record_offset(index):
+    return len(BIN_MAGIC) + index * BIN_RECORD.size
+
+
+def find_chunks(path, chunk_count, gap_ns):
+    # [(start index, end index)] cut at sync points near equal sizes
+    record_count = (os.path.getsize(path) - len(BIN_MAGIC)) // BIN_RECORD.size
+    starts = [0]
+    for chunk in range(1, chunk_count):
+        target = max(record_count * chunk // chunk_count, starts[-1] + 1)
+        before = first = None
+        for index, second in enumerate(read_binary(path, record_offset(target)), target):
+            # first and second FF of a header with a long enough gap before it
+            if before is not None and first[2] == 0xff and second[2] == 0xff and \
+                    first[0] - before[1] > gap_ns:
+                starts.append(index - 1)
+                break
+            before, first = first, second
+        else:
+            break
+    starts = sorted(set(starts))
+    return list(zip(starts, starts[1:] + [record_count]))
+
+
+def sync_gap_ns(path, settings):
+    # the same packet timeout the analyzer ends up using
+    if float(settings.get('PacketTimeoutUs', 0)):
+        return int(float(settings['PacketTimeoutUs']) * 1000)
+    if float(settings.get('BaudRate', 0)):
+        char_ns = 1e10 / float(settings['BaudRate'])
+    else:
+        char_ns = None
+        for count, (start_ns, end_ns, value) in enumerate(read_binary(path)):
+            if char_ns is None or end_ns - start_ns < char_ns:
+                char_ns = end_ns - start_ns
+            if count == 64:
+                break
+    return int(100 * (char_ns or 0))
+
+
+def decode_chunk(job):
+    # worker: returns (stats, state at the chunk start, state at its end)
+    path, settings, start, end, frames_path, start_state = job
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    hla = create_analyzer(settings)
+    if start_state is None:
+        warm = max(0, start - WARM_UP_RECORDS)
+        replay(hla, read_binary(path, record_offset(warm), record_offset(start)), records_only=True)
+    else:
+        hla.__dict__.update(start_state)
+    state_in = carried_state(hla)
+    frames_out = open(frames_path, 'w') if frames_path else None
+    try:
+        stats = replay(hla, read_binary(path, record_offset(start), record_offset(end)), frames_out)
+    finally:
+        if frames_out:
+            frames_out.close()
+    return stats, state_in, carried_state(hla)
+
+
+def replay_parallel(path, settings, jobs, frames_path=None):
+    # the carried state holds HighLevelAnalyzer objects, this also loads them
+    hla = create_analyzer(settings)
+    if ((hla.mirror is not None) or hla.reply_late_us or hla.stats_window_s or hla.grouping or hla.decode_cache
+            or hla.profiler or hla.export or hla.period_jitter_us or (hla.last_values is not None)):
+        raise SystemExit('--jobs can not be used with the register mirror, register export, changes only, '
+                         'reply timing, command period, bus statistics, grouping, decode cache or decode '
+                         'profiling settings')
+    t0 = time.perf_counter()
+    temp_dir = None
+    if not is_binary_capture(path):
+        temp_dir = tempfile.mkdtemp()
+        binary_path = os.path.join(temp_dir, 'capture.dxlbin')
+        write_binary(read_capture(path), binary_path)
+        path = binary_path
+    chunk_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(frames_path)) if frames_path else None)
+    try:
+        chunks = find_chunks(path, jobs * 2, sync_gap_ns(path, settings))
+        chunk_jobs = [(path, settings, start, end,
+                       os.path.join(chunk_dir, '%d.txt' % index) if frames_path else None, None)
+                      for index, (start, end) in enumerate(chunks)]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(decode_chunk, chunk_jobs))
+
+        # chunks whose warm up did not end in the state the previous chunk
+        # did are decoded again, in order, from that state
+        redone = 0
+        for index in range(1, len(results)):
+            if state_key(results[index][1]) != state_key(results[index - 1][2]):
+                job = chunk_jobs[index][:5] + (results[index - 1][2],)
+                results[index] = decode_chunk(job)
+                redone += 1
+
+        if frames_path:
+            with open(frames_path, 'w') as out:
+                for job in chunk_jobs:
+                    with open(job[4]) as chunk_frames:
+                        shutil.copyfileobj(chunk_frames, out)
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - t0
+    frame_types = {}
+    for stats, state_in, state_out in results:
+        for frame_type, count in stats['frame_types'].items():
+            frame_types[frame_type] = frame_types.get(frame_type, 0) + count
+    byte_count = sum(stats['bytes'] for stats, state_in, state_out in results)
+    frame_total = sum(stats['frames'] for stats, state_in, state_out in results)
+    first_ns = results[0][0]['first_ns'] if results else None
+    last_ns = results[-1][0]['last_ns'] if results else 0
+    return {
+        'first_ns': first_ns,
+        'last_ns': last_ns,
+        'bytes': byte_count,
+        'frames': frame_total,
+        'frame_types': frame_types,
+        'elapsed': elapsed,
+        'capture_seconds': (last_ns - first_ns) / 1e9 if first_ns is not None else 0.0,
+        'bytes_per_sec': byte_count / elapsed if elapsed > 0 else 0.0,
+        'frames_per_sec': frame_total / elapsed if elapsed > 0 else 0.0,
+        'chunks': len(results),
+        'chunks_redone': redone,
+    }
+
+
+def parse_settings(pairs):
+    settings = {}
+    for pair in pairs or ():
+        name, sep, value = pair.partition('=')
+        if not sep:
+            raise SystemExit('--setting expects NAME=VALUE, got ' + pair)
+        settings[name] = value
+    return settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a Logic 2 async serial export through the Dynamixel HLA')
+    parser.add_argument('capture', help='CSV export or .dxlbin capture')
+    parser.add_argument('--setting', action='append', metavar='NAME=VALUE',
+                        help='HLA setting, for example DisplayFormat=Hex (may be repeated)')
+    parser.add_argument('--frames', metavar='FILE', help='write decoded frames to FILE')
+    parser.add_argument('--convert', metavar='FILE', help='convert the capture to the binary format and exit')
+    parser.add_argument('--profile', action='store_true', help='run under cProfile and print the hot spots')
+    parser.add_argument('--profile-decode', action='store_true',
+                        help='count and time each decode state, packet handler and render function')
+    parser.add_argument('--latency', type=int, metavar='US',
+                        help='pair requests with replies, flag replies later than DELAY + US and print histograms')
+    parser.add_argument('--jitter', type=int, metavar='US',
+                        help='time repeated requests, flag periods more than US off the mean and print histograms')
+    parser.add_argument('--registers', action='store_true',
+                        help='print the final register values of every servo (turns on the register mirror)')
+    parser.add_argument('--export', metavar='DIR',
+                        help='write the register values of writes and read replies as .npy columns to DIR')
+    parser.add_argument('--records-only', action='store_true',
+                        help='time decoding into packet records without rendering the frames Logic 2 gets')
+    parser.add_argument('--progress', type=int, default=0, metavar='N', help='report progress every N bytes')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help='decode chunks of the capture in N processes')
+    args = parser.parse_args(argv)
+
+    if args.convert:
+        count = write_binary(read_capture(args.capture), args.convert)
+        print('Wrote %d records to %s' % (count, args.convert))
+        return 0
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    settings = parse_settings(args.setting)
+    if args.registers:
+        settings.setdefault('RegisterMirror', 'Current values')
+    if args.latency is not None:
+        settings['ReplyLateUs'] = args.latency
+    if args.jitter is not None:
+        settings['PeriodJitterUs'] = args.jitter
+    if args.profile_decode:
+        settings['ProfileDecode'] = 'On'
+    if args.export:
+        settings['ExportDirectory'] = args.export
+    if args.jobs > 1:
+        stats = replay_parallel(args.capture, settings, args.jobs, args.frames)
+        print_stats(stats)
+        print('  %d chunks, %d decoded again to carry state over' % (stats['chunks'], stats['chunks_redone']))
+        return 0
+
+    hla = create_analyzer(settings)
+    frames_out = open(args.frames, 'w') if args.frames else None
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        if profiler:
+            profiler.enable()
+        stats = replay(hla, read_capture(args.capture), frames_out, args.progress, args.records_only)
+        if profiler:
+            profiler.disable()
+    finally:
+        if frames_out:
+            frames_out.close()
+        hla.close_export()
+    print_stats(stats)
+    if args.registers and hla.mirror is not None:
+        print_registers(hla)
+    if hla.reply_late_us:
+        print(hla.latency_report())
+    if hla.period_jitter_us:
+        print(hla.period_report())
+    if hla.profiler is not None:
+        print(hla.profile_report())
+    if profiler:
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(25)
+        print(text.getvalue())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# Fast Sync Read, Fast Bulk Read and Protocol 1 Bulk Read replies, each
+# servo's block picked out of the reply in one pass.
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BusBenchmark
+import ReplayCapture
+from BusBenchmark import X_PPOS, X_PTEMP, AX_PPOS, crc16, le, p2_packet, servo_value
+
+IDS = (1, 2, 3, 4)
+
+
+def decode(bus):
+    # frame lines and the analyzer, with the register mirror on
+    hla = ReplayCapture.create_analyzer({'RegisterMirror': 'Current values'})
+    frames_out = io.StringIO()
+    ReplayCapture.replay(hla, bus.records(), frames_out)
+    return frames_out.getvalue().splitlines(), hla
+
+
+def scenario(name):
+    return decode(BusBenchmark.build_scenario(name, 1000000, len(IDS), cycles=2))
+
+
+def reply_data(lines):
+    return [line.split('data= ')[1] for line in lines if line.split('\t')[2] == 'DXL ReplyD']
+
+
+def test_fast_sync_read():
+    lines, hla = scenario('p2_fast_sync_read')
+    values = [int.from_bytes(servo_value(servo_id, 1, 4), 'little') for servo_id in IDS]
+    assert reply_data(lines)[-1] == ' '.join('%d: %d' % (servo_id, value) for servo_id, value in zip(IDS, values))
+    assert [hla.mirror.value(servo_id, X_PPOS, 4) for servo_id in IDS] == values
+
+
+def test_fast_bulk_read():
+    # PPOS of the odd IDs, PTEMP of the even ones
+    lines, hla = scenario('p2_fast_bulk_read')
+    values = [int.from_bytes(servo_value(servo_id, 1, 4 if servo_id & 1 else 1), 'little') for servo_id in IDS]
+    assert reply_data(lines)[-1] == ' '.join('%d: %d' % (servo_id, value) for servo_id, value in zip(IDS, values))
+    assert [hla.mirror.value(servo_id, X_PPOS if servo_id & 1 else X_PTEMP, 4 if servo_id & 1 else 1)
+            for servo_id in IDS] == values
+
+
+def test_p1_bulk_read():
+    lines, hla = scenario('p1_bulk_read')
+    values = [int.from_bytes(servo_value(servo_id, 1, 2), 'little') for servo_id in IDS]
+    assert reply_data(lines)[-len(IDS):] == [str(value) for value in values]
+    assert [hla.mirror.value(servo_id, AX_PPOS, 2) for servo_id in IDS] == values
+
+
+def fast_bulk_reply(blocks):
+    # one status packet with an (ID, data) block per servo
+    length = 3 + sum([2 + len(data) for servo_id, data in blocks]) + (len(blocks) - 1) * 2
+    packet = bytearray((0xff, 0xff, 0xfd, 0x00, 0xfe, length & 0xff, length >> 8, 0x55))
+    for servo_id, data in blocks:
+        packet += bytes((0, servo_id)) + data
+        packet += le(crc16(packet), 2)
+    return bytes(packet)
+
+
+def fast_bulk_read_types(blocks):
+    bus = BusBenchmark.BusWriter(1000000)
+    bus.send(p2_packet(0xfe, 0x9a, bytes((1,)) + le(X_PPOS, 2) + le(4, 2) + bytes((2,)) + le(X_PTEMP, 2) + le(1, 2)))
+    bus.send(fast_bulk_reply(blocks), reply=True)
+    return [line.split('\t')[2] for line in decode(bus)[0]]
+
+
+def test_fast_bulk_read_short_block():
+    assert fast_bulk_read_types([(1, le(2048, 4)), (2, b'\x28')]) == ['DXL BulkR', 'DXL ReplyD']
+    assert fast_bulk_read_types([(1, le(2048, 2)), (2, b'\x28')]) == ['DXL BulkR', 'DXL Error']
+
+
+def test_fast_bulk_read_unknown_id():
+    assert fast_bulk_read_types([(1, le(2048, 4)), (5, b'\x28')]) == ['DXL BulkR', 'DXL Error']
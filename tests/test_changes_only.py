@@ -0,0 +1,77 @@
+# Only changes (ChangesOnly): packets with register values only show the
+# runs of registers that differ from the last value seen for that servo.
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BusBenchmark
+import ReplayCapture
+from BusBenchmark import X_GOAL, X_GVEL, X_PPOS, le, p2_packet
+
+
+def shown(packets):
+    # (type, cmd, data) of every frame
+    bus = BusBenchmark.BusWriter(1000000)
+    for packet, reply in packets:
+        bus.send(packet, reply)
+    hla = ReplayCapture.create_analyzer({'ChangesOnly': 'Only changes'})
+    frames_out = io.StringIO()
+    ReplayCapture.replay(hla, bus.records(), frames_out)
+    frames = []
+    for line in frames_out.getvalue().splitlines():
+        frame_type, data = line.split('\t')[2:]
+        fields = dict(field.split('=', 1) for field in data.split(' ') if '=' in field)
+        frames.append((frame_type, fields['cmd'], data.split('data= ')[1] if 'data= ' in data else None))
+    return frames
+
+
+def write(servo_id, reg, data):
+    return (p2_packet(servo_id, 3, le(reg, 2) + data), False)
+
+
+def sync_write(values):
+    params = bytearray(le(X_GOAL, 2) + le(4, 2))
+    for servo_id, value in enumerate(values, 1):
+        params += bytes((servo_id,)) + le(value, 4)
+    return (p2_packet(0xfe, 0x83, params), False)
+
+
+def test_writes():
+    assert shown([write(1, X_GOAL, le(100, 4)), write(1, X_GOAL, le(100, 4)), write(1, X_GOAL, le(200, 4))]) == [
+        ('DXL Changes', 'Write', '1(GOAL): 100'), ('DXL Changes', 'Write', '1(GOAL): 200')]
+
+
+def test_only_changed_registers():
+    # GVEL up to GOAL, GOAL did not change
+    frames = shown([write(1, X_GOAL, le(200, 4)), write(1, X_GVEL, le(5, 4) + le(0, 8) + le(200, 4))])
+    assert frames[1] == ('DXL Changes', 'Write', '1(GVEL): 5 0 0')
+
+
+def test_sync_write():
+    frames = shown([sync_write((10, 20, 30))] * 5 + [sync_write((10, 21, 30))])
+    assert frames == [('DXL Changes', 'SWrite', '1(GOAL): 10 2(GOAL): 20 3(GOAL): 30'),
+                      ('DXL Changes', 'SWrite', '2(GOAL): 21')]
+
+
+def test_replies():
+    read = (p2_packet(1, 2, le(X_PPOS, 2) + le(4, 2)), False)
+    reply = lambda value: (p2_packet(1, 0x55, b'\x00' + le(value, 4)), True)
+    frames = shown([read, reply(1000), read, reply(1000), read, reply(1001)])
+    # requests without values still show
+    assert [frame[0] for frame in frames] == ['DXL Read', 'DXL Changes', 'DXL Read', 'DXL Read', 'DXL Changes']
+    assert [frame[2] for frame in frames if frame[0] == 'DXL Changes'] == ['1(PPOS): 1000', '1(PPOS): 1001']
+
+
+def test_reply_after_write():
+    # the value read back is the one just written
+    read = (p2_packet(1, 2, le(X_GOAL, 2) + le(4, 2)), False)
+    frames = shown([write(1, X_GOAL, le(500, 4)), read, (p2_packet(1, 0x55, b'\x00' + le(500, 4)), True)])
+    assert [frame[0] for frame in frames] == ['DXL Changes', 'DXL Read']
+
+
+def test_servos_kept_apart():
+    assert shown([write(1, X_GOAL, le(100, 4)), write(2, X_GOAL, le(100, 4))]) == [
+        ('DXL Changes', 'Write', '1(GOAL): 100'), ('DXL Changes', 'Write', '2(GOAL): 100')]
@@ -0,0 +1,74 @@
+# Decode cache (CacheDirectory): a second run over the same capture renders
+# the saved packets and must come out the same as parsing it.
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BusBenchmark
+import ReplayCapture
+
+
+def capture(cycles=20):
+    return list(BusBenchmark.build_scenario('hexapod', 1000000, 18, cycles=cycles).records())
+
+
+def decode(records, settings):
+    # frames written out and the number of characters that were parsed
+    hla = ReplayCapture.create_analyzer(settings)
+    decode_char = hla.decode_char
+    parsed = [0]
+
+    def counting_decode_char(frame):
+        parsed[0] += 1
+        return decode_char(frame)
+    hla.decode_char = counting_decode_char
+    frames_out = io.StringIO()
+    ReplayCapture.replay(hla, records, frames_out)
+    return frames_out.getvalue(), parsed[0]
+
+
+def test_rerun(tmp_path):
+    records = capture()
+    expected, parsed = decode(records, {})
+    assert decode(records, {'CacheDirectory': str(tmp_path)}) == (expected, len(records))
+    frames, parsed = decode(records, {'CacheDirectory': str(tmp_path)})
+    assert frames == expected
+    assert parsed <= 256
+
+
+def test_display_format_change(tmp_path):
+    records = capture()
+    decode(records, {'CacheDirectory': str(tmp_path)})
+    for display_format in ('Hex', 'Dec'):
+        expected = decode(records, {'DisplayFormat': display_format})[0]
+        frames, parsed = decode(records, {'CacheDirectory': str(tmp_path), 'DisplayFormat': display_format})
+        assert frames == expected
+        assert parsed <= 256
+
+
+def test_decode_settings_pick_another_file(tmp_path):
+    records = capture()
+    decode(records, {'CacheDirectory': str(tmp_path)})
+    settings = {'FilterIds': '1-6', 'ChangesOnly': 'Only changes'}
+    expected = decode(records, settings)[0]
+    settings['CacheDirectory'] = str(tmp_path)
+    assert decode(records, settings) == (expected, len(records))
+    assert decode(records, settings)[0] == expected
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_capture_changed(tmp_path):
+    records = capture()
+    decode(records, {'CacheDirectory': str(tmp_path)})
+    # a different value half way and a longer capture
+    changed = capture(30)
+    start_ns, end_ns, value = changed[len(records) // 2]
+    changed[len(records) // 2] = (start_ns, end_ns, value ^ 0x10)
+    expected = decode(changed, {})[0]
+    frames, parsed = decode(changed, {'CacheDirectory': str(tmp_path)})
+    assert frames == expected
+    assert parsed < len(changed)
+    assert decode(changed, {'CacheDirectory': str(tmp_path)})[0] == expected
@@ -0,0 +1,82 @@
+# Register export (ExportDirectory): the .npy columns written while decoding
+# load back with numpy as the rows the packets hold.
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BusBenchmark
+import ReplayCapture
+from BusBenchmark import X_GOAL, X_PPOS, servo_value
+
+ReplayCapture.install_saleae_standin()
+import HighLevelAnalyzer  # noqa: E402
+
+numpy = pytest.importorskip('numpy')
+
+IDS = (1, 2, 3, 4, 5)
+
+
+def export(scenario, directory, cycles=10):
+    bus = BusBenchmark.build_scenario(scenario, 1000000, len(IDS), cycles=cycles)
+    hla = ReplayCapture.create_analyzer({'ExportDirectory': str(directory)})
+    try:
+        ReplayCapture.replay(hla, bus.records(), io.StringIO())
+    finally:
+        hla.close_export()
+    columns = {name: numpy.load(os.path.join(str(directory), name + '.npy'), mmap_mode='r')
+               for name in ('time', 'id', 'reg', 'value', 'direction')}
+    return bus, columns
+
+
+def expected_rows(starts, cycles):
+    # (time, id, reg, value) of one 4 byte value per servo and cycle
+    rows = []
+    for cycle in range(cycles):
+        for servo_id in IDS:
+            rows.append(((starts[cycle] - starts[0]) / 1e9, servo_id,
+                         int.from_bytes(servo_value(servo_id, cycle, 4), 'little')))
+    return rows
+
+
+def exported_rows(columns):
+    return list(zip(columns['time'].tolist(), columns['id'].tolist(), columns['value'].tolist()))
+
+
+def test_sync_write(tmp_path):
+    bus, columns = export('p2_sync_write', tmp_path)
+    starts = [start_ns for start_ns, packet in bus.packets]
+    assert exported_rows(columns) == pytest.approx(expected_rows(starts, 10))
+    assert set(columns['reg'].tolist()) == {X_GOAL}
+    assert set(columns['direction'].tolist()) == {HighLevelAnalyzer.RegisterExport.WRITE}
+
+
+def test_read_replies(tmp_path):
+    bus, columns = export('p2_read', tmp_path)
+    # every other packet is a reply, one cycle reads all servos
+    replies = [start_ns for start_ns, packet in bus.packets[1::2]]
+    rows = exported_rows(columns)
+    assert len(rows) == 10 * len(IDS)
+    for index, (time, servo_id, value) in enumerate(rows):
+        cycle = index // len(IDS)
+        assert servo_id == IDS[index % len(IDS)]
+        assert time == pytest.approx((replies[index] - replies[0]) / 1e9)
+        assert value == int.from_bytes(servo_value(servo_id, cycle, 4), 'little')
+    assert set(columns['reg'].tolist()) == {X_PPOS}
+    assert set(columns['direction'].tolist()) == {HighLevelAnalyzer.RegisterExport.READ}
+
+
+def test_files_grow(tmp_path, monkeypatch):
+    # rows copied a few at a time into files that have to grow many times
+    monkeypatch.setattr(HighLevelAnalyzer.RegisterExport, 'chunk_rows', 7)
+    monkeypatch.setattr(HighLevelAnalyzer.RegisterExport, 'initial_rows', 4)
+    bus, columns = export('p2_sync_write', tmp_path, cycles=40)
+    starts = [start_ns for start_ns, packet in bus.packets]
+    assert exported_rows(columns) == pytest.approx(expected_rows(starts, 40))
+    for name in columns:
+        path = os.path.join(str(tmp_path), name + '.npy')
+        assert os.path.getsize(path) == 128 + 200 * columns[name].dtype.itemsize
@@ -0,0 +1,68 @@
+# Packet filters (FilterIds, FilterInstructions, FilterRegisters): the
+# frames that pass are the ones decoding everything gives, as they were.
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BusBenchmark
+import ReplayCapture
+
+
+def frames(settings, scenario='hexapod'):
+    # (type, fields, line) of every frame
+    bus = BusBenchmark.build_scenario(scenario, 1000000, 3, cycles=4)
+    hla = ReplayCapture.create_analyzer(settings)
+    frames_out = io.StringIO()
+    ReplayCapture.replay(hla, bus.records(), frames_out)
+    out = []
+    for line in frames_out.getvalue().splitlines():
+        frame_type, data = line.split('\t')[2:]
+        out.append((frame_type, dict(field.split('=', 1) for field in data.split(' ') if '=' in field), line))
+    return out
+
+
+def shown(settings, keep, scenario='hexapod'):
+    # frames with the filters and the unfiltered frames keep picks
+    filtered = [line for frame_type, fields, line in frames(settings, scenario)]
+    expected = [line for frame_type, fields, line in frames({}, scenario) if keep(frame_type, fields)]
+    assert filtered
+    return filtered, expected
+
+
+def test_ids():
+    filtered, expected = shown({'FilterIds': '2'}, lambda frame_type, fields: fields['id'] == '2', 'p2_read')
+    assert filtered == expected
+
+
+def test_ids_pass_broadcasts():
+    filtered, expected = shown({'FilterIds': '1,3'},
+                               lambda frame_type, fields: fields['id'] in ('1', '3', '254'))
+    assert filtered == expected
+
+
+def test_instructions():
+    filtered, expected = shown({'FilterInstructions': 'Reply'},
+                               lambda frame_type, fields: fields['cmd'] == 'Reply')
+    assert filtered == expected
+
+
+def test_instruction_numbers():
+    filtered, expected = shown({'FilterInstructions': '0x83,0x92'},
+                               lambda frame_type, fields: fields['cmd'] in ('SWrite', 'BulkRead'))
+    assert filtered == expected
+
+
+def test_registers():
+    # the Sync Write of GVEL on leaves, the Bulk Read has no single range
+    filtered, expected = shown({'FilterRegisters': '132-135'},
+                               lambda frame_type, fields: fields['cmd'] != 'SWrite')
+    assert filtered == expected
+
+
+def test_all_must_match():
+    filtered, expected = shown({'FilterIds': '2-3', 'FilterInstructions': 'Reply'},
+                               lambda frame_type, fields: (fields['cmd'] == 'Reply') and (fields['id'] != '1'))
+    assert filtered == expected
@@ -0,0 +1,70 @@
+# Grouping of repeated packets (GroupWindowMs / GroupCount), run through the
+# offline replay on synthetic bus traffic.
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BusBenchmark
+import ReplayCapture
+
+
+def replay_frames(settings, scenario='p2_sync_write', servos=5, cycles=40):
+    # (start, end, id, count) of every frame that came out, count 1 for the
+    # ones not grouped
+    bus = BusBenchmark.build_scenario(scenario, 1000000, servos, cycles=cycles)
+    hla = ReplayCapture.create_analyzer(settings)
+    frames_out = io.StringIO()
+    stats = ReplayCapture.replay(hla, bus.records(), frames_out)
+    frames = []
+    for line in frames_out.getvalue().splitlines():
+        start, end, frame_type, data = line.split('\t')
+        fields = dict(field.split('=', 1) for field in data.split(' ') if '=' in field)
+        count = int(fields['count']) if frame_type == 'DXL Group' else 1
+        frames.append((float(start), float(end), fields['id'], count))
+    assert len(frames) == stats['frames']
+    return frames
+
+
+def group_counts(settings, cycles=40):
+    return [frame[3] for frame in replay_frames(settings, cycles=cycles)]
+
+
+def test_count_only():
+    assert group_counts({'GroupCount': 10}) == [10, 10, 10, 10]
+
+
+def test_count_only_flushes_at_end():
+    assert group_counts({'GroupCount': 15}) == [15, 15, 10]
+
+
+def test_window_only():
+    # packets 10.02ms apart, a 50ms window holds 5 of them
+    assert group_counts({'GroupWindowMs': 50}) == [5] * 8
+
+
+def test_window_and_count():
+    # the count closes each group first, the next one starts a new window
+    assert group_counts({'GroupWindowMs': 50, 'GroupCount': 3}) == [3] * 13 + [1]
+
+
+def test_no_grouping():
+    assert group_counts({}) == [1] * 40
+
+
+def test_count_leaves_other_groups_open():
+    # the Sync Read and the replies of each servo are groups of their own,
+    # each closing at its own count
+    frames = replay_frames({'GroupCount': 3}, 'p2_sync_read', servos=3, cycles=6)
+    assert [(frame[2], frame[3]) for frame in frames] == [('254', 3), ('1', 3), ('2', 3), ('3', 3)] * 2
+
+
+def test_group_spans_its_packets():
+    packets = replay_frames({}, 'p2_sync_read', servos=3, cycles=6)
+    groups = replay_frames({'GroupCount': 3}, 'p2_sync_read', servos=3, cycles=6)
+    for index, group in enumerate(groups):
+        first = packets[(index // 4) * 12 + index % 4]
+        last = packets[(index // 4) * 12 + 8 + index % 4]
+        assert (group[0], group[1]) == (first[0], last[1])
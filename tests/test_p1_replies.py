@@ -0,0 +1,46 @@
+# Protocol 1 status packets whose error bits look like an instruction, told
+# apart from requests by the servo asked, the reply length and retries.
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BusBenchmark
+import ReplayCapture
+from BusBenchmark import p1_packet
+
+
+def frame_types(packets):
+    bus = BusBenchmark.BusWriter(1000000)
+    for packet, reply in packets:
+        bus.send(packet, reply)
+    hla = ReplayCapture.create_analyzer({})
+    frames_out = io.StringIO()
+    ReplayCapture.replay(hla, bus.records(), frames_out)
+    return [line.split('\t')[2] for line in frames_out.getvalue().splitlines()]
+
+
+def test_read_reply_with_angle_error():
+    # error bit 1 (Angle) reads as instruction 2, Read
+    assert frame_types([(p1_packet(3, 2, (0x24, 2)), False),
+                        (p1_packet(3, 2, (0x10, 0x02)), True)]) == ['DXL Read', 'DXL ReplyDE']
+
+
+def test_retried_read():
+    assert frame_types([(p1_packet(3, 2, (0x24, 2)), False),
+                        (p1_packet(3, 2, (0x24, 2)), False),
+                        (p1_packet(3, 2, (0x10, 0x02)), True)]) == ['DXL Read', 'DXL Read', 'DXL ReplyDE']
+
+
+def test_reply_length_must_match():
+    # a Read of 4 bytes answered with 2 parameters is another request
+    assert frame_types([(p1_packet(3, 2, (0x24, 4)), False),
+                        (p1_packet(3, 2, (0x20, 0x02)), False),
+                        (p1_packet(3, 0, (1, 2)), True)]) == ['DXL Read', 'DXL Read', 'DXL ReplyD']
+
+
+def test_other_servo_is_a_request():
+    assert frame_types([(p1_packet(3, 2, (0x24, 2)), False),
+                        (p1_packet(4, 2, (0x24, 0x02)), False)]) == ['DXL Read', 'DXL Read']
@@ -0,0 +1,81 @@
+# Command periods (PeriodJitterUs): running statistics of the time between
+# repeated requests, DXL Jitter and DXL Period frames.
+
+import io
+import os
+import random
+import statistics
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BusBenchmark
+import ReplayCapture
+from BusBenchmark import X_GOAL, le, p2_packet, servo_value
+
+
+def sync_writes(starts_us):
+    # a Sync Write of GOAL to servos 1-3 at each start time
+    bus = BusBenchmark.BusWriter(1000000)
+    for cycle, start_us in enumerate(starts_us):
+        bus.wait_until(int(start_us * 1000))
+        params = bytearray(le(X_GOAL, 2) + le(4, 2))
+        for servo_id in (1, 2, 3):
+            params += bytes((servo_id,)) + servo_value(servo_id, cycle, 4)
+        bus.send(p2_packet(0xfe, 0x83, params))
+    return bus
+
+
+def decode(bus, jitter_us):
+    hla = ReplayCapture.create_analyzer({'PeriodJitterUs': jitter_us})
+    frames_out = io.StringIO()
+    ReplayCapture.replay(hla, bus.records(), frames_out)
+    return [line.split('\t') for line in frames_out.getvalue().splitlines()], hla
+
+
+def actual_starts(bus):
+    return [start_ns / 1000 for start_ns, packet in bus.packets]
+
+
+def test_statistics():
+    rng = random.Random(24)
+    starts = [10000 * cycle + rng.uniform(-40, 40) for cycle in range(1, 251)]
+    bus = sync_writes(starts)
+    frames, hla = decode(bus, 1000)
+    stream, = hla.period_streams.values()
+    starts = actual_starts(bus)
+    periods = [b - a for a, b in zip(starts, starts[1:])]
+    assert stream.count == len(periods)
+    assert stream.mean == pytest.approx(statistics.mean(periods))
+    assert stream.std() == pytest.approx(statistics.stdev(periods))
+    assert (stream.low, stream.high) == pytest.approx((min(periods), max(periods)))
+    # the first period has no mean to be off from
+    assert sum(stream.histogram) == len(periods) - 1
+    assert (stream.cmd, stream.ids, stream.reg) == ('SWrite', '1,2,3', 'GOAL')
+    assert [frame[2] for frame in frames].count('DXL Period') == 2
+    assert 'DXL Jitter' not in [frame[2] for frame in frames]
+
+
+def test_jitter():
+    # request 20 is 1ms late, the ones after it keep their own period
+    starts = [10000 * cycle + (1000 if cycle >= 20 else 0) for cycle in range(1, 41)]
+    frames, hla = decode(sync_writes(starts), 300)
+    jitter = [frame for frame in frames if frame[2] == 'DXL Jitter']
+    assert len(jitter) == 1
+    fields = dict(field.split('=', 1) for field in jitter[0][3].split(' '))
+    assert float(fields['period']) == pytest.approx(11000)
+    assert float(fields['mean']) == pytest.approx(10000)
+    # it sits in the gap before the late request
+    late = frames[frames.index(jitter[0]) + 1]
+    assert late[2] == 'DXL SWrite'
+    assert jitter[0][1] == late[0]
+    stream, = hla.period_streams.values()
+    assert stream.over == 1
+
+
+def test_no_flags_while_warming_up():
+    starts = [10000 * cycle + (1000 if cycle == 4 else 0) for cycle in range(1, 20)]
+    frames, hla = decode(sync_writes(starts), 300)
+    assert 'DXL Jitter' not in [frame[2] for frame in frames]
@@ -0,0 +1,34 @@
+# Decode profiling (ProfileDecode): every character is timed once.
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BusBenchmark
+import ReplayCapture
+from BusBenchmark import p1_packet, p2_packet
+
+
+def state_calls(packets):
+    bus = BusBenchmark.BusWriter(1000000)
+    for packet in packets:
+        bus.send(packet)
+    hla = ReplayCapture.create_analyzer({'ProfileDecode': 'On', 'LogLevel': 'Off'})
+    stats = ReplayCapture.replay(hla, bus.records(), io.StringIO())
+    calls = sum(counter[0] for name, counter in hla.profiler.counters.items() if name.startswith('state '))
+    return calls, stats['bytes']
+
+
+def test_every_character_once():
+    calls, byte_count = state_calls([p2_packet(1, 1), p1_packet(2, 1), p2_packet(3, 3, bytes((116, 0, 1, 2)))])
+    assert calls == byte_count
+
+
+def test_resync_characters_once():
+    # the Ping inside the Write with a bad CRC is decoded again by the resync
+    write = p2_packet(1, 3, bytes((116, 0)) + p1_packet(2, 1))
+    bad = write[:-1] + bytes(((write[-1] + 1) & 0xff,))
+    calls, byte_count = state_calls([bad, p2_packet(3, 1)])
+    assert calls == byte_count
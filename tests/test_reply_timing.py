@@ -0,0 +1,39 @@
+# Reply latency (ReplyLateUs), run through the offline replay on synthetic
+# bus traffic.
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BusBenchmark
+import ReplayCapture
+
+
+def frame_types(settings, scenario='p2_read', return_delay_us=20.0):
+    bus = BusBenchmark.build_scenario(scenario, 1000000, 5, cycles=20, return_delay_us=return_delay_us)
+    hla = ReplayCapture.create_analyzer(settings)
+    return ReplayCapture.replay(hla, bus.records(), io.StringIO())['frame_types']
+
+
+def test_no_mirror_uses_default_delay():
+    # 20us replies are well inside the factory 500us return delay
+    types = frame_types({'ReplyLateUs': 5})
+    assert 'DXL Late' not in types
+    assert types['DXL ReplyD'] == 100
+
+
+def test_late_after_default_delay():
+    types = frame_types({'ReplyLateUs': 5}, return_delay_us=600.0)
+    assert types['DXL Late'] == 100
+
+
+def test_p1_late_after_default_delay():
+    # the ping scenario asks each servo once
+    assert 'DXL Late' not in frame_types({'ReplyLateUs': 5}, 'p1_ping')
+    assert frame_types({'ReplyLateUs': 5}, 'p1_ping', return_delay_us=600.0)['DXL Late'] == 5
+
+
+def test_no_reply():
+    assert 'DXL NoReply' not in frame_types({'ReplyLateUs': 5})
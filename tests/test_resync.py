@@ -0,0 +1,65 @@
+# Resynchronizing after bad packets: the characters of a packet with a bad
+# CRC, an impossible length or that timed out are decoded again from the
+# next FF FF, so the good packets it swallowed still show.
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BusBenchmark
+import ReplayCapture
+from BusBenchmark import p1_packet, p2_packet
+
+GAP = None
+
+
+def frame_ids(packets):
+    # (type, id) of every frame, GAP leaves the bus idle for 1ms
+    bus = BusBenchmark.BusWriter(1000000)
+    for packet in packets:
+        if packet is GAP:
+            bus.wait_until(bus.now_ns + 1000000)
+        else:
+            bus.send(packet)
+    hla = ReplayCapture.create_analyzer({'LogLevel': 'Off'})
+    frames_out = io.StringIO()
+    ReplayCapture.replay(hla, bus.records(), frames_out)
+    frames = []
+    for line in frames_out.getvalue().splitlines():
+        frame_type, data = line.split('\t')[2:]
+        fields = dict(field.split('=', 1) for field in data.split(' ') if '=' in field)
+        frames.append((frame_type, fields['id']))
+    return frames
+
+
+def test_bad_crc():
+    # a Protocol 1 Ping inside the parameters of a Write with a bad CRC
+    write = p2_packet(1, 3, bytes((116, 0)) + p1_packet(2, 1))
+    bad = write[:-1] + bytes(((write[-1] + 1) & 0xff,))
+    assert frame_ids([bad, p2_packet(3, 1)]) == [('DXL Write', '1'), ('DXL Ping', '2'), ('DXL Ping', '3')]
+
+
+def test_timeout():
+    # a Protocol 1 header asking for 32 parameters, only a Ping follows
+    partial = b'\xff\xff\x01\x20\x03' + p1_packet(2, 1)
+    assert frame_ids([partial, GAP, p1_packet(3, 1)]) == [('DXL Ping', '2'), ('DXL Ping', '3')]
+
+
+def test_bad_length():
+    # a Protocol 2 Ping with a length of 256
+    ping = b'\xff\xff\xfd\x00\x01\x00\x01\x01'
+    assert frame_ids([ping + p2_packet(2, 1), p2_packet(3, 1)]) == [('DXL Ping', '2'), ('DXL Ping', '3')]
+
+
+def test_bad_bytes_between_packets():
+    assert frame_ids([b'\xff\x00\xff', p2_packet(2, 1), b'\xff', p1_packet(3, 1)]) == \
+        [('DXL Ping', '2'), ('DXL Ping', '3')]
+
+
+def test_long_sync_write():
+    # 20 bytes for each of 253 servos is longer than the limit for unknown
+    # instructions
+    params = bytes((104, 0, 20, 0)) + b''.join(bytes((servo_id,)) + bytes(20) for servo_id in range(253))
+    assert frame_ids([p2_packet(0xfe, 0x83, params), p2_packet(3, 1)]) == [('DXL SWrite', '254'), ('DXL Ping', '3')]